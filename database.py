@@ -0,0 +1,131 @@
+# =============================================
+# database.py - Conexión a Supabase (primaria y réplica de lectura)
+# =============================================
+#
+# get_supabase() devuelve el cliente de la base primaria y se usa para toda
+# escritura y lectura puntual. get_supabase_read() lo usan los listados,
+# reportes y estadísticas: si hay una réplica configurada
+# (SUPABASE_READ_URL) las consultas van a ella, salvo cuando la sesión acaba
+# de escribir. En ese caso ReadYourWritesMiddleware marca la sesión durante
+# READ_YOUR_WRITES_SECONDS y sus lecturas siguen en la primaria para que vean
+# lo recién escrito aunque la réplica tenga retraso.
+#
+# La marca viaja de dos formas, porque el frontend (Netlify) y la API (Render)
+# están en sitios distintos:
+# - header X-Primary-Until en la respuesta, que el cliente reenvía tal cual en
+#   sus solicitudes siguientes (no depende de cookies de terceros)
+# - cookie SameSite=None; Secure, para clientes que envían credenciales
+
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Optional
+
+from supabase import Client, ClientOptions, create_client
+
+from services.resilience import build_breaker, build_http_client
+from settings_new import settings
+
+# Cookie y header con el instante (epoch) hasta el que la sesión lee de la primaria
+PRIMARY_COOKIE = 'sgf_primary_until'
+PRIMARY_HEADER = 'X-Primary-Until'
+
+_primary: Optional[Client] = None
+_replica: Optional[Client] = None
+
+# Un circuit breaker por backend (timeouts y reintentos en services/resilience.py)
+_primary_breaker = build_breaker('primary')
+_replica_breaker = build_breaker('replica')
+
+
+def _create_client(url: str, key: str, breaker) -> Client:
+    return create_client(url, key, options=ClientOptions(httpx_client=build_http_client(breaker)))
+
+# True mientras se atiende una solicitud que debe leer de la primaria
+_use_primary: ContextVar[bool] = ContextVar('use_primary', default=False)
+
+
+async def init_database():
+    """Crear los clientes de Supabase y verificar la conexión"""
+    global _primary, _replica
+
+    _primary = _create_client(settings.supabase_url, settings.supabase_key, _primary_breaker)
+    _primary.table('suppliers').select('id').limit(1).execute()
+
+    if settings.supabase_read_url:
+        _replica = _create_client(settings.supabase_read_url, settings.supabase_read_key or settings.supabase_key, _replica_breaker)
+        print(f"📋 Réplica de lectura: {settings.supabase_read_url[:30]}...")
+
+
+def get_supabase() -> Client:
+    """Cliente de la base primaria"""
+    global _primary
+
+    if _primary is None:
+        _primary = _create_client(settings.supabase_url, settings.supabase_key, _primary_breaker)
+    return _primary
+
+
+def get_supabase_read() -> Client:
+    """Cliente para lecturas de listados y reportes (réplica si corresponde)"""
+    # Con el circuito de la réplica abierto las lecturas vuelven a la primaria
+    if _replica is None or _use_primary.get() or _replica_breaker.is_open():
+        return get_supabase()
+    return _replica
+
+
+class ReadYourWritesMiddleware:
+    """Dirigir a la primaria las lecturas de una sesión que escribió hace poco"""
+
+    def __init__(self, app, window_seconds: float):
+        self.app = app
+        self.window_seconds = window_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or _replica is None:
+            await self.app(scope, receive, send)
+            return
+
+        is_write = scope['method'] not in ('GET', 'HEAD', 'OPTIONS')
+        token = _use_primary.set(is_write or self._recently_wrote(scope))
+
+        async def send_wrapper(message):
+            # Una escritura exitosa abre la ventana de lectura desde la primaria
+            if is_write and message['type'] == 'http.response.start' and message['status'] < 400:
+                until = int(time.time() + self.window_seconds)
+                # SameSite=None: el navegador también la envía en solicitudes cross-site
+                cookie = f"{PRIMARY_COOKIE}={until}; Max-Age={int(self.window_seconds)}; Path=/; HttpOnly; Secure; SameSite=None"
+                message.setdefault('headers', [])
+                message['headers'] = list(message['headers']) + [
+                    (b'set-cookie', cookie.encode('latin-1')),
+                    (PRIMARY_HEADER.lower().encode('latin-1'), str(until).encode('latin-1'))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _use_primary.reset(token)
+
+    @staticmethod
+    def _recently_wrote(scope) -> bool:
+        header = PRIMARY_HEADER.lower().encode('latin-1')
+        for name, value in scope.get('headers', []):
+            if name == header:
+                try:
+                    if float(value.decode('latin-1')) > time.time():
+                        return True
+                except ValueError:
+                    pass
+                continue
+            if name != b'cookie':
+                continue
+            cookies = SimpleCookie()
+            try:
+                cookies.load(value.decode('latin-1'))
+                morsel = cookies.get(PRIMARY_COOKIE)
+                if morsel is not None and float(morsel.value) > time.time():
+                    return True
+            except Exception:
+                continue
+        return False
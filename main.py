@@ -26,27 +26,61 @@
 #     └── advance_service.py
 # =============================================
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 
 # Configuración
 from settings_new import settings
-from database import init_database
+from database import ReadYourWritesMiddleware, init_database, get_supabase, get_supabase_read
 
 # Routers
-from routers import suppliers, purchase_orders, invoices, shipments, advances, reports
+from routers import suppliers, purchase_orders, invoices, shipments, advances, payments, reports, changes, search, jobs
+from services.admission import AdmissionControlMiddleware
+from services.change_log import purge_loop as purge_change_log_loop, settled_version
+from services.dashboard import compute_dashboard_stats
+from services.dashboard_stream import dashboard_broadcaster
+from services.http_cache import ConditionalGetMiddleware, add_compression_middleware
+from services.idempotency import IdempotencyMiddleware
+from services.jobs import job_manager
+from services.kernels import shutdown_pool, warm_pool
+from services.metrics import metrics
+from services.read_model import read_model
+from services.resilience import mark_event_loop_thread
+from services.stale_cache import serve_stale_on_error
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Iniciando SGF - Sistema de Gestión Financiera")
+    # Las llamadas a Supabase desde este hilo no duermen entre reintentos
+    mark_event_loop_thread()
     print("🔧 Conectando a base de datos...")
     await init_database()
     print("✅ Base de datos conectada")
+    
+    # Réplica de lectura en segundo plano (las lecturas usan Supabase hasta que esté hidratada)
+    read_model_task = None
+    if settings.read_model_enabled:
+        read_model_task = asyncio.create_task(read_model.run(get_supabase()))
+    
+    # Purga periódica de change_log (CHANGE_LOG_RETENTION_DAYS)
+    change_log_task = asyncio.create_task(purge_change_log_loop(get_supabase()))
+    
+    # Cola de trabajos en segundo plano y procesos de cálculo de reportes
+    job_manager.start()
+    warm_pool()
+    
     yield
     # Shutdown
+    change_log_task.cancel()
+    job_manager.stop()
+    shutdown_pool()
+    if read_model_task:
+        read_model_task.cancel()
     print("🛑 Cerrando aplicación")
 
 # Crear aplicación
@@ -54,9 +88,44 @@ app = FastAPI(
     title="SGF - Sistema de Gestión Financiera",
     description="Sistema modular para gestión financiera de importaciones - Fase 1",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Serialización con orjson (los modelos de respuesta ya validan los datos)
+    default_response_class=ORJSONResponse
 )
 
+# Lecturas de listados y reportes a la réplica, salvo sesiones que acaban de escribir
+app.add_middleware(ReadYourWritesMiddleware, window_seconds=settings.read_your_writes_seconds)
+
+# Idempotency-Key para los POST que mueven dinero (capa interna, ve la
+# respuesta sin comprimir)
+app.add_middleware(
+    IdempotencyMiddleware,
+    prefixes=("/api/payments", "/api/advances", "/api/invoices"),
+    ttl_hours=settings.idempotency_ttl_hours,
+    wait_seconds=settings.idempotency_wait_seconds,
+    lease_seconds=settings.idempotency_lease_seconds
+)
+
+# ETag / 304 para GET de la API (versión de datos) y compresión de respuestas.
+# Se registran antes que CORS para que CORS quede como capa externa y también
+# agregue sus headers a las respuestas 304.
+app.add_middleware(
+    ConditionalGetMiddleware,
+    prefix="/api",
+    max_age=settings.etag_max_age,
+    # El avance de los trabajos cambia sin escrituras y encolar uno no modifica
+    # datos; /api/changes se resuelve por su cursor
+    exclude=("/api/jobs", "/api/changes"),
+    # Versión común a todas las instancias: último id asentado de change_log
+    shared_version=lambda: settled_version(get_supabase())
+)
+add_compression_middleware(app, minimum_size=settings.compression_min_size)
+
+# Límites de concurrencia por clase de ruta (reportes vs CRUD). Va por fuera
+# de caché y compresión para rechazar sin trabajo; CORS sigue siendo la capa
+# externa para que los 429/503 lleguen al navegador.
+app.add_middleware(AdmissionControlMiddleware, prefix="/api")
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +139,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El frontend lee X-Primary-Until y lo reenvía después de escribir
+    expose_headers=["X-Primary-Until"],
 )
 
 # =============================================
@@ -103,9 +174,16 @@ async def health_check():
             "version": "2.0.0",
             "fase": "1 - Finanzas Core"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Error de sistema: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Métricas en formato Prometheus (llamadas a Supabase, circuit breaker)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # =============================================
 # INCLUIR ROUTERS MODULARES
 # =============================================
@@ -145,6 +223,13 @@ app.include_router(
     tags=["Advances"]
 )
 
+# Pagos
+app.include_router(
+    payments.router,
+    prefix="/api/payments",
+    tags=["Payments"]
+)
+
 # Reportes y Dashboards
 app.include_router(
     reports.router,
@@ -152,57 +237,63 @@ app.include_router(
     tags=["Reports"]
 )
 
+# Sincronización incremental
+app.include_router(
+    changes.router,
+    prefix="/api/changes",
+    tags=["Changes"]
+)
+
+# Búsqueda global
+app.include_router(
+    search.router,
+    prefix="/api/search",
+    tags=["Search"]
+)
+
+# Trabajos en segundo plano
+app.include_router(
+    jobs.router,
+    prefix="/api/jobs",
+    tags=["Jobs"]
+)
+
 # =============================================
 # ENDPOINTS GENERALES DE STATS
 # =============================================
 
 @app.get("/api/stats/dashboard")
+@serve_stale_on_error
 async def get_dashboard_stats():
     """Estadísticas principales para el dashboard"""
     try:
-        from database import get_supabase
-        supabase = get_supabase()
-        
-        # Conteos básicos
-        suppliers_count = supabase.table('suppliers').select("count", count="exact").execute().count
-        pos_count = supabase.table('purchase_orders').select("count", count="exact").execute().count
-        invoices_count = supabase.table('invoices').select("count", count="exact").execute().count
-        shipments_count = supabase.table('shipments').select("count", count="exact").execute().count
-        
-        # Estadísticas financieras
-        invoices_pendientes = supabase.table('invoices').select("count", count="exact").eq('estado', 'pendiente').execute().count
-        invoices_pagadas = supabase.table('invoices').select("count", count="exact").eq('estado', 'pagada_completa').execute().count
-        
-        # Totales de órdenes
-        pos_result = supabase.table('purchase_orders').select('total_oc').execute()
-        total_pos_usd = sum(float(po.get('total_oc', 0)) for po in pos_result.data)
-        
-        # Totales de facturas
-        invoices_result = supabase.table('invoices').select('monto_total, saldo_pendiente').execute()
-        total_facturas = sum(float(inv.get('monto_total', 0)) for inv in invoices_result.data)
-        total_saldo_pendiente = sum(float(inv.get('saldo_pendiente', 0)) for inv in invoices_result.data)
+        supabase = get_supabase_read()
         
         return {
             "success": True,
-            "data": {
-                "conteos": {
-                    "suppliers": suppliers_count,
-                    "purchase_orders": pos_count,
-                    "invoices": invoices_count,
-                    "shipments": shipments_count
-                },
-                "financial": {
-                    "invoices_pendientes": invoices_pendientes,
-                    "invoices_pagadas": invoices_pagadas,
-                    "total_pos_usd": round(total_pos_usd, 2),
-                    "total_facturas": round(total_facturas, 2),
-                    "saldo_pendiente": round(total_saldo_pendiente, 2)
-                }
-            }
+            "data": compute_dashboard_stats(supabase)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
+@app.get("/api/stats/dashboard/stream")
+async def stream_dashboard_stats(request: Request):
+    """Stream SSE del dashboard: snapshot inicial y luego sólo los cambios
+    
+    Un único cálculo compartido se dispara tras las escrituras a la API y se
+    reparte a todos los suscriptores; sin suscriptores no se consulta la base.
+    """
+    return StreamingResponse(
+        dashboard_broadcaster.stream(request),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 # =============================================
 # EJECUTAR APLICACIÓN
 # =============================================
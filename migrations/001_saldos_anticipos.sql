@@ -0,0 +1,33 @@
+-- =============================================
+-- 001_saldos_anticipos.sql
+-- Saldos mantenidos de anticipos y total de anticipos por orden
+-- =============================================
+
+ALTER TABLE advance_payments
+    ADD COLUMN IF NOT EXISTS monto_aplicado NUMERIC NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS saldo_disponible NUMERIC NOT NULL DEFAULT 0;
+
+ALTER TABLE purchase_orders
+    ADD COLUMN IF NOT EXISTS total_anticipos NUMERIC NOT NULL DEFAULT 0;
+
+-- Poblar valores iniciales a partir de las aplicaciones existentes
+UPDATE advance_payments ap
+SET monto_aplicado = COALESCE(
+    (SELECT SUM(aa.monto_aplicado) FROM advance_allocation aa WHERE aa.anticipo_id = ap.id),
+    0
+);
+
+UPDATE advance_payments
+SET saldo_disponible = CASE
+    WHEN estado = 'devuelto' THEN 0
+    ELSE GREATEST(monto - monto_aplicado, 0)
+END;
+
+UPDATE purchase_orders po
+SET total_anticipos = COALESCE(
+    (SELECT SUM(ap.monto) FROM advance_payments ap WHERE ap.po_id = po.id),
+    0
+);
+
+CREATE INDEX IF NOT EXISTS idx_advance_allocation_anticipo_id ON advance_allocation (anticipo_id);
+CREATE INDEX IF NOT EXISTS idx_advance_payments_po_id ON advance_payments (po_id);
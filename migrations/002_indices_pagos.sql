@@ -0,0 +1,15 @@
+-- =============================================
+-- 002_indices_pagos.sql
+-- Índices para el listado de pagos filtrado por proveedor, fecha y método
+-- =============================================
+
+-- JOIN interno invoice_payment -> invoices filtrado por proveedor
+CREATE INDEX IF NOT EXISTS idx_invoices_supplier_id ON invoices (supplier_id);
+CREATE INDEX IF NOT EXISTS idx_invoice_payment_invoice_id_fecha ON invoice_payment (invoice_id, fecha DESC, id DESC);
+
+-- Listado general ordenado por fecha y filtros por rango de fechas / método
+CREATE INDEX IF NOT EXISTS idx_invoice_payment_fecha ON invoice_payment (fecha DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_invoice_payment_metodo_fecha ON invoice_payment (metodo_pago, fecha DESC, id DESC);
+
+-- Aplicaciones de pagos a vencimientos (source = 'pago', source_id = pago)
+CREATE INDEX IF NOT EXISTS idx_invoice_due_payment_source ON invoice_due_payment (source, source_id);
@@ -0,0 +1,16 @@
+-- =============================================
+-- 003_change_log.sql
+-- Registro de cambios (append-only) para la sincronización incremental
+-- del frontend: GET /api/changes?since=<cursor>
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS change_log (
+    id BIGSERIAL PRIMARY KEY,
+    entidad TEXT NOT NULL,
+    entidad_id UUID NOT NULL,
+    operacion TEXT NOT NULL CHECK (operacion IN ('upsert', 'delete')),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Limpieza periódica de entradas antiguas
+CREATE INDEX IF NOT EXISTS idx_change_log_created_at ON change_log (created_at);
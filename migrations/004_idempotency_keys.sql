@@ -0,0 +1,19 @@
+-- =============================================
+-- 004_idempotency_keys.sql
+-- Claves de idempotencia (header Idempotency-Key) para los POST de pagos,
+-- anticipos y facturas: la respuesta se guarda y se repite ante reintentos
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'en_proceso' CHECK (estado IN ('en_proceso', 'completado')),
+    status_code INTEGER,
+    response_body TEXT,
+    content_type TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Purga de claves vencidas
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
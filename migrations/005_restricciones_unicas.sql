@@ -0,0 +1,14 @@
+-- =============================================
+-- 005_restricciones_unicas.sql
+-- Unicidad garantizada por la base de datos (reemplaza las consultas de
+-- verificación previas a insertar/actualizar). Los nombres de los índices
+-- se usan en services/db_errors.py para devolver el mensaje correspondiente.
+--
+-- Si existen duplicados la creación falla; se pueden encontrar con, por ejemplo:
+--   SELECT nombre, count(*) FROM suppliers GROUP BY nombre HAVING count(*) > 1;
+-- =============================================
+
+CREATE UNIQUE INDEX IF NOT EXISTS suppliers_nombre_key ON suppliers (nombre);
+CREATE UNIQUE INDEX IF NOT EXISTS purchase_orders_numero_orden_key ON purchase_orders (numero_orden);
+CREATE UNIQUE INDEX IF NOT EXISTS invoices_supplier_numero_factura_key ON invoices (supplier_id, numero_factura);
+CREATE UNIQUE INDEX IF NOT EXISTS shipments_codigo_key ON shipments (codigo);
@@ -0,0 +1,116 @@
+-- =============================================
+-- 006_eliminaciones_rpc.sql
+-- Eliminación en cascada de facturas, embarques y órdenes de compra en una
+-- sola transacción (supabase.rpc). Verifican dependencias, borran las filas
+-- de vínculo y el registro principal; ante cualquier error no queda nada a
+-- medio borrar.
+--
+-- Errores (traducidos en services/db_errors.py):
+--   P0002 -> 404 (registro no encontrado)
+--   P0001 -> 400 (tiene dependencias que impiden eliminar)
+-- =============================================
+
+CREATE OR REPLACE FUNCTION delete_invoice_cascade(p_invoice_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_numero_factura TEXT;
+    v_pagos INTEGER;
+    v_anticipos INTEGER;
+    v_embarques UUID[];
+BEGIN
+    -- El bloqueo impide registrar pagos o aplicaciones mientras se elimina
+    SELECT numero_factura INTO v_numero_factura
+    FROM invoices WHERE id = p_invoice_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Factura no encontrada' USING ERRCODE = 'P0002';
+    END IF;
+
+    SELECT count(*) INTO v_pagos FROM invoice_payment WHERE invoice_id = p_invoice_id;
+    SELECT count(*) INTO v_anticipos FROM advance_allocation WHERE invoice_id = p_invoice_id;
+
+    IF v_pagos > 0 OR v_anticipos > 0 THEN
+        RAISE EXCEPTION 'No se puede eliminar: tiene % pagos y % anticipos aplicados', v_pagos, v_anticipos
+            USING ERRCODE = 'P0001';
+    END IF;
+
+    DELETE FROM invoice_due WHERE invoice_id = p_invoice_id;
+    DELETE FROM invoice_po WHERE invoice_id = p_invoice_id;
+
+    WITH removed AS (
+        DELETE FROM shipment_invoice WHERE invoice_id = p_invoice_id RETURNING shipment_id
+    )
+    SELECT coalesce(array_agg(DISTINCT shipment_id), '{}') INTO v_embarques FROM removed;
+
+    DELETE FROM invoices WHERE id = p_invoice_id;
+
+    RETURN jsonb_build_object(
+        'numero_factura', v_numero_factura,
+        'shipment_ids', to_jsonb(v_embarques)
+    );
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_shipment_cascade(p_shipment_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_codigo TEXT;
+    v_facturas INTEGER;
+BEGIN
+    SELECT codigo INTO v_codigo
+    FROM shipments WHERE id = p_shipment_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Embarque no encontrado' USING ERRCODE = 'P0002';
+    END IF;
+
+    SELECT count(*) INTO v_facturas FROM shipment_invoice WHERE shipment_id = p_shipment_id;
+
+    IF v_facturas > 0 THEN
+        RAISE EXCEPTION 'No se puede eliminar: tiene % facturas asociadas', v_facturas
+            USING ERRCODE = 'P0001';
+    END IF;
+
+    DELETE FROM shipment_supplier WHERE shipment_id = p_shipment_id;
+    DELETE FROM shipments WHERE id = p_shipment_id;
+
+    RETURN jsonb_build_object('codigo', v_codigo);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION delete_purchase_order_cascade(p_po_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_numero_orden TEXT;
+    v_anticipos INTEGER;
+    v_facturas INTEGER;
+BEGIN
+    SELECT numero_orden INTO v_numero_orden
+    FROM purchase_orders WHERE id = p_po_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Orden de compra no encontrada' USING ERRCODE = 'P0002';
+    END IF;
+
+    SELECT count(*) INTO v_anticipos FROM advance_payments WHERE po_id = p_po_id;
+    SELECT count(*) INTO v_facturas FROM invoice_po WHERE po_id = p_po_id;
+
+    IF v_anticipos > 0 OR v_facturas > 0 THEN
+        RAISE EXCEPTION 'No se puede eliminar: tiene % anticipos y % facturas asociadas', v_anticipos, v_facturas
+            USING ERRCODE = 'P0001';
+    END IF;
+
+    DELETE FROM purchase_orders WHERE id = p_po_id;
+
+    RETURN jsonb_build_object('numero_orden', v_numero_orden);
+END;
+$$;
@@ -0,0 +1,51 @@
+-- =============================================
+-- 007_vinculos_embarques_rpc.sql
+-- Sincronización de proveedores de un embarque en una sola transacción:
+-- inserta los agregados y elimina los quitados (sin ventana en la que el
+-- embarque quede sin proveedores).
+-- =============================================
+
+CREATE OR REPLACE FUNCTION sync_shipment_suppliers(p_shipment_id UUID, p_supplier_ids UUID[])
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_codigo TEXT;
+    v_agregados INTEGER;
+    v_eliminados INTEGER;
+BEGIN
+    -- El bloqueo serializa sincronizaciones concurrentes del mismo embarque
+    SELECT codigo INTO v_codigo
+    FROM shipments WHERE id = p_shipment_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Embarque no encontrado' USING ERRCODE = 'P0002';
+    END IF;
+
+    DELETE FROM shipment_supplier
+    WHERE shipment_id = p_shipment_id
+      AND supplier_id <> ALL (p_supplier_ids);
+    GET DIAGNOSTICS v_eliminados = ROW_COUNT;
+
+    INSERT INTO shipment_supplier (id, shipment_id, supplier_id, created_at)
+    SELECT gen_random_uuid(), p_shipment_id, nuevo.supplier_id, now()
+    FROM (SELECT DISTINCT unnest(p_supplier_ids) AS supplier_id) nuevo
+    WHERE NOT EXISTS (
+        SELECT 1 FROM shipment_supplier actual
+        WHERE actual.shipment_id = p_shipment_id
+          AND actual.supplier_id = nuevo.supplier_id
+    );
+    GET DIAGNOSTICS v_agregados = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'codigo', v_codigo,
+        'agregados', v_agregados,
+        'eliminados', v_eliminados
+    );
+END;
+$$;
+
+-- Búsquedas de vínculos por embarque
+CREATE INDEX IF NOT EXISTS idx_shipment_supplier_shipment ON shipment_supplier (shipment_id, supplier_id);
+CREATE INDEX IF NOT EXISTS idx_shipment_invoice_shipment ON shipment_invoice (shipment_id, invoice_id);
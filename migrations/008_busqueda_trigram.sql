@@ -0,0 +1,102 @@
+-- =============================================
+-- 008_busqueda_trigram.sql
+-- Índices trigram para búsqueda por texto y función de búsqueda global.
+-- Los índices GIN gin_trgm_ops sirven tanto para ILIKE '%texto%' (filtros
+-- search= de los listados) como para el operador de similitud %.
+-- =============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_invoices_numero_factura_trgm ON invoices USING GIN (numero_factura gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_purchase_orders_numero_orden_trgm ON purchase_orders USING GIN (numero_orden gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_suppliers_nombre_trgm ON suppliers USING GIN (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_shipments_codigo_trgm ON shipments USING GIN (codigo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_shipments_numero_contenedor_trgm ON shipments USING GIN (numero_contenedor gin_trgm_ops);
+
+-- Relevancia: coincidencia exacta 1.0, prefijo 0.9, si no similitud trigram
+CREATE OR REPLACE FUNCTION search_rank(p_value TEXT, p_query TEXT, p_prefix TEXT)
+RETURNS REAL
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN p_value IS NULL THEN 0
+        WHEN lower(p_value) = p_query THEN 1.0
+        WHEN p_value ILIKE p_prefix THEN 0.9
+        ELSE similarity(p_value, p_query)
+    END::REAL;
+$$;
+
+-- Resultados tipados y ordenados por relevancia, con límite por tipo
+CREATE OR REPLACE FUNCTION search_global(
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 5,
+    p_tipos TEXT[] DEFAULT ARRAY['factura', 'orden', 'proveedor', 'embarque']
+)
+RETURNS TABLE (tipo TEXT, id UUID, titulo TEXT, detalle JSONB, score REAL)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_query TEXT := lower(trim(p_query));
+    v_escaped TEXT;
+    v_pattern TEXT;
+    v_prefix TEXT;
+BEGIN
+    -- Escapar comodines de LIKE presentes en el texto buscado
+    v_escaped := replace(replace(replace(v_query, '\', '\\'), '%', '\%'), '_', '\_');
+    v_pattern := '%' || v_escaped || '%';
+    v_prefix := v_escaped || '%';
+
+    IF 'factura' = ANY (p_tipos) THEN
+        RETURN QUERY
+        SELECT 'factura'::TEXT, i.id, i.numero_factura::TEXT,
+               jsonb_build_object('proveedor', s.nombre, 'monto_total', i.monto_total,
+                                  'moneda', i.moneda, 'estado', i.estado),
+               search_rank(i.numero_factura, v_query, v_prefix) AS rank
+        FROM invoices i
+        LEFT JOIN suppliers s ON s.id = i.supplier_id
+        WHERE i.numero_factura ILIKE v_pattern OR i.numero_factura % v_query
+        ORDER BY rank DESC, i.numero_factura
+        LIMIT p_limit;
+    END IF;
+
+    IF 'orden' = ANY (p_tipos) THEN
+        RETURN QUERY
+        SELECT 'orden'::TEXT, po.id, po.numero_orden::TEXT,
+               jsonb_build_object('proveedor', s.nombre, 'total_oc', po.total_oc,
+                                  'moneda', po.moneda, 'estado', po.estado),
+               search_rank(po.numero_orden, v_query, v_prefix) AS rank
+        FROM purchase_orders po
+        LEFT JOIN suppliers s ON s.id = po.supplier_id
+        WHERE po.numero_orden ILIKE v_pattern OR po.numero_orden % v_query
+        ORDER BY rank DESC, po.numero_orden
+        LIMIT p_limit;
+    END IF;
+
+    IF 'proveedor' = ANY (p_tipos) THEN
+        RETURN QUERY
+        SELECT 'proveedor'::TEXT, s.id, s.nombre::TEXT,
+               jsonb_build_object('contacto', s.contacto, 'activo', s.activo),
+               search_rank(s.nombre, v_query, v_prefix) AS rank
+        FROM suppliers s
+        WHERE s.nombre ILIKE v_pattern OR s.nombre % v_query
+        ORDER BY rank DESC, s.nombre
+        LIMIT p_limit;
+    END IF;
+
+    IF 'embarque' = ANY (p_tipos) THEN
+        RETURN QUERY
+        SELECT 'embarque'::TEXT, sh.id, sh.codigo::TEXT,
+               jsonb_build_object('numero_contenedor', sh.numero_contenedor, 'naviera', sh.naviera,
+                                  'estado', sh.estado, 'fecha_llegada_estimada', sh.fecha_llegada_estimada),
+               GREATEST(search_rank(sh.codigo, v_query, v_prefix),
+                        search_rank(sh.numero_contenedor, v_query, v_prefix)) AS rank
+        FROM shipments sh
+        WHERE sh.codigo ILIKE v_pattern OR sh.codigo % v_query
+           OR sh.numero_contenedor ILIKE v_pattern OR sh.numero_contenedor % v_query
+        ORDER BY rank DESC, sh.codigo
+        LIMIT p_limit;
+    END IF;
+END;
+$$;
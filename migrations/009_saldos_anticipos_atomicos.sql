@@ -0,0 +1,78 @@
+-- =============================================
+-- 009_saldos_anticipos_atomicos.sql
+-- Actualización atómica de los saldos mantenidos de anticipos (migración 001).
+-- El incremento se hace en la misma sentencia UPDATE (columna + delta) y el
+-- límite se verifica en la condición del UPDATE, así dos escrituras
+-- concurrentes sobre la misma orden o anticipo no pierden actualizaciones ni
+-- superan el tope.
+--
+-- Errores (traducidos en services/db_errors.py):
+--   P0002 -> 404 (orden o anticipo no encontrado)
+--   P0001 -> 400 (se superaría el total de la orden o el saldo del anticipo)
+-- =============================================
+
+CREATE OR REPLACE FUNCTION adjust_po_advance_total(p_po_id UUID, p_delta NUMERIC)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_total NUMERIC;
+    v_total_oc NUMERIC;
+BEGIN
+    -- Los aumentos no pueden superar el total de la orden; las disminuciones siempre se aplican
+    UPDATE purchase_orders
+    SET total_anticipos = GREATEST(total_anticipos + p_delta, 0)
+    WHERE id = p_po_id
+      AND (p_delta <= 0 OR total_anticipos + p_delta <= total_oc + 0.005)
+    RETURNING total_anticipos INTO v_total;
+
+    IF FOUND THEN
+        RETURN v_total;
+    END IF;
+
+    SELECT total_anticipos, total_oc INTO v_total, v_total_oc FROM purchase_orders WHERE id = p_po_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Orden de compra no encontrada' USING ERRCODE = 'P0002';
+    END IF;
+
+    RAISE EXCEPTION 'Total de anticipos (%) excedería el total de la orden (%)', v_total + p_delta, v_total_oc
+        USING ERRCODE = 'P0001';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION apply_advance_allocation(p_advance_id UUID, p_monto NUMERIC)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row advance_payments%ROWTYPE;
+BEGIN
+    UPDATE advance_payments
+    SET monto_aplicado = monto_aplicado + p_monto,
+        saldo_disponible = GREATEST(monto - (monto_aplicado + p_monto), 0),
+        -- El anticipo se agota cuando no queda saldo
+        estado = CASE WHEN monto - (monto_aplicado + p_monto) <= 0 THEN 'aplicado' ELSE estado END
+    WHERE id = p_advance_id
+      AND estado = 'disponible'
+      AND saldo_disponible + 0.005 >= p_monto
+    RETURNING * INTO v_row;
+
+    IF FOUND THEN
+        RETURN to_jsonb(v_row);
+    END IF;
+
+    SELECT * INTO v_row FROM advance_payments WHERE id = p_advance_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Anticipo no encontrado' USING ERRCODE = 'P0002';
+    END IF;
+
+    IF v_row.estado <> 'disponible' THEN
+        RAISE EXCEPTION 'El anticipo no está disponible' USING ERRCODE = 'P0001';
+    END IF;
+
+    RAISE EXCEPTION 'Monto a aplicar (%) excede el disponible (%)', p_monto, v_row.saldo_disponible
+        USING ERRCODE = 'P0001';
+END;
+$$;
@@ -0,0 +1,14 @@
+-- =============================================
+-- 010_idempotency_lease.sql
+-- Plazo de las reclamaciones de idempotencia: una clave 'en_proceso' cuyo
+-- locked_until venció (la instancia que la tomó murió sin guardar respuesta)
+-- puede ser tomada por un reintento con la misma petición
+-- =============================================
+
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS locked_until TIMESTAMPTZ;
+
+UPDATE idempotency_keys SET locked_until = created_at + interval '2 minutes' WHERE locked_until IS NULL;
+
+ALTER TABLE idempotency_keys
+    ALTER COLUMN locked_until SET DEFAULT now() + interval '2 minutes',
+    ALTER COLUMN locked_until SET NOT NULL;
@@ -0,0 +1,108 @@
+-- =============================================
+-- 011_change_log_triggers.sql
+-- change_log se escribe con triggers, en la misma transacción que el cambio:
+-- una escritura confirmada siempre tiene su entrada y una revertida no deja
+-- ninguna. Las tablas de vínculo y vencimientos registran un upsert de cada
+-- recurso padre, como hacía la aplicación.
+--
+-- created_at pasa a clock_timestamp() (momento del INSERT, no del inicio de
+-- la transacción): /api/changes sólo avanza el cursor sobre entradas con
+-- más de CHANGES_SAFETY_SECONDS, para no saltar ids de transacciones que
+-- todavía no confirmaron.
+-- =============================================
+
+ALTER TABLE change_log ALTER COLUMN created_at SET DEFAULT clock_timestamp();
+
+-- Lectura por id y purga por antigüedad
+CREATE INDEX IF NOT EXISTS idx_change_log_entidad_id ON change_log (entidad, id);
+
+-- Entidades publicadas: una entrada por fila modificada
+CREATE OR REPLACE FUNCTION log_entity_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO change_log (entidad, entidad_id, operacion) VALUES (TG_TABLE_NAME, OLD.id, 'delete');
+    ELSE
+        INSERT INTO change_log (entidad, entidad_id, operacion) VALUES (TG_TABLE_NAME, NEW.id, 'upsert');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Vínculos: upsert de los padres. Argumentos: pares (entidad, columna)
+CREATE OR REPLACE FUNCTION log_parent_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_old JSONB := CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END;
+    v_new JSONB := CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END;
+    i INT;
+BEGIN
+    FOR i IN 0 .. TG_NARGS - 1 BY 2 LOOP
+        -- Si el vínculo cambió de padre se registran ambos
+        INSERT INTO change_log (entidad, entidad_id, operacion)
+        SELECT DISTINCT TG_ARGV[i], parent_id::UUID, 'upsert'
+        FROM unnest(ARRAY[v_old ->> TG_ARGV[i + 1], v_new ->> TG_ARGV[i + 1]]) AS parent_id
+        WHERE parent_id IS NOT NULL;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+-- Pagos por vencimiento: el padre es la factura del vencimiento
+CREATE OR REPLACE FUNCTION log_due_payment_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO change_log (entidad, entidad_id, operacion)
+    SELECT DISTINCT 'invoices', d.invoice_id, 'upsert'
+    FROM invoice_due d
+    WHERE d.id IN (
+        CASE WHEN TG_OP <> 'INSERT' THEN OLD.due_id END,
+        CASE WHEN TG_OP <> 'DELETE' THEN NEW.due_id END
+    );
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['suppliers', 'purchase_orders', 'invoices', 'shipments', 'advance_payments', 'invoice_payment'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_change_log ON %I', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON %I FOR EACH ROW EXECUTE FUNCTION log_entity_change()',
+            v_table
+        );
+    END LOOP;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_change_log ON invoice_due;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON invoice_due
+    FOR EACH ROW EXECUTE FUNCTION log_parent_change('invoices', 'invoice_id');
+
+DROP TRIGGER IF EXISTS trg_change_log ON invoice_po;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON invoice_po
+    FOR EACH ROW EXECUTE FUNCTION log_parent_change('invoices', 'invoice_id', 'purchase_orders', 'po_id');
+
+DROP TRIGGER IF EXISTS trg_change_log ON shipment_supplier;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON shipment_supplier
+    FOR EACH ROW EXECUTE FUNCTION log_parent_change('shipments', 'shipment_id');
+
+DROP TRIGGER IF EXISTS trg_change_log ON shipment_invoice;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON shipment_invoice
+    FOR EACH ROW EXECUTE FUNCTION log_parent_change('shipments', 'shipment_id', 'invoices', 'invoice_id');
+
+DROP TRIGGER IF EXISTS trg_change_log ON advance_allocation;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON advance_allocation
+    FOR EACH ROW EXECUTE FUNCTION log_parent_change('invoices', 'invoice_id', 'advance_payments', 'anticipo_id');
+
+DROP TRIGGER IF EXISTS trg_change_log ON invoice_due_payment;
+CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON invoice_due_payment
+    FOR EACH ROW EXECUTE FUNCTION log_due_payment_change();
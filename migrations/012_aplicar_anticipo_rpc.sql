@@ -0,0 +1,68 @@
+-- =============================================
+-- 012_aplicar_anticipo_rpc.sql
+-- Aplicación de un anticipo a una factura en una sola transacción: descuento
+-- del saldo del anticipo (apply_advance_allocation, migración 009), registro
+-- en advance_allocation, pago del vencimiento (opcional) y saldo de la
+-- factura. Ante cualquier error no queda un descuento sin su aplicación.
+--
+-- Errores (traducidos en services/db_errors.py):
+--   P0002 -> 404 (factura, vencimiento o anticipo no encontrado)
+--   P0001 -> 400 (el monto excede el saldo de la factura o del anticipo)
+-- =============================================
+
+CREATE OR REPLACE FUNCTION apply_advance_to_invoice(
+    p_invoice_id UUID,
+    p_advance_id UUID,
+    p_monto NUMERIC,
+    p_due_id UUID DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_invoice invoices%ROWTYPE;
+BEGIN
+    -- Saldo de la factura descontado y verificado en la misma sentencia
+    UPDATE invoices
+    SET saldo_pendiente = GREATEST(saldo_pendiente - p_monto, 0),
+        estado = CASE WHEN saldo_pendiente - p_monto <= 0 THEN 'pagada_completa' ELSE 'pagada_parcial' END,
+        updated_at = now()
+    WHERE id = p_invoice_id
+      AND saldo_pendiente >= p_monto
+    RETURNING * INTO v_invoice;
+
+    IF NOT FOUND THEN
+        SELECT * INTO v_invoice FROM invoices WHERE id = p_invoice_id;
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Factura no encontrada' USING ERRCODE = 'P0002';
+        END IF;
+
+        RAISE EXCEPTION 'Monto a aplicar (%) excede el saldo pendiente (%)', p_monto, v_invoice.saldo_pendiente
+            USING ERRCODE = 'P0001';
+    END IF;
+
+    IF p_due_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM invoice_due WHERE id = p_due_id AND invoice_id = p_invoice_id
+    ) THEN
+        RAISE EXCEPTION 'Vencimiento no encontrado' USING ERRCODE = 'P0002';
+    END IF;
+
+    -- Verifica estado y disponible del anticipo y lo marca aplicado si se agotó
+    PERFORM apply_advance_allocation(p_advance_id, p_monto);
+
+    INSERT INTO advance_allocation (id, anticipo_id, invoice_id, monto_aplicado, fecha, created_at)
+    VALUES (gen_random_uuid(), p_advance_id, p_invoice_id, p_monto, now(), now());
+
+    IF p_due_id IS NOT NULL THEN
+        INSERT INTO invoice_due_payment (id, due_id, source, source_id, monto_aplicado, fecha, created_at)
+        VALUES (gen_random_uuid(), p_due_id, 'anticipo', p_advance_id, p_monto, now(), now());
+    END IF;
+
+    RETURN jsonb_build_object(
+        'monto_aplicado', p_monto,
+        'nuevo_saldo_factura', v_invoice.saldo_pendiente,
+        'nuevo_estado_factura', v_invoice.estado
+    );
+END;
+$$;
@@ -0,0 +1,69 @@
+-- =============================================
+-- 013_actualizar_anticipo_rpc.sql
+-- Actualización de un anticipo en una sola transacción. El saldo disponible
+-- se calcula en la sentencia UPDATE con el monto_aplicado vigente (no con el
+-- leído por la aplicación), y la fila queda bloqueada mientras se ajusta el
+-- total de anticipos de la orden (adjust_po_advance_total, migración 009):
+-- una aplicación concurrente espera y no se pierde.
+--
+-- Los parámetros NULL no modifican su columna.
+--
+-- Errores (traducidos en services/db_errors.py):
+--   P0002 -> 404 (anticipo u orden no encontrados)
+--   P0001 -> 400 (anticipo aplicado, monto menor a lo aplicado o mayor al total de la orden)
+-- =============================================
+
+CREATE OR REPLACE FUNCTION update_advance_payment(
+    p_advance_id UUID,
+    p_monto NUMERIC DEFAULT NULL,
+    p_fecha_pago DATE DEFAULT NULL,
+    p_metodo_pago TEXT DEFAULT NULL,
+    p_usuario_pago TEXT DEFAULT NULL,
+    p_notas TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_old advance_payments%ROWTYPE;
+    v_row advance_payments%ROWTYPE;
+BEGIN
+    SELECT * INTO v_old FROM advance_payments WHERE id = p_advance_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Anticipo no encontrado' USING ERRCODE = 'P0002';
+    END IF;
+
+    IF v_old.estado = 'aplicado' THEN
+        RAISE EXCEPTION 'No se puede modificar un anticipo que ya fue aplicado' USING ERRCODE = 'P0001';
+    END IF;
+
+    IF p_monto IS NOT NULL THEN
+        IF p_monto < v_old.monto_aplicado THEN
+            RAISE EXCEPTION 'El nuevo monto no puede ser menor a lo ya aplicado (%)', v_old.monto_aplicado
+                USING ERRCODE = 'P0001';
+        END IF;
+
+        IF p_monto <> v_old.monto THEN
+            PERFORM adjust_po_advance_total(v_old.po_id, p_monto - v_old.monto);
+        END IF;
+    END IF;
+
+    UPDATE advance_payments
+    SET monto = COALESCE(p_monto, monto),
+        -- Mismo criterio que compute_available_balance (services/advance_service.py)
+        saldo_disponible = CASE
+            WHEN p_monto IS NULL THEN saldo_disponible
+            WHEN estado = 'devuelto' THEN 0
+            ELSE ROUND(GREATEST(p_monto - monto_aplicado, 0), 2)
+        END,
+        fecha_pago = COALESCE(p_fecha_pago, fecha_pago),
+        metodo_pago = COALESCE(p_metodo_pago, metodo_pago),
+        usuario_pago = COALESCE(p_usuario_pago, usuario_pago),
+        notas = COALESCE(p_notas, notas)
+    WHERE id = p_advance_id
+    RETURNING * INTO v_row;
+
+    RETURN to_jsonb(v_row);
+END;
+$$;
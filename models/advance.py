@@ -0,0 +1,40 @@
+# =============================================
+# models/advance.py - Modelo de Anticipos
+# =============================================
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from models.common import ResourceModel
+
+
+class AdvancePaymentBase(BaseModel):
+    po_id: UUID
+    monto: Decimal = Field(..., gt=0)
+    moneda: str = Field(..., pattern="^(USD|CLP)$")
+    fecha_pago: date
+    metodo_pago: Optional[str] = None
+    usuario_pago: Optional[str] = None
+    estado: str = Field(default="disponible", pattern="^(disponible|aplicado|devuelto)$")
+    notas: Optional[str] = None
+
+class AdvancePaymentCreate(AdvancePaymentBase):
+    pass
+
+class AdvancePayment(ResourceModel):
+    id: str
+    po_id: Optional[str] = None
+    monto: Optional[float] = None
+    moneda: Optional[str] = None
+    fecha_pago: Optional[date] = None
+    metodo_pago: Optional[str] = None
+    usuario_pago: Optional[str] = None
+    estado: Optional[str] = None
+    monto_aplicado: Optional[float] = None
+    saldo_disponible: Optional[float] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
@@ -0,0 +1,39 @@
+# =============================================
+# models/common.py - Envoltorios de respuesta
+# =============================================
+#
+# Todas las respuestas siguen el formato {success, data, message}; los
+# listados agregan los datos de paginación. Los modelos de recurso permiten
+# campos extra para conservar las relaciones embebidas y los campos calculados
+# que agregan algunos endpoints, y se usan con response_model_exclude_unset
+# para no rellenar las columnas omitidas con fields=.
+
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel, ConfigDict
+
+T = TypeVar('T')
+
+
+class ResourceModel(BaseModel):
+    """Base de los modelos de respuesta (filas de Supabase)"""
+    model_config = ConfigDict(extra='allow', from_attributes=True)
+
+
+class ItemResponse(BaseModel, Generic[T]):
+    model_config = ConfigDict(extra='allow')
+
+    success: bool = True
+    message: Optional[str] = None
+    data: T
+
+
+class ListResponse(BaseModel, Generic[T]):
+    model_config = ConfigDict(extra='allow')
+
+    success: bool = True
+    data: List[T]
+    total: int
+    page: int
+    per_page: int
+    pages: int
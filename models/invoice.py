@@ -0,0 +1,55 @@
+# =============================================
+# models/invoice.py - Modelo de Facturas
+# =============================================
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from models.common import ResourceModel
+from models.supplier import SupplierRef
+
+
+class InvoiceBase(BaseModel):
+    supplier_id: UUID
+    numero_factura: str = Field(..., min_length=1)
+    fecha_emision: Optional[date] = None
+    moneda: str = Field(..., pattern="^(USD|CLP)$")
+    monto_total: Decimal = Field(..., gt=0)
+    estado: str = "pendiente"
+    tipo_factura: Optional[str] = None
+    concepto: Optional[str] = None
+    notas: Optional[str] = None
+
+class InvoiceCreate(InvoiceBase):
+    pass
+
+class InvoiceUpdate(BaseModel):
+    supplier_id: Optional[UUID] = None
+    numero_factura: Optional[str] = Field(default=None, min_length=1)
+    fecha_emision: Optional[date] = None
+    moneda: Optional[str] = Field(default=None, pattern="^(USD|CLP)$")
+    monto_total: Optional[Decimal] = Field(default=None, gt=0)
+    estado: Optional[str] = None
+    tipo_factura: Optional[str] = None
+    concepto: Optional[str] = None
+    notas: Optional[str] = None
+
+class Invoice(ResourceModel):
+    id: str
+    supplier_id: Optional[str] = None
+    numero_factura: Optional[str] = None
+    fecha_emision: Optional[date] = None
+    moneda: Optional[str] = None
+    monto_total: Optional[float] = None
+    saldo_pendiente: Optional[float] = None
+    estado: Optional[str] = None
+    tipo_factura: Optional[str] = None
+    concepto: Optional[str] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    suppliers: Optional[SupplierRef] = None
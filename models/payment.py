@@ -0,0 +1,19 @@
+# =============================================
+# models/payment.py - Modelo de Pagos de Facturas
+# =============================================
+
+from datetime import date, datetime
+from typing import Optional
+
+from models.common import ResourceModel
+
+
+class InvoicePayment(ResourceModel):
+    id: str
+    invoice_id: Optional[str] = None
+    monto_pagado: Optional[float] = None
+    fecha: Optional[date] = None
+    metodo_pago: Optional[str] = None
+    referencia: Optional[str] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
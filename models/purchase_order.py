@@ -0,0 +1,49 @@
+# =============================================
+# models/purchase_order.py - Modelo de Órdenes de Compra
+# =============================================
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from models.common import ResourceModel
+from models.supplier import SupplierRef
+
+
+class PurchaseOrderBase(BaseModel):
+    supplier_id: UUID
+    numero_orden: str = Field(..., min_length=1)
+    moneda: str = Field(..., pattern="^(USD|CLP)$")
+    total_oc: Decimal = Field(..., gt=0)
+    fecha: Optional[date] = None
+    estado: str = "pendiente"
+    notas: Optional[str] = None
+
+class PurchaseOrderCreate(PurchaseOrderBase):
+    pass
+
+class PurchaseOrderUpdate(BaseModel):
+    supplier_id: Optional[UUID] = None
+    numero_orden: Optional[str] = Field(default=None, min_length=1)
+    moneda: Optional[str] = Field(default=None, pattern="^(USD|CLP)$")
+    total_oc: Optional[Decimal] = Field(default=None, gt=0)
+    fecha: Optional[date] = None
+    estado: Optional[str] = None
+    notas: Optional[str] = None
+
+class PurchaseOrder(ResourceModel):
+    id: str
+    supplier_id: Optional[str] = None
+    numero_orden: Optional[str] = None
+    moneda: Optional[str] = None
+    total_oc: Optional[float] = None
+    total_anticipos: Optional[float] = None
+    fecha: Optional[date] = None
+    estado: Optional[str] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    suppliers: Optional[SupplierRef] = None
@@ -0,0 +1,267 @@
+# =============================================
+# models/report.py - Modelos de respuesta de Reportes
+# =============================================
+#
+# Los reportes arman sus agregados en el handler: los modelos describen esos
+# campos calculados. Las filas de Supabase que se devuelven tal cual usan los
+# modelos de recurso (campos extra permitidos).
+
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel
+
+from models.advance import AdvancePayment
+from models.common import ResourceModel
+from models.invoice import Invoice
+from models.purchase_order import PurchaseOrder
+from models.shipment import Shipment
+from models.supplier import Supplier
+
+
+class ReportSupplier(BaseModel):
+    """Proveedor identificado por id y nombre"""
+    id: str
+    nombre: Optional[str] = None
+
+# =============================================
+# DASHBOARD EJECUTIVO
+# =============================================
+
+class DashboardCounts(BaseModel):
+    suppliers: Optional[int] = None
+    purchase_orders: Optional[int] = None
+    invoices: Optional[int] = None
+    shipments: Optional[int] = None
+
+class DashboardOrders(BaseModel):
+    total_usd: float
+    total_clp: float
+    por_estado: Dict[str, int]
+
+class DashboardInvoices(BaseModel):
+    total_usd: float
+    total_clp: float
+    saldo_pendiente_usd: float
+    saldo_pendiente_clp: float
+    por_estado: Dict[str, int]
+
+class DashboardAdvances(BaseModel):
+    total_usd: float
+    total_clp: float
+    disponibles_usd: float
+    disponibles_clp: float
+
+class DashboardFinancial(BaseModel):
+    ordenes_compra: DashboardOrders
+    facturas: DashboardInvoices
+    anticipos: DashboardAdvances
+
+class DashboardShipments(BaseModel):
+    por_estado: Dict[str, int]
+
+class TopSupplier(BaseModel):
+    nombre: Optional[str] = None
+    total_ordenes: float
+
+class DashboardAlert(BaseModel):
+    tipo: str
+    cantidad: int
+    mensaje: str
+
+class ExecutiveDashboard(BaseModel):
+    conteos: DashboardCounts
+    financiero: DashboardFinancial
+    embarques: DashboardShipments
+    top_suppliers: List[TopSupplier]
+    alertas: List[DashboardAlert]
+    ultima_actualizacion: str
+
+# =============================================
+# CONCILIACIÓN DE ÓRDENES
+# =============================================
+
+class ReconciliationSummary(BaseModel):
+    total_ordenes: int
+    completas: int
+    pendientes: int
+    porcentaje_completitud: float
+
+class ReconciliationOrder(BaseModel):
+    id: str
+    numero: Optional[str] = None
+    proveedor: Optional[str] = None
+    total: float
+    moneda: Optional[str] = None
+    estado: Optional[str] = None
+
+class ReconciliationInvoices(BaseModel):
+    total: float
+    saldo_pendiente: float
+    cantidad: int
+
+class ReconciliationAdvances(BaseModel):
+    total_pagado: float
+    aplicados: float
+    disponibles: float
+
+class ReconciliationBalance(BaseModel):
+    oc_vs_facturas: float
+    cobertura_anticipos: float
+
+class ReconciliationRow(BaseModel):
+    orden: ReconciliationOrder
+    facturas: ReconciliationInvoices
+    anticipos: ReconciliationAdvances
+    balance: ReconciliationBalance
+    estado_conciliacion: str
+
+class OrdersReconciliation(BaseModel):
+    resumen: ReconciliationSummary
+    ordenes: List[ReconciliationRow]
+
+# =============================================
+# FLUJO DE CAJA PROYECTADO
+# =============================================
+
+class CashFlowPeriod(BaseModel):
+    inicio: str
+    fin: str
+    semanas: int
+
+class CashFlowSummary(BaseModel):
+    total_salidas_usd: float
+    total_salidas_clp: float
+    anticipos_disponibles_usd: float
+    anticipos_disponibles_clp: float
+    cobertura_usd: float
+    cobertura_clp: float
+
+class CashFlowDue(BaseModel):
+    fecha: str
+    monto: float
+    moneda: Optional[str] = None
+    factura: Optional[str] = None
+    proveedor: Optional[str] = None
+
+class CashFlowWeek(BaseModel):
+    fecha_inicio: str
+    fecha_fin: str
+    salidas_usd: float
+    salidas_clp: float
+    vencimientos: List[CashFlowDue]
+
+class CashFlowProjection(BaseModel):
+    periodo: CashFlowPeriod
+    resumen: CashFlowSummary
+    # Clave: número de semana desde hoy ("1", "2", ...); sólo semanas con vencimientos
+    proyeccion_semanal: Dict[str, CashFlowWeek]
+
+# =============================================
+# VENCIMIENTOS PRÓXIMOS
+# =============================================
+
+class CurrencyTotals(BaseModel):
+    usd: float
+    clp: float
+
+class UpcomingDuesGroup(BaseModel):
+    cantidad: int
+    totales: CurrencyTotals
+
+class UpcomingDuesSummary(BaseModel):
+    total_vencimientos: int
+    vencidos: UpcomingDuesGroup
+    proximos_7_dias: UpcomingDuesGroup
+    proximos_30_dias: UpcomingDuesGroup
+
+class UpcomingDue(ResourceModel):
+    """Vencimiento con su factura embebida y la urgencia calculada"""
+    dias_hasta_vencimiento: int
+    urgencia: str
+
+class UpcomingDuesLists(BaseModel):
+    vencidos: List[UpcomingDue]
+    proximos_7_dias: List[UpcomingDue]
+    proximos_30_dias: List[UpcomingDue]
+
+class UpcomingDues(BaseModel):
+    resumen: UpcomingDuesSummary
+    vencimientos: UpcomingDuesLists
+
+# =============================================
+# ANTIGÜEDAD DE SALDOS
+# =============================================
+
+class AgingBucket(BaseModel):
+    tramo: str
+    dias_desde: Optional[int] = None
+    dias_hasta: Optional[int] = None
+
+class AgingRow(BaseModel):
+    proveedor: ReportSupplier
+    moneda: str
+    # Monto por tramo (claves de "tramos")
+    tramos: Dict[str, float]
+    total: float
+    vencido: float
+    cantidad_vencimientos: int
+    dias_atraso_promedio: float
+
+class ApAging(BaseModel):
+    fecha_corte: str
+    tramos: List[AgingBucket]
+    # Por moneda: monto de cada tramo, total y cantidad_vencimientos
+    totales_por_moneda: Dict[str, Dict[str, Union[int, float]]]
+    proveedores: List[AgingRow]
+
+# =============================================
+# PROVEEDOR
+# =============================================
+
+class SupplierStats(BaseModel):
+    total_ordenes: float
+    total_facturas: float
+    saldo_pendiente: float
+    total_anticipos: float
+    cantidad_ordenes: int
+    cantidad_facturas: int
+    cantidad_embarques: int
+    vencimientos_proximos: int
+
+class SupplierDetailReport(BaseModel):
+    proveedor: Supplier
+    estadisticas: SupplierStats
+    ordenes_compra: List[PurchaseOrder]
+    facturas: List[Invoice]
+    anticipos: List[AdvancePayment]
+    embarques: List[Shipment]
+    vencimientos_proximos: List[ResourceModel]
+
+class StatementBalance(BaseModel):
+    facturas_pendientes: float
+    anticipos_disponibles: float
+    neto: float
+
+class StatementMovement(BaseModel):
+    fecha: str
+    tipo: str
+    id: str
+    documento: Optional[str] = None
+    referencia: Optional[str] = None
+    moneda: Optional[str] = None
+    cargo: float
+    abono: float
+    anticipo: float
+    saldo: StatementBalance
+
+class StatementPeriod(BaseModel):
+    desde: Optional[str] = None
+    hasta: Optional[str] = None
+
+class SupplierStatementPage(BaseModel):
+    proveedor: ReportSupplier
+    periodo: StatementPeriod
+    saldo_inicial: Dict[str, StatementBalance]
+    movimientos: List[StatementMovement]
+    saldo_final: Dict[str, StatementBalance]
+    siguiente_cursor: Optional[str] = None
@@ -0,0 +1,31 @@
+# =============================================
+# models/shipment.py - Modelo de Embarques
+# =============================================
+
+from datetime import date, datetime
+from typing import List, Optional
+
+from models.common import ResourceModel
+from models.supplier import SupplierRef
+
+
+class ShipmentInvoiceRef(ResourceModel):
+    """Factura asociada a un embarque con su monto asignado"""
+    monto_asignado: Optional[float] = None
+
+class Shipment(ResourceModel):
+    id: str
+    codigo: Optional[str] = None
+    puerto_origen: Optional[str] = None
+    puerto_destino: Optional[str] = None
+    fecha_embarque: Optional[date] = None
+    fecha_llegada_estimada: Optional[date] = None
+    fecha_llegada_real: Optional[date] = None
+    estado: Optional[str] = None
+    naviera: Optional[str] = None
+    numero_contenedor: Optional[str] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    suppliers: Optional[List[SupplierRef]] = None
+    invoices: Optional[List[ShipmentInvoiceRef]] = None
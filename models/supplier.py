@@ -0,0 +1,44 @@
+# =============================================
+# models/supplier.py - Modelo de Proveedores
+# =============================================
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from models.common import ResourceModel
+
+
+class SupplierBase(BaseModel):
+    nombre: str = Field(..., min_length=1)
+    activo: bool = True
+    puerto_salida_default: Optional[str] = None
+    contacto: Optional[str] = None
+    notas: Optional[str] = None
+
+class SupplierCreate(SupplierBase):
+    pass
+
+class SupplierUpdate(BaseModel):
+    nombre: Optional[str] = Field(default=None, min_length=1)
+    activo: Optional[bool] = None
+    puerto_salida_default: Optional[str] = None
+    contacto: Optional[str] = None
+    notas: Optional[str] = None
+
+class SupplierRef(ResourceModel):
+    """Proveedor embebido en otros recursos"""
+    id: Optional[str] = None
+    nombre: Optional[str] = None
+    contacto: Optional[str] = None
+
+class Supplier(ResourceModel):
+    id: str
+    nombre: Optional[str] = None
+    activo: Optional[bool] = None
+    puerto_salida_default: Optional[str] = None
+    contacto: Optional[str] = None
+    notas: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
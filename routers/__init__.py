@@ -9,6 +9,9 @@ from .shipments import router as shipments_router
 from .advances import router as advances_router
 from .payments import router as payments_router
 from .reports import router as reports_router
+from .changes import router as changes_router
+from .search import router as search_router
+from .jobs import router as jobs_router
 
 __all__ = [
     "suppliers_router",
@@ -17,35 +20,8 @@ __all__ = [
     "shipments_router",
     "advances_router",
     "payments_router",
-    "reports_router"
+    "reports_router",
+    "changes_router",
+    "search_router",
+    "jobs_router"
 ]
-
-# =============================================
-# main.py - Actualizado con todos los routers
-# =============================================
-
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
-import uvicorn
-
-# Configuración
-from config import settings
-from database import init_database
-
-# Routers
-from routers import (
-    suppliers_router, 
-    purchase_orders_router, 
-    invoices_router, 
-    shipments_router, 
-    advances_router,
-    payments_router,
-    reports_router
-)
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    print("🚀 Iniciando SGF - Sistema de Gestión Financiera")
-    print("🔧 Conectando a base de datos...")
\ No newline at end of file
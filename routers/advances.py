@@ -5,26 +5,35 @@ import uuid
 from datetime import datetime, date
 from decimal import Decimal
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
 from models.advance import AdvancePayment, AdvancePaymentCreate
+from services.advance_service import (
+    adjust_po_advance_total, compute_available_balance, reconcile_advance_balances, update_advance_payment
+)
+from services.pagination import iter_table
+from services.projections import LIST_FIELDS, select_columns
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=ListResponse[AdvancePayment], response_model_exclude_unset=True)
 async def get_advances(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     po_id: Optional[UUID] = None,
     estado: Optional[str] = None,
-    moneda: Optional[str] = None
+    moneda: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de anticipos con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Query con JOIN para incluir información de la orden y proveedor
-        query = supabase.table('advance_payments').select('''
-            *,
+        columns = select_columns('advance_payments', fields, LIST_FIELDS['advance_payments'])
+        query = supabase.table('advance_payments').select(f'''
+            {columns},
             purchase_orders!advance_payments_po_id_fkey(
                 numero_orden,
                 suppliers!purchase_orders_supplier_id_fkey(nombre)
@@ -42,7 +51,7 @@ async def get_advances(
             query = query.eq('moneda', moneda)
         
         # Contar total
-        count_query = supabase.table('advance_payments').select('*', count='exact')
+        count_query = supabase.table('advance_payments').select('id', count='exact', head=True)
         if po_id:
             count_query = count_query.eq('po_id', str(po_id))
         if estado:
@@ -68,17 +77,22 @@ async def get_advances(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo anticipos: {str(e)}")
 
-@router.get("/{advance_id}", response_model=dict)
-async def get_advance(advance_id: UUID):
+@router.get("/{advance_id}", response_model=ItemResponse[AdvancePayment], response_model_exclude_unset=True)
+async def get_advance(
+    advance_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener un anticipo específico"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('advance_payments').select('''
-            *,
+        result = supabase.table('advance_payments').select(f'''
+            {select_columns('advance_payments', fields)},
             purchase_orders!advance_payments_po_id_fkey(
                 numero_orden,
                 total_oc,
@@ -98,8 +112,6 @@ async def get_advance(advance_id: UUID):
         ''').eq('anticipo_id', str(advance_id)).execute()
         
         advance['aplicaciones'] = allocations_result.data
-        advance['monto_aplicado'] = sum(float(app['monto_aplicado']) for app in allocations_result.data)
-        advance['saldo_disponible'] = float(advance['monto']) - advance['monto_aplicado']
         
         return {
             "success": True,
@@ -111,7 +123,7 @@ async def get_advance(advance_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo anticipo: {str(e)}")
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=ItemResponse[AdvancePayment], response_model_exclude_unset=True)
 async def create_advance(advance_data: AdvancePaymentCreate):
     """Crear nuevo anticipo"""
     try:
@@ -119,7 +131,7 @@ async def create_advance(advance_data: AdvancePaymentCreate):
         
         # Verificar que la orden de compra existe
         po_result = supabase.table('purchase_orders').select('''
-            id, numero_orden, supplier_id, total_oc,
+            id, numero_orden, supplier_id, total_oc, total_anticipos,
             suppliers!purchase_orders_supplier_id_fkey(nombre, activo)
         ''').eq('id', str(advance_data.po_id)).execute()
         
@@ -132,27 +144,25 @@ async def create_advance(advance_data: AdvancePaymentCreate):
         if not supplier['activo']:
             raise HTTPException(status_code=400, detail="No se pueden crear anticipos para proveedores inactivos")
         
-        # Verificar que el monto del anticipo no exceda el total de la orden
-        existing_advances = supabase.table('advance_payments').select('monto').eq('po_id', str(advance_data.po_id)).execute()
-        total_advances = sum(float(adv['monto']) for adv in existing_advances.data)
-        nuevo_total = total_advances + float(advance_data.monto)
-        
-        if nuevo_total > float(po['total_oc']):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Total de anticipos ({nuevo_total}) excedería el total de la orden ({po['total_oc']})"
-            )
-        
         # Preparar datos
         advance_dict = advance_data.model_dump()
         advance_dict['id'] = str(uuid.uuid4())
         advance_dict['po_id'] = str(advance_data.po_id)
         advance_dict['monto'] = float(advance_data.monto)
         advance_dict['fecha_pago'] = advance_dict['fecha_pago'].isoformat()
+        advance_dict['monto_aplicado'] = 0
+        advance_dict['saldo_disponible'] = compute_available_balance(advance_dict['monto'], 0, advance_dict['estado'])
         advance_dict['created_at'] = datetime.utcnow().isoformat()
         
-        # Insertar
-        result = supabase.table('advance_payments').insert(advance_dict).execute()
+        # Reservar el monto en el total de la orden (atómico, 400 si excede el total de la orden)
+        adjust_po_advance_total(supabase, po['id'], advance_dict['monto'])
+        
+        # Insertar; si falla se libera la reserva
+        try:
+            result = supabase.table('advance_payments').insert(advance_dict).execute()
+        except Exception:
+            adjust_po_advance_total(supabase, po['id'], -advance_dict['monto'])
+            raise
         
         return {
             "success": True,
@@ -165,37 +175,17 @@ async def create_advance(advance_data: AdvancePaymentCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando anticipo: {str(e)}")
 
-@router.put("/{advance_id}", response_model=dict)
+@router.put("/{advance_id}", response_model=ItemResponse[AdvancePayment], response_model_exclude_unset=True)
 async def update_advance(advance_id: UUID, monto: Optional[Decimal] = None, fecha_pago: Optional[date] = None, 
                         metodo_pago: Optional[str] = None, usuario_pago: Optional[str] = None, notas: Optional[str] = None):
     """Actualizar anticipo existente"""
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('advance_payments').select('*').eq('id', str(advance_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Anticipo no encontrado")
-        
-        advance = existing.data[0]
-        
-        # Verificar que no esté aplicado
-        if advance['estado'] == 'aplicado':
-            raise HTTPException(status_code=400, detail="No se puede modificar un anticipo que ya fue aplicado")
-        
         # Preparar datos de actualización
         update_data = {}
         
         if monto is not None:
-            # Verificar que el nuevo monto no exceda límites
-            po_result = supabase.table('purchase_orders').select('total_oc').eq('id', advance['po_id']).execute()
-            if po_result.data:
-                other_advances = supabase.table('advance_payments').select('monto').eq('po_id', advance['po_id']).neq('id', str(advance_id)).execute()
-                total_other_advances = sum(float(adv['monto']) for adv in other_advances.data)
-                
-                if total_other_advances + float(monto) > float(po_result.data[0]['total_oc']):
-                    raise HTTPException(status_code=400, detail="El nuevo monto excedería el total de la orden")
-            
             update_data['monto'] = float(monto)
         
         if fecha_pago is not None:
@@ -213,13 +203,14 @@ async def update_advance(advance_id: UUID, monto: Optional[Decimal] = None, fech
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
         
-        # Actualizar
-        result = supabase.table('advance_payments').update(update_data).eq('id', str(advance_id)).execute()
+        # Saldo disponible y total de la orden se actualizan en SQL, en la misma
+        # transacción (404 si no existe, 400 si está aplicado o el monto no cabe)
+        advance = update_advance_payment(supabase, advance_id, update_data)
         
         return {
             "success": True,
             "message": "Anticipo actualizado exitosamente",
-            "data": result.data[0]
+            "data": advance
         }
         
     except HTTPException:
@@ -252,6 +243,9 @@ async def delete_advance(advance_id: UUID):
         # Eliminar
         supabase.table('advance_payments').delete().eq('id', str(advance_id)).execute()
         
+        # Mantener total de anticipos de la orden
+        adjust_po_advance_total(supabase, advance['po_id'], -float(advance['monto']))
+        
         return {
             "success": True,
             "message": "Anticipo eliminado exitosamente"
@@ -286,7 +280,8 @@ async def return_advance(advance_id: UUID, motivo: Optional[str] = None):
         
         # Actualizar estado
         update_data = {
-            'estado': 'devuelto'
+            'estado': 'devuelto',
+            'saldo_disponible': 0
         }
         
         if motivo:
@@ -317,19 +312,13 @@ async def get_advances_by_po(po_id: UUID):
         if not po_result.data:
             raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
         
-        # Obtener anticipos
+        # Obtener anticipos (monto aplicado y saldo disponible vienen mantenidos en la fila)
         advances_result = supabase.table('advance_payments').select('*').eq('po_id', str(po_id)).order('fecha_pago', desc=True).execute()
         
-        # Para cada anticipo, calcular monto aplicado y disponible
-        for advance in advances_result.data:
-            allocations = supabase.table('advance_allocation').select('monto_aplicado').eq('anticipo_id', advance['id']).execute()
-            advance['monto_aplicado'] = sum(float(app['monto_aplicado']) for app in allocations.data)
-            advance['saldo_disponible'] = float(advance['monto']) - advance['monto_aplicado']
-        
         # Calcular totales
-        total_anticipos = sum(float(adv['monto']) for adv in advances_result.data)
-        total_aplicado = sum(adv['monto_aplicado'] for adv in advances_result.data)
-        total_disponible = sum(adv['saldo_disponible'] for adv in advances_result.data)
+        total_anticipos = float(po_result.data[0].get('total_anticipos') or 0)
+        total_aplicado = sum(float(adv.get('monto_aplicado') or 0) for adv in advances_result.data)
+        total_disponible = sum(float(adv.get('saldo_disponible') or 0) for adv in advances_result.data)
         
         return {
             "success": True,
@@ -355,25 +344,14 @@ async def get_available_advances(po_id: UUID):
     try:
         supabase = get_supabase()
         
-        # Obtener anticipos disponibles
-        advances_result = supabase.table('advance_payments').select('*').eq('po_id', str(po_id)).eq('estado', 'disponible').execute()
-        
-        # Filtrar solo los que tienen saldo disponible
-        available_advances = []
-        for advance in advances_result.data:
-            allocations = supabase.table('advance_allocation').select('monto_aplicado').eq('anticipo_id', advance['id']).execute()
-            monto_aplicado = sum(float(app['monto_aplicado']) for app in allocations.data)
-            saldo_disponible = float(advance['monto']) - monto_aplicado
-            
-            if saldo_disponible > 0:
-                advance['monto_aplicado'] = monto_aplicado
-                advance['saldo_disponible'] = round(saldo_disponible, 2)
-                available_advances.append(advance)
+        # Obtener anticipos disponibles con saldo mantenido mayor a cero
+        advances_result = supabase.table('advance_payments').select('*').eq('po_id', str(po_id)).eq('estado', 'disponible').gt('saldo_disponible', 0).execute()
+        available_advances = advances_result.data
         
         return {
             "success": True,
             "data": available_advances,
-            "total_disponible": round(sum(adv['saldo_disponible'] for adv in available_advances), 2)
+            "total_disponible": round(sum(float(adv['saldo_disponible']) for adv in available_advances), 2)
         }
         
     except HTTPException:
@@ -382,36 +360,36 @@ async def get_available_advances(po_id: UUID):
         raise HTTPException(status_code=500, detail=f"Error obteniendo anticipos disponibles: {str(e)}")
 
 @router.get("/stats/resumen", response_model=dict)
+@serve_stale_on_error
 async def get_advances_stats():
     """Estadísticas generales de anticipos"""
     try:
-        supabase = get_supabase()
-        
-        # Obtener todos los anticipos
-        advances_result = supabase.table('advance_payments').select('monto, estado, moneda').execute()
+        supabase = get_supabase_read()
         
-        # Calcular estadísticas
-        total_anticipos = len(advances_result.data)
-        
-        # Por estado
+        # Recorrer todos los anticipos por bloques acumulando estadísticas
+        total_anticipos = 0
         stats_por_estado = {}
-        for advance in advances_result.data:
+        totales_por_moneda = {}
+        total_pagado = 0
+        total_aplicado = 0
+        total_disponible = 0
+        
+        for advance in iter_table(supabase, 'advance_payments', 'monto, estado, moneda, monto_aplicado, saldo_disponible'):
+            total_anticipos += 1
+            
+            # Por estado
             estado = advance.get('estado', 'disponible')
             stats_por_estado[estado] = stats_por_estado.get(estado, 0) + 1
-        
-        # Por moneda
-        totales_por_moneda = {}
-        for advance in advances_result.data:
+            
+            # Por moneda
             moneda = advance.get('moneda', 'USD')
             monto = float(advance.get('monto', 0))
             totales_por_moneda[moneda] = totales_por_moneda.get(moneda, 0) + monto
-        
-        # Calcular montos aplicados
-        allocations_result = supabase.table('advance_allocation').select('monto_aplicado').execute()
-        total_aplicado = sum(float(app['monto_aplicado']) for app in allocations_result.data)
-        
-        total_pagado = sum(float(adv['monto']) for adv in advances_result.data)
-        total_disponible = total_pagado - total_aplicado
+            
+            # Montos aplicados y disponibles mantenidos por anticipo
+            total_pagado += monto
+            total_aplicado += float(advance.get('monto_aplicado') or 0)
+            total_disponible += float(advance.get('saldo_disponible') or 0)
         
         return {
             "success": True,
@@ -427,5 +405,34 @@ async def get_advances_stats():
             }
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
+
+@router.post("/conciliar-saldos", response_model=dict)
+async def reconcile_balances(corregir: bool = False):
+    """Verificar saldos mantenidos de anticipos y órdenes (opcionalmente corregirlos)"""
+    try:
+        supabase = get_supabase()
+        
+        resultado = reconcile_advance_balances(supabase, corregir=corregir)
+        total_diferencias = len(resultado['diferencias_anticipos']) + len(resultado['diferencias_ordenes'])
+        
+        if total_diferencias == 0:
+            message = "Saldos de anticipos consistentes"
+        elif corregir:
+            message = f"Se corrigieron {total_diferencias} saldos inconsistentes"
+        else:
+            message = f"Se encontraron {total_diferencias} saldos inconsistentes"
+        
+        return {
+            "success": True,
+            "message": message,
+            "data": resultado
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error conciliando saldos de anticipos: {str(e)}")
\ No newline at end of file
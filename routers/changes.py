@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from collections import defaultdict
+
+from database import get_supabase
+from services.change_log import CHANGE_ENTITIES, CursorTooOld, latest_cursor, read_changes
+from services.loaders import load_children, parse_include
+
+router = APIRouter()
+
+@router.get("/", response_model=dict)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Cursor devuelto por la consulta anterior"),
+    limit: int = Query(500, ge=1, le=1000),
+    entidades: Optional[str] = Query(None, description="Entidades a incluir, separadas por coma")
+):
+    """Cambios posteriores a un cursor: upserts con la fila vigente y tombstones de eliminados
+    
+    Sin `since` devuelve sólo el cursor actual, para que el cliente lo guarde
+    antes de su carga inicial y luego pida únicamente lo que cambió. Los
+    cambios recientes pueden repetirse en la consulta siguiente. Si el cursor
+    es anterior a las entradas conservadas responde 410 y el cliente debe
+    volver a cargar todo y pedir un cursor nuevo.
+    """
+    try:
+        supabase = get_supabase()
+        
+        entity_filter = parse_include(entidades, set(CHANGE_ENTITIES)) or set(CHANGE_ENTITIES)
+        
+        if since is None:
+            return {
+                "success": True,
+                "data": {"upserts": {}, "tombstones": {}},
+                "cursor": latest_cursor(supabase),
+                "has_more": False
+            }
+        
+        try:
+            rows, cursor, has_more = read_changes(
+                supabase, since, limit,
+                entity_filter if entity_filter != set(CHANGE_ENTITIES) else None
+            )
+        except CursorTooOld:
+            raise HTTPException(
+                status_code=410,
+                detail="El cursor es anterior a los cambios conservados: vuelva a cargar los datos y pida un cursor nuevo"
+            )
+        
+        # Compactar: sólo cuenta la última operación de cada registro
+        last_operation = {}
+        for row in rows:
+            last_operation[(row['entidad'], row['entidad_id'])] = row['operacion']
+        
+        upsert_ids = defaultdict(list)
+        tombstones = defaultdict(list)
+        for (entidad, entidad_id), operacion in last_operation.items():
+            if operacion == 'delete':
+                tombstones[entidad].append(entidad_id)
+            else:
+                upsert_ids[entidad].append(entidad_id)
+        
+        # Filas vigentes, una consulta por entidad
+        upserts = {}
+        for entidad, ids in upsert_ids.items():
+            current_rows = load_children(supabase, entidad, 'id', ids)
+            upserts[entidad] = []
+            for entidad_id in ids:
+                if current_rows.get(entidad_id):
+                    upserts[entidad].append(current_rows[entidad_id][0])
+                else:
+                    # Eliminado después del último cambio registrado
+                    tombstones[entidad].append(entidad_id)
+        
+        return {
+            "success": True,
+            "data": {
+                "upserts": upserts,
+                "tombstones": dict(tombstones)
+            },
+            "cursor": cursor,
+            "has_more": has_more
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo cambios: {str(e)}")
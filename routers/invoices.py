@@ -5,27 +5,64 @@ import uuid
 from datetime import datetime, date
 from decimal import Decimal
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
 from models.invoice import Invoice, InvoiceCreate, InvoiceUpdate
+from services.advance_service import allocate_advance_to_invoice
+from services.db_errors import translate_rpc_errors, translate_unique_violation
+from services.loaders import parse_include
+from services.pagination import iter_table
+from services.projections import LIST_FIELDS, select_columns
+from services.read_model import project, read_model
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=ListResponse[Invoice], response_model_exclude_unset=True)
 async def get_invoices(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     supplier_id: Optional[UUID] = None,
     estado: Optional[str] = None,
     moneda: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de facturas con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
+        
+        columns = select_columns('invoices', fields, LIST_FIELDS['invoices'])
+        offset = (page - 1) * per_page
+        
+        # Réplica local de lectura si está al día (nombre del proveedor desde la réplica)
+        if read_model.is_fresh():
+            rows, total = read_model.query(
+                'invoices',
+                filters={'supplier_id': str(supplier_id) if supplier_id else None, 'estado': estado, 'moneda': moneda},
+                search=(('numero_factura',), search) if search else None,
+                order_by='created_at',
+                desc=True,
+                offset=offset,
+                limit=per_page
+            )
+            data = []
+            for row in rows:
+                supplier = read_model.get('suppliers', row.get('supplier_id'))
+                data.append({**project(row, columns), 'suppliers': {'nombre': supplier['nombre']} if supplier else None})
+            
+            return {
+                "success": True,
+                "data": data,
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "pages": (total + per_page - 1) // per_page
+            }
         
         # Query con JOIN para incluir nombre del proveedor
-        query = supabase.table('invoices').select('''
-            *,
+        query = supabase.table('invoices').select(f'''
+            {columns},
             suppliers!invoices_supplier_id_fkey(nombre)
         ''')
         
@@ -43,7 +80,7 @@ async def get_invoices(
             query = query.ilike('numero_factura', f'%{search}%')
         
         # Contar total
-        count_query = supabase.table('invoices').select('*', count='exact')
+        count_query = supabase.table('invoices').select('id', count='exact', head=True)
         if supplier_id:
             count_query = count_query.eq('supplier_id', str(supplier_id))
         if estado:
@@ -57,7 +94,6 @@ async def get_invoices(
         total = total_result.count
         
         # Aplicar paginación
-        offset = (page - 1) * per_page
         query = query.range(offset, offset + per_page - 1).order('created_at', desc=True)
         
         result = query.execute()
@@ -71,17 +107,22 @@ async def get_invoices(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo facturas: {str(e)}")
 
-@router.get("/{invoice_id}", response_model=dict)
-async def get_invoice(invoice_id: UUID):
+@router.get("/{invoice_id}", response_model=ItemResponse[Invoice], response_model_exclude_unset=True)
+async def get_invoice(
+    invoice_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener una factura específica"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('invoices').select('''
-            *,
+        result = supabase.table('invoices').select(f'''
+            {select_columns('invoices', fields)},
             suppliers!invoices_supplier_id_fkey(nombre, contacto)
         ''').eq('id', str(invoice_id)).execute()
         
@@ -98,7 +139,7 @@ async def get_invoice(invoice_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo factura: {str(e)}")
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=ItemResponse[Invoice], response_model_exclude_unset=True)
 async def create_invoice(invoice_data: InvoiceCreate):
     """Crear nueva factura (nueva lógica: solo requiere proveedor)"""
     try:
@@ -113,11 +154,6 @@ async def create_invoice(invoice_data: InvoiceCreate):
         if not supplier['activo']:
             raise HTTPException(status_code=400, detail="No se pueden crear facturas para proveedores inactivos")
         
-        # Verificar que no existe otra factura con el mismo número para el mismo proveedor
-        existing = supabase.table('invoices').select('id').eq('numero_factura', invoice_data.numero_factura).eq('supplier_id', str(invoice_data.supplier_id)).execute()
-        if existing.data:
-            raise HTTPException(status_code=400, detail="Ya existe una factura con ese número para este proveedor")
-        
         # Preparar datos
         invoice_dict = invoice_data.model_dump()
         invoice_dict['id'] = str(uuid.uuid4())
@@ -136,8 +172,9 @@ async def create_invoice(invoice_data: InvoiceCreate):
         invoice_dict['created_at'] = datetime.utcnow().isoformat()
         invoice_dict['updated_at'] = datetime.utcnow().isoformat()
         
-        # Insertar factura
-        result = supabase.table('invoices').insert(invoice_dict).execute()
+        # Insertar factura (número único por proveedor en la base de datos)
+        with translate_unique_violation({'invoices_supplier_numero_factura_key': "Ya existe una factura con ese número para este proveedor"}):
+            result = supabase.table('invoices').insert(invoice_dict).execute()
         invoice = result.data[0]
         
         # Crear vencimiento por defecto (factura completa a 30 días)
@@ -164,7 +201,7 @@ async def create_invoice(invoice_data: InvoiceCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando factura: {str(e)}")
 
-@router.put("/{invoice_id}", response_model=dict)
+@router.put("/{invoice_id}", response_model=ItemResponse[Invoice], response_model_exclude_unset=True)
 async def update_invoice(invoice_id: UUID, invoice_data: InvoiceUpdate):
     """Actualizar factura existente"""
     try:
@@ -183,12 +220,6 @@ async def update_invoice(invoice_id: UUID, invoice_data: InvoiceUpdate):
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
         
-        # Verificar número de factura duplicado si se está actualizando
-        if 'numero_factura' in update_data:
-            existing_number = supabase.table('invoices').select('id').eq('numero_factura', update_data['numero_factura']).eq('supplier_id', current_invoice['supplier_id']).neq('id', str(invoice_id)).execute()
-            if existing_number.data:
-                raise HTTPException(status_code=400, detail="Ya existe otra factura con ese número para este proveedor")
-        
         # Convertir tipos especiales
         if 'supplier_id' in update_data:
             update_data['supplier_id'] = str(update_data['supplier_id'])
@@ -210,7 +241,8 @@ async def update_invoice(invoice_id: UUID, invoice_data: InvoiceUpdate):
         update_data['updated_at'] = datetime.utcnow().isoformat()
         
         # Actualizar
-        result = supabase.table('invoices').update(update_data).eq('id', str(invoice_id)).execute()
+        with translate_unique_violation({'invoices_supplier_numero_factura_key': "Ya existe otra factura con ese número para este proveedor"}):
+            result = supabase.table('invoices').update(update_data).eq('id', str(invoice_id)).execute()
         
         return {
             "success": True,
@@ -229,36 +261,14 @@ async def delete_invoice(invoice_id: UUID):
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('invoices').select('id, numero_factura').eq('id', str(invoice_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Factura no encontrada")
-        
-        # Verificar si tiene pagos o anticipos aplicados
-        payments_count = supabase.table('invoice_payment').select('id', count='exact').eq('invoice_id', str(invoice_id)).execute().count
-        advances_count = supabase.table('advance_allocation').select('id', count='exact').eq('invoice_id', str(invoice_id)).execute().count
-        
-        if payments_count > 0 or advances_count > 0:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"No se puede eliminar: tiene {payments_count} pagos y {advances_count} anticipos aplicados"
-            )
-        
-        # Eliminar vencimientos relacionados
-        supabase.table('invoice_due').delete().eq('invoice_id', str(invoice_id)).execute()
-        
-        # Eliminar relaciones con órdenes
-        supabase.table('invoice_po').delete().eq('invoice_id', str(invoice_id)).execute()
-        
-        # Eliminar relaciones con embarques
-        supabase.table('shipment_invoice').delete().eq('invoice_id', str(invoice_id)).execute()
-        
-        # Eliminar factura
-        supabase.table('invoices').delete().eq('id', str(invoice_id)).execute()
+        # Verificación de pagos/anticipos, vencimientos, vínculos con órdenes
+        # y embarques y la factura se eliminan en una sola transacción
+        with translate_rpc_errors():
+            deleted = supabase.rpc('delete_invoice_cascade', {'p_invoice_id': str(invoice_id)}).execute().data
         
         return {
             "success": True,
-            "message": f"Factura {existing.data[0]['numero_factura']} eliminada exitosamente"
+            "message": f"Factura {deleted['numero_factura']} eliminada exitosamente"
         }
         
     except HTTPException:
@@ -325,91 +335,19 @@ async def apply_advance_to_invoice(
     try:
         supabase = get_supabase()
         
-        # Verificar que la factura existe
-        invoice_result = supabase.table('invoices').select('*').eq('id', str(invoice_id)).execute()
-        if not invoice_result.data:
-            raise HTTPException(status_code=404, detail="Factura no encontrada")
-        
-        invoice = invoice_result.data[0]
-        
-        # Verificar que el anticipo existe y está disponible
-        advance_result = supabase.table('advance_payments').select('*').eq('id', str(anticipo_id)).execute()
-        if not advance_result.data:
-            raise HTTPException(status_code=404, detail="Anticipo no encontrado")
-        
-        advance = advance_result.data[0]
-        
-        if advance['estado'] != 'disponible':
-            raise HTTPException(status_code=400, detail="El anticipo no está disponible")
-        
-        # Verificar monto disponible del anticipo
-        applied_amount = supabase.table('advance_allocation').select('monto_aplicado').eq('anticipo_id', str(anticipo_id)).execute()
-        total_applied = sum(float(item['monto_aplicado']) for item in applied_amount.data)
-        available_amount = float(advance['monto']) - total_applied
-        
-        if float(monto_aplicar) > available_amount:
-            raise HTTPException(status_code=400, detail=f"Monto a aplicar ({monto_aplicar}) excede el disponible ({available_amount})")
-        
-        # Verificar saldo pendiente de la factura
-        saldo_pendiente = float(invoice.get('saldo_pendiente', 0))
-        if float(monto_aplicar) > saldo_pendiente:
-            raise HTTPException(status_code=400, detail=f"Monto a aplicar ({monto_aplicar}) excede el saldo pendiente ({saldo_pendiente})")
-        
-        # Si se especifica vencimiento, verificarlo
-        if due_id:
-            due_result = supabase.table('invoice_due').select('*').eq('id', str(due_id)).eq('invoice_id', str(invoice_id)).execute()
-            if not due_result.data:
-                raise HTTPException(status_code=404, detail="Vencimiento no encontrado")
-        
-        # Crear la aplicación del anticipo
-        allocation_data = {
-            'id': str(uuid.uuid4()),
-            'anticipo_id': str(anticipo_id),
-            'invoice_id': str(invoice_id),
-            'monto_aplicado': float(monto_aplicar),
-            'fecha': datetime.utcnow().isoformat(),
-            'created_at': datetime.utcnow().isoformat()
-        }
-        
-        supabase.table('advance_allocation').insert(allocation_data).execute()
-        
-        # Si hay vencimiento específico, crear registro en invoice_due_payment
-        if due_id:
-            due_payment_data = {
-                'id': str(uuid.uuid4()),
-                'due_id': str(due_id),
-                'source': 'anticipo',
-                'source_id': str(anticipo_id),
-                'monto_aplicado': float(monto_aplicar),
-                'fecha': datetime.utcnow().isoformat(),
-                'created_at': datetime.utcnow().isoformat()
-            }
-            supabase.table('invoice_due_payment').insert(due_payment_data).execute()
-        
-        # Actualizar saldo pendiente de la factura
-        nuevo_saldo = saldo_pendiente - float(monto_aplicar)
-        nuevo_estado = 'pagada_completa' if nuevo_saldo <= 0 else 'pagada_parcial'
-        
-        supabase.table('invoices').update({
-            'saldo_pendiente': max(0, nuevo_saldo),
-            'estado': nuevo_estado,
-            'updated_at': datetime.utcnow().isoformat()
-        }).eq('id', str(invoice_id)).execute()
-        
-        # Verificar si el anticipo se agotó
-        new_total_applied = total_applied + float(monto_aplicar)
-        if new_total_applied >= float(advance['monto']):
-            supabase.table('advance_payments').update({
-                'estado': 'aplicado'
-            }).eq('id', str(anticipo_id)).execute()
+        # Descuento del anticipo, aplicación, pago del vencimiento y saldo de la
+        # factura en una sola transacción: la RPC verifica factura, vencimiento,
+        # saldos y estado del anticipo (404/400) y no deja cambios parciales
+        result = allocate_advance_to_invoice(supabase, invoice_id, anticipo_id, float(monto_aplicar), due_id)
+        nuevo_saldo = float(result['nuevo_saldo_factura'])
         
         return {
             "success": True,
             "message": f"Anticipo aplicado exitosamente. Nuevo saldo: ${nuevo_saldo:.2f}",
             "data": {
                 "monto_aplicado": float(monto_aplicar),
-                "nuevo_saldo_factura": max(0, nuevo_saldo),
-                "nuevo_estado_factura": nuevo_estado
+                "nuevo_saldo_factura": nuevo_saldo,
+                "nuevo_estado_factura": result['nuevo_estado_factura']
             }
         }
         
@@ -419,29 +357,42 @@ async def apply_advance_to_invoice(
         raise HTTPException(status_code=500, detail=f"Error aplicando anticipo: {str(e)}")
 
 @router.get("/{invoice_id}/vencimientos", response_model=dict)
-async def get_invoice_dues(invoice_id: UUID):
+async def get_invoice_dues(
+    invoice_id: UUID,
+    include: Optional[str] = Query("pagos", description="Detalle a incluir: 'pagos' (vacío para omitir el detalle de pagos aplicados)")
+):
     """Obtener vencimientos de una factura"""
     try:
         supabase = get_supabase()
+        incluir = parse_include(include, {'pagos'})
+        
+        # Sin detalle solo se necesita el monto de cada pago para calcular saldos
+        pagos_columns = '*' if 'pagos' in incluir else 'monto_aplicado'
+        
+        # Factura, vencimientos y pagos aplicados en una sola consulta
+        invoice_result = supabase.table('invoices').select(f'''
+            id,
+            invoice_due!invoice_due_invoice_id_fkey(
+                *,
+                invoice_due_payment!invoice_due_payment_due_id_fkey({pagos_columns})
+            )
+        ''').eq('id', str(invoice_id)).order('fecha_vencimiento', foreign_table='invoice_due').execute()
         
-        # Verificar que la factura existe
-        invoice_result = supabase.table('invoices').select('*').eq('id', str(invoice_id)).execute()
         if not invoice_result.data:
             raise HTTPException(status_code=404, detail="Factura no encontrada")
         
-        # Obtener vencimientos
-        dues_result = supabase.table('invoice_due').select('*').eq('invoice_id', str(invoice_id)).order('fecha_vencimiento').execute()
+        dues = invoice_result.data[0]['invoice_due']
         
-        # Para cada vencimiento, obtener los pagos aplicados
-        for due in dues_result.data:
-            payments_result = supabase.table('invoice_due_payment').select('*').eq('due_id', due['id']).execute()
-            due['pagos_aplicados'] = payments_result.data
-            due['monto_pagado'] = sum(float(p['monto_aplicado']) for p in payments_result.data)
+        for due in dues:
+            payments = due.pop('invoice_due_payment')
+            if 'pagos' in incluir:
+                due['pagos_aplicados'] = payments
+            due['monto_pagado'] = sum(float(p['monto_aplicado']) for p in payments)
             due['saldo_pendiente'] = float(due['monto_vencimiento']) - due['monto_pagado']
         
         return {
             "success": True,
-            "data": dues_result.data
+            "data": dues
         }
         
     except HTTPException:
@@ -450,27 +401,26 @@ async def get_invoice_dues(invoice_id: UUID):
         raise HTTPException(status_code=500, detail=f"Error obteniendo vencimientos: {str(e)}")
 
 @router.get("/stats/resumen", response_model=dict)
+@serve_stale_on_error
 async def get_invoices_stats():
     """Estadísticas generales de facturas"""
     try:
-        supabase = get_supabase()
-        
-        # Obtener todas las facturas
-        invoices_result = supabase.table('invoices').select('monto_total, saldo_pendiente, estado, moneda').execute()
+        supabase = get_supabase_read()
         
-        # Calcular estadísticas
-        total_facturas = len(invoices_result.data)
-        
-        # Por estado
+        # Recorrer todas las facturas por bloques acumulando estadísticas
+        total_facturas = 0
         stats_por_estado = {}
-        for invoice in invoices_result.data:
-            estado = invoice.get('estado', 'pendiente')
-            stats_por_estado[estado] = stats_por_estado.get(estado, 0) + 1
-        
-        # Por moneda
         totales_por_moneda = {}
         saldos_por_moneda = {}
-        for invoice in invoices_result.data:
+        
+        for invoice in iter_table(supabase, 'invoices', 'monto_total, saldo_pendiente, estado, moneda'):
+            total_facturas += 1
+            
+            # Por estado
+            estado = invoice.get('estado', 'pendiente')
+            stats_por_estado[estado] = stats_por_estado.get(estado, 0) + 1
+            
+            # Por moneda
             moneda = invoice.get('moneda', 'USD')
             monto_total = float(invoice.get('monto_total', 0))
             saldo_pendiente = float(invoice.get('saldo_pendiente', 0))
@@ -488,5 +438,7 @@ async def get_invoices_stats():
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
\ No newline at end of file
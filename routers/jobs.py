@@ -0,0 +1,330 @@
+# =============================================
+# routers/jobs.py - Trabajos en segundo plano (reportes y exportaciones)
+# =============================================
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date
+from uuid import UUID
+import asyncio
+
+from database import get_supabase_read
+from routers import reports
+from services.jobs import JobType, job_manager
+from services.loaders import load_children
+from services.pagination import DEFAULT_CHUNK_SIZE, iter_sorted, iter_table
+from services.statement import SupplierStatement, count_movements
+
+router = APIRouter()
+
+class JobCreate(BaseModel):
+    tipo: str
+    params: dict = {}
+
+# =============================================
+# TIPOS DE TRABAJO
+# =============================================
+
+def _run_report(endpoint):
+    """Ejecutar un endpoint de reportes dentro del hilo del trabajo
+
+    Se usa la función original (sin la copia stale): el trabajo debe
+    reflejar los datos actuales o fallar. El reporte no informa avance, pero
+    la cancelación se atiende entre bloques de lectura (chunk_hook).
+    """
+    func = getattr(endpoint, '__wrapped__', endpoint)
+
+    def run(params, progress):
+        progress(0.0, "Generando reporte")
+        result = asyncio.run(func(**params))
+        return result['data']
+
+    return run
+
+def _int_param(params: dict, name: str, default: int, minimum: int, maximum: int) -> None:
+    value = params.setdefault(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or not minimum <= value <= maximum:
+        raise HTTPException(status_code=400, detail=f"El parámetro {name} debe ser un entero entre {minimum} y {maximum}")
+
+def _date_param(params: dict, name: str) -> Optional[date]:
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"El parámetro {name} debe ser una fecha YYYY-MM-DD")
+
+def _no_params(params: dict) -> None:
+    if params:
+        raise HTTPException(status_code=400, detail="Este trabajo no recibe parámetros")
+
+def _validate_payments_export(params: dict) -> None:
+    invalid = set(params) - {'fecha_desde', 'fecha_hasta'}
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Parámetros no válidos: {', '.join(sorted(invalid))}")
+    desde = _date_param(params, 'fecha_desde')
+    hasta = _date_param(params, 'fecha_hasta')
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="fecha_desde no puede ser posterior a fecha_hasta")
+
+def _batches(rows, size: int):
+    """Agrupar un iterable en listas de hasta size elementos"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _export_payments(params, progress):
+    """Libro de pagos en CSV con factura y proveedor de cada pago"""
+    supabase = get_supabase_read()
+
+    def apply_filters(q):
+        if params.get('fecha_desde'):
+            q = q.gte('fecha', params['fecha_desde'])
+        if params.get('fecha_hasta'):
+            q = q.lte('fecha', params['fecha_hasta'])
+        return q
+
+    total = apply_filters(supabase.table('invoice_payment').select('id', count='exact', head=True)).execute().count or 0
+    progress(0.0, f"Exportando {total} pagos")
+
+    columns = 'id, invoice_id, fecha, monto_pagado, metodo_pago, referencia, notas'
+
+    def payments():
+        # Primero los pagos sin fecha (iter_sorted los omite), luego por fecha e id
+        if not (params.get('fecha_desde') or params.get('fecha_hasta')):
+            yield from iter_table(supabase, 'invoice_payment', columns, filters=lambda q: q.is_('fecha', 'null'))
+        yield from iter_sorted(supabase, 'invoice_payment', columns, 'fecha', filters=apply_filters)
+
+    def filas():
+        # Se escriben por bloques: sólo un bloque de pagos y sus facturas en memoria
+        written = 0
+        for batch in _batches(payments(), DEFAULT_CHUNK_SIZE):
+            invoices = load_children(
+                supabase, 'invoices', 'id', list({p['invoice_id'] for p in batch if p['invoice_id']}),
+                'numero_factura, moneda, suppliers!invoices_supplier_id_fkey(nombre)'
+            )
+            for payment in batch:
+                invoice = (invoices.get(payment['invoice_id']) or [{}])[0]
+                yield [
+                    payment['fecha'],
+                    (invoice.get('suppliers') or {}).get('nombre'),
+                    invoice.get('numero_factura'),
+                    invoice.get('moneda'),
+                    payment['monto_pagado'],
+                    payment['metodo_pago'],
+                    payment['referencia'],
+                    payment['notas'],
+                    payment['id']
+                ]
+            written += len(batch)
+            progress(written / max(total, 1), f"{written} de {total} pagos")
+
+    return {
+        'columnas': ['fecha', 'proveedor', 'factura', 'moneda', 'monto_pagado', 'metodo_pago', 'referencia', 'notas', 'pago_id'],
+        'filas': filas()
+    }
+
+STATEMENT_COLUMNS = ['fecha', 'tipo', 'documento', 'referencia', 'moneda', 'cargo', 'abono', 'anticipo',
+                     'saldo_facturas', 'saldo_anticipos', 'saldo_neto', 'movimiento_id']
+
+def _validate_statement_period(params: dict, allowed: set) -> None:
+    invalid = set(params) - allowed
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Parámetros no válidos: {', '.join(sorted(invalid))}")
+    desde = _date_param(params, 'fecha_desde')
+    hasta = _date_param(params, 'fecha_hasta')
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="fecha_desde no puede ser posterior a fecha_hasta")
+
+def _validate_statement(params: dict) -> None:
+    _validate_statement_period(params, {'supplier_id', 'fecha_desde', 'fecha_hasta', 'moneda'})
+    try:
+        params['supplier_id'] = str(UUID(str(params.get('supplier_id'))))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El parámetro supplier_id es requerido y debe ser un UUID")
+
+def _statement_rows(supabase, supplier_id: str, params: dict):
+    """Filas CSV del estado de cuenta de un proveedor, con saldos corridos"""
+    statement = SupplierStatement(
+        supabase, supplier_id,
+        _date_param(params, 'fecha_desde'), _date_param(params, 'fecha_hasta'),
+        params.get('moneda')
+    )
+    for movement in statement.movements():
+        yield [
+            movement['fecha'], movement['tipo'], movement['documento'], movement['referencia'],
+            movement['moneda'], movement['cargo'], movement['abono'], movement['anticipo'],
+            movement['saldo']['facturas_pendientes'], movement['saldo']['anticipos_disponibles'],
+            movement['saldo']['neto'], movement['id']
+        ]
+
+def _export_statement(params, progress):
+    """Estado de cuenta completo de un proveedor en CSV, con saldos corridos"""
+    supabase = get_supabase_read()
+
+    # Total estimado en todas las monedas: con filtro de moneda el avance queda bajo el real
+    total = count_movements(supabase, params['supplier_id'], _date_param(params, 'fecha_desde'), _date_param(params, 'fecha_hasta'))
+    progress(0.0, f"Calculando saldo inicial ({total} movimientos en el período)")
+
+    def filas():
+        for written, fila in enumerate(_statement_rows(supabase, params['supplier_id'], params), 1):
+            yield fila
+            if written % 1000 == 0:
+                progress(written / max(total, 1), f"{written} de {total} movimientos")
+
+    return {'columnas': STATEMENT_COLUMNS, 'filas': filas()}
+
+def _validate_statements_export(params: dict) -> None:
+    _validate_statement_period(params, {'fecha_desde', 'fecha_hasta', 'moneda'})
+
+def _export_all_statements(params, progress):
+    """Estados de cuenta de todos los proveedores en un CSV, uno a continuación del otro"""
+    supabase = get_supabase_read()
+    suppliers = sorted(iter_table(supabase, 'suppliers', 'nombre'), key=lambda s: ((s['nombre'] or '').lower(), s['id']))
+    progress(0.0, f"Exportando {len(suppliers)} proveedores")
+
+    def filas():
+        for index, supplier in enumerate(suppliers):
+            for fila in _statement_rows(supabase, supplier['id'], params):
+                yield [supplier['id'], supplier['nombre']] + fila
+            progress((index + 1) / len(suppliers), f"{index + 1} de {len(suppliers)} proveedores")
+
+    return {'columnas': ['supplier_id', 'proveedor'] + STATEMENT_COLUMNS, 'filas': filas()}
+
+job_manager.register('conciliacion_ordenes', JobType(
+    _run_report(reports.get_orders_reconciliation),
+    validate=_no_params,
+    descripcion="Conciliación de órdenes vs facturas vs anticipos"
+))
+job_manager.register('flujo_caja_proyectado', JobType(
+    _run_report(reports.get_cash_flow_projection),
+    validate=lambda params: _int_param(params, 'semanas', 4, 1, 52),
+    descripcion="Proyección de flujo de caja (parámetro semanas, 1 a 52)"
+))
+job_manager.register('vencimientos_proximos', JobType(
+    _run_report(reports.get_upcoming_dues),
+    validate=lambda params: _int_param(params, 'dias', 30, 1, 365),
+    descripcion="Vencimientos próximos (parámetro dias, 1 a 365)"
+))
+job_manager.register('exportar_pagos', JobType(
+    _export_payments,
+    formato='csv',
+    validate=_validate_payments_export,
+    descripcion="Libro de pagos en CSV (parámetros fecha_desde y fecha_hasta opcionales)"
+))
+job_manager.register('estado_cuenta_proveedor', JobType(
+    _export_statement,
+    formato='csv',
+    validate=_validate_statement,
+    descripcion="Estado de cuenta de un proveedor en CSV (supplier_id; fecha_desde, fecha_hasta y moneda opcionales)"
+))
+job_manager.register('estado_cuenta_todos', JobType(
+    _export_all_statements,
+    formato='csv',
+    validate=_validate_statements_export,
+    descripcion="Estados de cuenta de todos los proveedores en CSV (fecha_desde, fecha_hasta y moneda opcionales)"
+))
+
+# =============================================
+# ENDPOINTS
+# =============================================
+
+@router.post("/", response_model=dict, status_code=202)
+async def create_job(job_data: JobCreate):
+    """Encolar un reporte o exportación; el avance se consulta en GET /api/jobs/{id}"""
+    try:
+        job = job_manager.submit(job_data.tipo, dict(job_data.params))
+
+        return {
+            "success": True,
+            "data": job.to_dict(),
+            "message": "Trabajo encolado"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error encolando trabajo: {str(e)}")
+
+@router.get("/tipos", response_model=dict)
+async def get_job_types():
+    """Tipos de trabajo disponibles"""
+    return {
+        "success": True,
+        "data": [
+            {"tipo": tipo, "formato": job_type.formato, "descripcion": job_type.descripcion}
+            for tipo, job_type in sorted(job_manager.types.items())
+        ]
+    }
+
+@router.get("/", response_model=dict)
+async def get_jobs(
+    estado: Optional[str] = None,
+    tipo: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Trabajos recientes (los más nuevos primero)"""
+    try:
+        jobs = [
+            job for job in job_manager.jobs.values()
+            if (not estado or job.estado == estado) and (not tipo or job.tipo == tipo)
+        ]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+
+        return {
+            "success": True,
+            "data": [job.to_dict() for job in jobs[:limit]],
+            "total": len(jobs)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo trabajos: {str(e)}")
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job(job_id: str):
+    """Estado y avance de un trabajo"""
+    return {
+        "success": True,
+        "data": job_manager.get(job_id).to_dict()
+    }
+
+@router.get("/{job_id}/resultado")
+async def download_job_result(job_id: str):
+    """Descargar el resultado de un trabajo completado"""
+    job = job_manager.get(job_id)
+    if not job.to_dict()['resultado_disponible']:
+        raise HTTPException(status_code=409, detail=f"El trabajo no tiene resultado disponible (estado: {job.estado})")
+
+    extension = 'csv' if job_manager.result_media_type(job) == 'text/csv' else 'json'
+    return FileResponse(
+        job.result_path,
+        media_type=job_manager.result_media_type(job),
+        filename=f"{job.tipo}_{job.created_at.strftime('%Y%m%d_%H%M%S')}.{extension}"
+    )
+
+@router.delete("/{job_id}", response_model=dict)
+async def cancel_job(job_id: str):
+    """Cancelar un trabajo pendiente o en curso, o eliminar uno terminado y su resultado"""
+    try:
+        job = job_manager.cancel(job_id)
+
+        return {
+            "success": True,
+            "data": job.to_dict(),
+            "message": "Cancelación solicitada" if job.cancel_requested else "Trabajo cancelado o eliminado"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cancelando trabajo: {str(e)}")
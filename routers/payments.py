@@ -5,8 +5,16 @@ import uuid
 from datetime import datetime, date
 from decimal import Decimal
 from pydantic import BaseModel
+from array import array
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
+from models.payment import InvoicePayment
+from services.kernels import CategoryColumn, payments_stats_kernel, run_kernel
+from services.loaders import load_children, parse_include
+from services.pagination import iter_table
+from services.projections import LIST_FIELDS, select_columns
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
@@ -27,7 +35,7 @@ class InvoicePaymentUpdate(BaseModel):
     referencia: Optional[str] = None
     notas: Optional[str] = None
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=ListResponse[InvoicePayment], response_model_exclude_unset=True)
 async def get_payments(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
@@ -35,69 +43,53 @@ async def get_payments(
     supplier_id: Optional[UUID] = None,
     metodo_pago: Optional[str] = None,
     fecha_desde: Optional[date] = None,
-    fecha_hasta: Optional[date] = None
+    fecha_hasta: Optional[date] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de pagos con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
+        
+        # Con filtro por proveedor el JOIN con facturas es interno (!inner), así
+        # el filtro se resuelve en la misma consulta sin listar ids de facturas
+        join = '!inner' if supplier_id else ''
+        
+        def apply_filters(q):
+            if invoice_id:
+                q = q.eq('invoice_id', str(invoice_id))
+            if supplier_id:
+                q = q.eq('invoices.supplier_id', str(supplier_id))
+            if metodo_pago:
+                q = q.eq('metodo_pago', metodo_pago)
+            if fecha_desde:
+                q = q.gte('fecha', fecha_desde.isoformat())
+            if fecha_hasta:
+                q = q.lte('fecha', fecha_hasta.isoformat())
+            return q
         
         # Query con JOIN para incluir información de factura y proveedor
-        query = supabase.table('invoice_payment').select('''
-            *,
-            invoices!invoice_payment_invoice_id_fkey(
-                numero_factura, monto_total,
+        columns = select_columns('invoice_payment', fields, LIST_FIELDS['invoice_payment'])
+        query = apply_filters(supabase.table('invoice_payment').select(f'''
+            {columns},
+            invoices!invoice_payment_invoice_id_fkey{join}(
+                numero_factura, monto_total, supplier_id,
                 suppliers!invoices_supplier_id_fkey(nombre)
             )
-        ''')
-        
-        # Aplicar filtros
-        if invoice_id:
-            query = query.eq('invoice_id', str(invoice_id))
-        
-        if metodo_pago:
-            query = query.eq('metodo_pago', metodo_pago)
-        
-        if fecha_desde:
-            query = query.gte('fecha', fecha_desde.isoformat())
-        
-        if fecha_hasta:
-            query = query.lte('fecha', fecha_hasta.isoformat())
-        
-        # Filtro por proveedor (más complejo, requiere subconsulta)
-        if supplier_id:
-            # Primero obtener facturas del proveedor
-            invoices_supplier = supabase.table('invoices').select('id').eq('supplier_id', str(supplier_id)).execute()
-            invoice_ids = [inv['id'] for inv in invoices_supplier.data]
-            if invoice_ids:
-                query = query.in_('invoice_id', invoice_ids)
-            else:
-                # No hay facturas para este proveedor
-                return {
-                    "success": True,
-                    "data": [],
-                    "total": 0,
-                    "page": page,
-                    "per_page": per_page,
-                    "pages": 0
-                }
+        '''))
         
-        # Contar total (simplificado sin joins complejos)
-        count_query = supabase.table('invoice_payment').select('*', count='exact')
-        if invoice_id:
-            count_query = count_query.eq('invoice_id', str(invoice_id))
-        if metodo_pago:
-            count_query = count_query.eq('metodo_pago', metodo_pago)
-        if fecha_desde:
-            count_query = count_query.gte('fecha', fecha_desde.isoformat())
-        if fecha_hasta:
-            count_query = count_query.lte('fecha', fecha_hasta.isoformat())
+        # Contar total (solo el conteo, sin descargar filas)
+        count_query = apply_filters(supabase.table('invoice_payment').select(
+            f'id, invoices!invoice_payment_invoice_id_fkey{join}(supplier_id)' if supplier_id else 'id',
+            count='exact',
+            head=True
+        ))
         
         total_result = count_query.execute()
         total = total_result.count
         
-        # Aplicar paginación
+        # Aplicar paginación (id como desempate para un orden estable entre páginas)
         offset = (page - 1) * per_page
-        query = query.range(offset, offset + per_page - 1).order('fecha', desc=True)
+        query = query.range(offset, offset + per_page - 1).order('fecha', desc=True).order('id', desc=True)
         
         result = query.execute()
         
@@ -110,17 +102,22 @@ async def get_payments(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo pagos: {str(e)}")
 
-@router.get("/{payment_id}", response_model=dict)
-async def get_payment(payment_id: UUID):
+@router.get("/{payment_id}", response_model=ItemResponse[InvoicePayment], response_model_exclude_unset=True)
+async def get_payment(
+    payment_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener un pago específico"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('invoice_payment').select('''
-            *,
+        result = supabase.table('invoice_payment').select(f'''
+            {select_columns('invoice_payment', fields)},
             invoices!invoice_payment_invoice_id_fkey(
                 numero_factura, monto_total, saldo_pendiente,
                 suppliers!invoices_supplier_id_fkey(nombre, contacto)
@@ -150,7 +147,7 @@ async def get_payment(payment_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo pago: {str(e)}")
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=ItemResponse[InvoicePayment], response_model_exclude_unset=True)
 async def create_payment(payment_data: InvoicePaymentCreate):
     """Crear nuevo pago de factura"""
     try:
@@ -227,7 +224,7 @@ async def create_payment(payment_data: InvoicePaymentCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando pago: {str(e)}")
 
-@router.put("/{payment_id}", response_model=dict)
+@router.put("/{payment_id}", response_model=ItemResponse[InvoicePayment], response_model_exclude_unset=True)
 async def update_payment(payment_id: UUID, payment_data: InvoicePaymentUpdate):
     """Actualizar pago existente"""
     try:
@@ -337,41 +334,55 @@ async def delete_payment(payment_id: UUID):
         raise HTTPException(status_code=500, detail=f"Error eliminando pago: {str(e)}")
 
 @router.get("/por-factura/{invoice_id}", response_model=dict)
-async def get_payments_by_invoice(invoice_id: UUID):
+async def get_payments_by_invoice(
+    invoice_id: UUID,
+    include: Optional[str] = Query("aplicaciones", description="Detalle a incluir: 'aplicaciones' (vacío para omitir las aplicaciones a vencimientos)")
+):
     """Obtener todos los pagos de una factura específica"""
     try:
         supabase = get_supabase()
+        incluir = parse_include(include, {'aplicaciones'})
+        
+        # Factura con sus pagos embebidos en una sola consulta
+        invoice_result = supabase.table('invoices').select('''
+            *,
+            invoice_payment!invoice_payment_invoice_id_fkey(*)
+        ''').eq('id', str(invoice_id)).order('fecha', desc=True, foreign_table='invoice_payment').execute()
         
-        # Verificar que la factura existe
-        invoice_result = supabase.table('invoices').select('*').eq('id', str(invoice_id)).execute()
         if not invoice_result.data:
             raise HTTPException(status_code=404, detail="Factura no encontrada")
         
         invoice = invoice_result.data[0]
-        
-        # Obtener pagos
-        payments_result = supabase.table('invoice_payment').select('*').eq('invoice_id', str(invoice_id)).order('fecha', desc=True).execute()
-        
-        # Para cada pago, obtener aplicaciones a vencimientos
-        for payment in payments_result.data:
-            due_payments = supabase.table('invoice_due_payment').select('''
-                *,
-                invoice_due!invoice_due_payment_due_id_fkey(fecha_vencimiento, monto_vencimiento)
-            ''').eq('source', 'pago').eq('source_id', payment['id']).execute()
+        payments = invoice.pop('invoice_payment')
+        
+        # Aplicaciones a vencimientos de todos los pagos en una consulta agrupada
+        if 'aplicaciones' in incluir:
+            due_payments_by_payment = load_children(
+                supabase,
+                'invoice_due_payment',
+                'source_id',
+                [payment['id'] for payment in payments],
+                columns='''
+                    *,
+                    invoice_due!invoice_due_payment_due_id_fkey(fecha_vencimiento, monto_vencimiento)
+                ''',
+                filters={'source': 'pago'}
+            )
             
-            payment['aplicaciones_vencimientos'] = due_payments.data
+            for payment in payments:
+                payment['aplicaciones_vencimientos'] = due_payments_by_payment[payment['id']]
         
         # Calcular totales
-        total_pagos = sum(float(pay['monto_pagado']) for pay in payments_result.data)
+        total_pagos = sum(float(pay['monto_pagado']) for pay in payments)
         
         return {
             "success": True,
             "data": {
                 "factura": invoice,
-                "pagos": payments_result.data,
+                "pagos": payments,
                 "resumen": {
                     "total_pagos": round(total_pagos, 2),
-                    "cantidad_pagos": len(payments_result.data),
+                    "cantidad_pagos": len(payments),
                     "saldo_pendiente": round(float(invoice.get('saldo_pendiente', 0)), 2)
                 }
             }
@@ -383,49 +394,34 @@ async def get_payments_by_invoice(invoice_id: UUID):
         raise HTTPException(status_code=500, detail=f"Error obteniendo pagos de la factura: {str(e)}")
 
 @router.get("/stats/resumen", response_model=dict)
+@serve_stale_on_error
 async def get_payments_stats():
     """Estadísticas generales de pagos"""
     try:
-        supabase = get_supabase()
-        
-        # Obtener todos los pagos
-        payments_result = supabase.table('invoice_payment').select('monto_pagado, fecha, metodo_pago').execute()
-        
-        # Estadísticas básicas
-        total_pagos = len(payments_result.data)
-        monto_total_pagado = sum(float(pay['monto_pagado']) for pay in payments_result.data)
-        
-        # Por método de pago
-        por_metodo = {}
-        for payment in payments_result.data:
-            metodo = payment.get('metodo_pago', 'No especificado')
-            if metodo not in por_metodo:
-                por_metodo[metodo] = {'cantidad': 0, 'monto': 0}
-            por_metodo[metodo]['cantidad'] += 1
-            por_metodo[metodo]['monto'] += float(payment['monto_pagado'])
-        
-        # Pagos por mes (últimos 6 meses)
-        from collections import defaultdict
-        pagos_por_mes = defaultdict(lambda: {'cantidad': 0, 'monto': 0})
-        
-        for payment in payments_result.data:
-            if payment.get('fecha'):
-                fecha = datetime.fromisoformat(payment['fecha'])
-                mes_key = fecha.strftime('%Y-%m')
-                pagos_por_mes[mes_key]['cantidad'] += 1
-                pagos_por_mes[mes_key]['monto'] += float(payment['monto_pagado'])
+        supabase = get_supabase_read()
+        
+        # Cargar los pagos por bloques como columnas (montos y categorías codificadas)
+        montos = array('d')
+        metodos = CategoryColumn()
+        meses = CategoryColumn()
+        for payment in iter_table(supabase, 'invoice_payment', 'monto_pagado, fecha, metodo_pago'):
+            montos.append(float(payment['monto_pagado']))
+            metodos.append(payment.get('metodo_pago') or 'No especificado')
+            # Mes YYYY-MM directamente del texto ISO de la fecha
+            meses.append(payment['fecha'][:7] if payment.get('fecha') else None)
+        
+        # Agregación fuera del event loop
+        data = await run_kernel(
+            payments_stats_kernel, montos, metodos.codes, metodos.labels, meses.codes, meses.labels,
+            rows=len(montos)
+        )
         
         return {
             "success": True,
-            "data": {
-                "totales": {
-                    "cantidad_pagos": total_pagos,
-                    "monto_total": round(monto_total_pagado, 2)
-                },
-                "por_metodo": {k: {**v, 'monto': round(v['monto'], 2)} for k, v in por_metodo.items()},
-                "por_mes": {k: {**v, 'monto': round(v['monto'], 2)} for k, v in dict(pagos_por_mes).items()}
-            }
+            "data": data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas de pagos: {str(e)}")
\ No newline at end of file
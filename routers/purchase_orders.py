@@ -5,27 +5,62 @@ import uuid
 from datetime import datetime, date
 from decimal import Decimal
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
 from models.purchase_order import PurchaseOrder, PurchaseOrderCreate, PurchaseOrderUpdate
+from services.db_errors import translate_rpc_errors, translate_unique_violation
+from services.pagination import iter_table
+from services.projections import LIST_FIELDS, select_columns
+from services.read_model import project, read_model
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=ListResponse[PurchaseOrder], response_model_exclude_unset=True)
 async def get_purchase_orders(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     supplier_id: Optional[UUID] = None,
     estado: Optional[str] = None,
     moneda: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de órdenes de compra con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
+        
+        columns = select_columns('purchase_orders', fields, LIST_FIELDS['purchase_orders'])
+        offset = (page - 1) * per_page
+        
+        # Réplica local de lectura si está al día (nombre del proveedor desde la réplica)
+        if read_model.is_fresh():
+            rows, total = read_model.query(
+                'purchase_orders',
+                filters={'supplier_id': str(supplier_id) if supplier_id else None, 'estado': estado, 'moneda': moneda},
+                search=(('numero_orden',), search) if search else None,
+                order_by='created_at',
+                desc=True,
+                offset=offset,
+                limit=per_page
+            )
+            data = []
+            for row in rows:
+                supplier = read_model.get('suppliers', row.get('supplier_id'))
+                data.append({**project(row, columns), 'suppliers': {'nombre': supplier['nombre']} if supplier else None})
+            
+            return {
+                "success": True,
+                "data": data,
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "pages": (total + per_page - 1) // per_page
+            }
         
         # Query con JOIN para incluir nombre del proveedor
-        query = supabase.table('purchase_orders').select('''
-            *,
+        query = supabase.table('purchase_orders').select(f'''
+            {columns},
             suppliers!purchase_orders_supplier_id_fkey(nombre)
         ''')
         
@@ -43,7 +78,7 @@ async def get_purchase_orders(
             query = query.ilike('numero_orden', f'%{search}%')
         
         # Contar total
-        count_query = supabase.table('purchase_orders').select('*', count='exact')
+        count_query = supabase.table('purchase_orders').select('id', count='exact', head=True)
         if supplier_id:
             count_query = count_query.eq('supplier_id', str(supplier_id))
         if estado:
@@ -57,7 +92,6 @@ async def get_purchase_orders(
         total = total_result.count
         
         # Aplicar paginación
-        offset = (page - 1) * per_page
         query = query.range(offset, offset + per_page - 1).order('created_at', desc=True)
         
         result = query.execute()
@@ -71,17 +105,22 @@ async def get_purchase_orders(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo órdenes: {str(e)}")
 
-@router.get("/{po_id}", response_model=dict)
-async def get_purchase_order(po_id: UUID):
+@router.get("/{po_id}", response_model=ItemResponse[PurchaseOrder], response_model_exclude_unset=True)
+async def get_purchase_order(
+    po_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener una orden de compra específica"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('purchase_orders').select('''
-            *,
+        result = supabase.table('purchase_orders').select(f'''
+            {select_columns('purchase_orders', fields)},
             suppliers!purchase_orders_supplier_id_fkey(nombre, contacto)
         ''').eq('id', str(po_id)).execute()
         
@@ -98,7 +137,7 @@ async def get_purchase_order(po_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo orden: {str(e)}")
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=ItemResponse[PurchaseOrder], response_model_exclude_unset=True)
 async def create_purchase_order(po_data: PurchaseOrderCreate):
     """Crear nueva orden de compra"""
     try:
@@ -113,11 +152,6 @@ async def create_purchase_order(po_data: PurchaseOrderCreate):
         if not supplier['activo']:
             raise HTTPException(status_code=400, detail="No se pueden crear órdenes para proveedores inactivos")
         
-        # Verificar que no existe otra orden con el mismo número
-        existing = supabase.table('purchase_orders').select('id').eq('numero_orden', po_data.numero_orden).execute()
-        if existing.data:
-            raise HTTPException(status_code=400, detail="Ya existe una orden con ese número")
-        
         # Preparar datos
         po_dict = po_data.model_dump()
         po_dict['id'] = str(uuid.uuid4())
@@ -133,8 +167,9 @@ async def create_purchase_order(po_data: PurchaseOrderCreate):
         po_dict['created_at'] = datetime.utcnow().isoformat()
         po_dict['updated_at'] = datetime.utcnow().isoformat()
         
-        # Insertar
-        result = supabase.table('purchase_orders').insert(po_dict).execute()
+        # Insertar (el número de orden es único en la base de datos)
+        with translate_unique_violation({'purchase_orders_numero_orden_key': "Ya existe una orden con ese número"}):
+            result = supabase.table('purchase_orders').insert(po_dict).execute()
         
         return {
             "success": True,
@@ -147,29 +182,18 @@ async def create_purchase_order(po_data: PurchaseOrderCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando orden: {str(e)}")
 
-@router.put("/{po_id}", response_model=dict)
+@router.put("/{po_id}", response_model=ItemResponse[PurchaseOrder], response_model_exclude_unset=True)
 async def update_purchase_order(po_id: UUID, po_data: PurchaseOrderUpdate):
     """Actualizar orden de compra existente"""
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('purchase_orders').select('*').eq('id', str(po_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
-        
         # Preparar datos (solo campos no nulos)
         update_data = {k: v for k, v in po_data.model_dump().items() if v is not None}
         
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
         
-        # Verificar número de orden duplicado si se está actualizando
-        if 'numero_orden' in update_data:
-            existing_number = supabase.table('purchase_orders').select('id').eq('numero_orden', update_data['numero_orden']).neq('id', str(po_id)).execute()
-            if existing_number.data:
-                raise HTTPException(status_code=400, detail="Ya existe otra orden con ese número")
-        
         # Convertir tipos especiales
         if 'supplier_id' in update_data:
             update_data['supplier_id'] = str(update_data['supplier_id'])
@@ -182,8 +206,12 @@ async def update_purchase_order(po_id: UUID, po_data: PurchaseOrderUpdate):
         
         update_data['updated_at'] = datetime.utcnow().isoformat()
         
-        # Actualizar
-        result = supabase.table('purchase_orders').update(update_data).eq('id', str(po_id)).execute()
+        # Actualizar (sin filas afectadas = no existe)
+        with translate_unique_violation({'purchase_orders_numero_orden_key': "Ya existe otra orden con ese número"}):
+            result = supabase.table('purchase_orders').update(update_data).eq('id', str(po_id)).execute()
+        
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
         
         return {
             "success": True,
@@ -202,29 +230,13 @@ async def delete_purchase_order(po_id: UUID):
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('purchase_orders').select('id, numero_orden').eq('id', str(po_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
-        
-        # Verificar si tiene anticipos o facturas asociadas
-        advances_count = supabase.table('advance_payments').select('id', count='exact').eq('po_id', str(po_id)).execute().count
-        
-        # Verificar facturas vinculadas via invoice_po
-        invoice_po_count = supabase.table('invoice_po').select('id', count='exact').eq('po_id', str(po_id)).execute().count
-        
-        if advances_count > 0 or invoice_po_count > 0:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"No se puede eliminar: tiene {advances_count} anticipos y {invoice_po_count} facturas asociadas"
-            )
-        
-        # Eliminar
-        supabase.table('purchase_orders').delete().eq('id', str(po_id)).execute()
+        # Verificación de anticipos/facturas y eliminación en una sola transacción
+        with translate_rpc_errors():
+            deleted = supabase.rpc('delete_purchase_order_cascade', {'p_po_id': str(po_id)}).execute().data
         
         return {
             "success": True,
-            "message": f"Orden {existing.data[0]['numero_orden']} eliminada exitosamente"
+            "message": f"Orden {deleted['numero_orden']} eliminada exitosamente"
         }
         
     except HTTPException:
@@ -248,10 +260,10 @@ async def get_anticipos_dashboard(po_id: UUID):
         # Obtener anticipos
         advances_result = supabase.table('advance_payments').select('*').eq('po_id', str(po_id)).order('fecha_pago', desc=True).execute()
         
-        # Calcular estadísticas
-        total_anticipos = sum(float(adv.get('monto', 0)) for adv in advances_result.data)
-        anticipos_disponibles = sum(float(adv.get('monto', 0)) for adv in advances_result.data if adv.get('estado') == 'disponible')
-        anticipos_aplicados = sum(float(adv.get('monto', 0)) for adv in advances_result.data if adv.get('estado') == 'aplicado')
+        # Calcular estadísticas (saldos mantenidos por anticipo y total mantenido en la orden)
+        total_anticipos = float(po.get('total_anticipos') or 0)
+        anticipos_disponibles = sum(float(adv.get('saldo_disponible') or 0) for adv in advances_result.data if adv.get('estado') == 'disponible')
+        anticipos_aplicados = sum(float(adv.get('monto_aplicado') or 0) for adv in advances_result.data)
         
         # Obtener facturas vinculadas
         invoice_po_result = supabase.table('invoice_po').select('''
@@ -294,26 +306,25 @@ async def get_anticipos_dashboard(po_id: UUID):
         raise HTTPException(status_code=500, detail=f"Error obteniendo dashboard de anticipos: {str(e)}")
 
 @router.get("/stats/resumen", response_model=dict)
+@serve_stale_on_error
 async def get_purchase_orders_stats():
     """Estadísticas generales de órdenes de compra"""
     try:
-        supabase = get_supabase()
-        
-        # Obtener todas las órdenes
-        pos_result = supabase.table('purchase_orders').select('total_oc, estado, moneda').execute()
-        
-        # Calcular estadísticas
-        total_ordenes = len(pos_result.data)
+        supabase = get_supabase_read()
         
-        # Por estado
+        # Recorrer todas las órdenes por bloques acumulando estadísticas
+        total_ordenes = 0
         stats_por_estado = {}
-        for po in pos_result.data:
+        totales_por_moneda = {}
+        
+        for po in iter_table(supabase, 'purchase_orders', 'total_oc, estado, moneda'):
+            total_ordenes += 1
+            
+            # Por estado
             estado = po.get('estado', 'pendiente')
             stats_por_estado[estado] = stats_por_estado.get(estado, 0) + 1
-        
-        # Por moneda
-        totales_por_moneda = {}
-        for po in pos_result.data:
+            
+            # Por moneda
             moneda = po.get('moneda', 'USD')
             total_oc = float(po.get('total_oc', 0))
             totales_por_moneda[moneda] = totales_por_moneda.get(moneda, 0) + total_oc
@@ -327,5 +338,7 @@ async def get_purchase_orders_stats():
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
\ No newline at end of file
@@ -1,18 +1,32 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from uuid import UUID
 from datetime import datetime, date, timedelta
 from decimal import Decimal
+from array import array
+from itertools import islice
+import orjson
 
-from database import get_supabase
+from database import get_supabase_read
+from models.common import ItemResponse
+from models.report import (
+    ApAging, CashFlowProjection, ExecutiveDashboard, OrdersReconciliation, SupplierDetailReport,
+    SupplierStatementPage, UpcomingDues
+)
+from services.kernels import AGING_BUCKETS, CategoryColumn, aging_kernel, float_column, reconciliation_kernel, run_kernel
+from services.pagination import iter_table
+from services.stale_cache import serve_stale_on_error
+from services.statement import SupplierStatement, format_balances
 
 router = APIRouter()
 
-@router.get("/dashboard-ejecutivo", response_model=dict)
+@router.get("/dashboard-ejecutivo", response_model=ItemResponse[ExecutiveDashboard], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_executive_dashboard():
     """Dashboard ejecutivo con métricas clave"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # 1. Conteos generales
         suppliers_count = supabase.table('suppliers').select("count", count="exact").eq('activo', True).execute().count
@@ -20,54 +34,71 @@ async def get_executive_dashboard():
         invoices_count = supabase.table('invoices').select("count", count="exact").execute().count
         shipments_count = supabase.table('shipments').select("count", count="exact").execute().count
         
-        # 2. Estadísticas financieras
+        # 2. Estadísticas financieras (tablas completas recorridas por bloques)
         # Órdenes de compra
-        pos_result = supabase.table('purchase_orders').select('total_oc, moneda, estado').execute()
-        total_pos_usd = sum(float(po.get('total_oc', 0)) for po in pos_result.data if po.get('moneda') == 'USD')
-        total_pos_clp = sum(float(po.get('total_oc', 0)) for po in pos_result.data if po.get('moneda') == 'CLP')
-        
+        total_pos_usd = 0
+        total_pos_clp = 0
         pos_por_estado = {}
-        for po in pos_result.data:
+        pos_sin_anticipos = 0
+        
+        for po in iter_table(supabase, 'purchase_orders', 'total_oc, moneda, estado, total_anticipos'):
+            if po.get('moneda') == 'USD':
+                total_pos_usd += float(po.get('total_oc', 0))
+            elif po.get('moneda') == 'CLP':
+                total_pos_clp += float(po.get('total_oc', 0))
+            
             estado = po.get('estado', 'pendiente')
             pos_por_estado[estado] = pos_por_estado.get(estado, 0) + 1
+            
+            # Órdenes pendientes sin anticipos (total mantenido en la orden)
+            if estado == 'pendiente' and float(po.get('total_anticipos') or 0) == 0:
+                pos_sin_anticipos += 1
         
         # Facturas
-        invoices_result = supabase.table('invoices').select('monto_total, saldo_pendiente, moneda, estado').execute()
-        total_facturas_usd = sum(float(inv.get('monto_total', 0)) for inv in invoices_result.data if inv.get('moneda') == 'USD')
-        total_facturas_clp = sum(float(inv.get('monto_total', 0)) for inv in invoices_result.data if inv.get('moneda') == 'CLP')
-        total_saldo_pendiente_usd = sum(float(inv.get('saldo_pendiente', 0)) for inv in invoices_result.data if inv.get('moneda') == 'USD')
-        total_saldo_pendiente_clp = sum(float(inv.get('saldo_pendiente', 0)) for inv in invoices_result.data if inv.get('moneda') == 'CLP')
-        
+        total_facturas_usd = 0
+        total_facturas_clp = 0
+        total_saldo_pendiente_usd = 0
+        total_saldo_pendiente_clp = 0
         facturas_por_estado = {}
-        for inv in invoices_result.data:
+        
+        for inv in iter_table(supabase, 'invoices', 'monto_total, saldo_pendiente, moneda, estado'):
+            if inv.get('moneda') == 'USD':
+                total_facturas_usd += float(inv.get('monto_total', 0))
+                total_saldo_pendiente_usd += float(inv.get('saldo_pendiente', 0))
+            elif inv.get('moneda') == 'CLP':
+                total_facturas_clp += float(inv.get('monto_total', 0))
+                total_saldo_pendiente_clp += float(inv.get('saldo_pendiente', 0))
+            
             estado = inv.get('estado', 'pendiente')
             facturas_por_estado[estado] = facturas_por_estado.get(estado, 0) + 1
         
         # Anticipos
-        advances_result = supabase.table('advance_payments').select('monto, moneda, estado').execute()
-        total_anticipos_usd = sum(float(adv.get('monto', 0)) for adv in advances_result.data if adv.get('moneda') == 'USD')
-        total_anticipos_clp = sum(float(adv.get('monto', 0)) for adv in advances_result.data if adv.get('moneda') == 'CLP')
-        
-        anticipos_disponibles_usd = sum(float(adv.get('monto', 0)) for adv in advances_result.data 
-                                      if adv.get('moneda') == 'USD' and adv.get('estado') == 'disponible')
-        anticipos_disponibles_clp = sum(float(adv.get('monto', 0)) for adv in advances_result.data 
-                                      if adv.get('moneda') == 'CLP' and adv.get('estado') == 'disponible')
+        total_anticipos_usd = 0
+        total_anticipos_clp = 0
+        anticipos_disponibles_usd = 0
+        anticipos_disponibles_clp = 0
+        
+        for adv in iter_table(supabase, 'advance_payments', 'monto, moneda, estado, saldo_disponible'):
+            disponible = float(adv.get('saldo_disponible') or 0) if adv.get('estado') == 'disponible' else 0
+            if adv.get('moneda') == 'USD':
+                total_anticipos_usd += float(adv.get('monto', 0))
+                anticipos_disponibles_usd += disponible
+            elif adv.get('moneda') == 'CLP':
+                total_anticipos_clp += float(adv.get('monto', 0))
+                anticipos_disponibles_clp += disponible
         
         # 3. Embarques
-        shipments_result = supabase.table('shipments').select('estado').execute()
         embarques_por_estado = {}
-        for ship in shipments_result.data:
+        for ship in iter_table(supabase, 'shipments', 'estado'):
             estado = ship.get('estado', 'en_transito')
             embarques_por_estado[estado] = embarques_por_estado.get(estado, 0) + 1
         
         # 4. Top 5 proveedores por volumen
-        top_suppliers_result = supabase.table('suppliers').select('''
+        suppliers_volume = []
+        for supplier in iter_table(supabase, 'suppliers', '''
             id, nombre,
             purchase_orders!purchase_orders_supplier_id_fkey(total_oc)
-        ''').eq('activo', True).execute()
-        
-        suppliers_volume = []
-        for supplier in top_suppliers_result.data:
+        ''', filters=lambda q: q.eq('activo', True)):
             total_volume = sum(float(po.get('total_oc', 0)) for po in supplier.get('purchase_orders', []))
             if total_volume > 0:
                 suppliers_volume.append({
@@ -95,13 +126,6 @@ async def get_executive_dashboard():
             })
         
         # Órdenes sin anticipos
-        pos_sin_anticipos = 0
-        for po in pos_result.data:
-            if po.get('estado') == 'pendiente':
-                advances_for_po = supabase.table('advance_payments').select('id').eq('po_id', po['id']).execute()
-                if not advances_for_po.data:
-                    pos_sin_anticipos += 1
-        
         if pos_sin_anticipos > 0:
             alertas.append({
                 'tipo': 'ordenes_sin_anticipos',
@@ -147,57 +171,55 @@ async def get_executive_dashboard():
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando dashboard ejecutivo: {str(e)}")
 
-@router.get("/conciliacion-ordenes", response_model=dict)
+@router.get("/conciliacion-ordenes", response_model=ItemResponse[OrdersReconciliation], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_orders_reconciliation():
     """Reporte de conciliación de órdenes vs facturas vs anticipos"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
-        # Obtener todas las órdenes con sus relaciones
-        pos_result = supabase.table('purchase_orders').select('''
+        # Órdenes, vínculos factura-orden y anticipos recorridos por bloques
+        # (tres recorridos en total en vez de dos consultas por orden)
+        orders = list(iter_table(supabase, 'purchase_orders', '''
             *,
             suppliers!purchase_orders_supplier_id_fkey(nombre)
-        ''').order('created_at', desc=True).execute()
+        '''))
+        po_index = {po['id']: i for i, po in enumerate(orders)}
+        
+        # Columnas de entrada del kernel: índice de la orden y montos
+        link_po, link_monto, link_saldo = array('i'), array('d'), array('d')
+        for link in iter_table(supabase, 'invoice_po', '''
+            po_id,
+            invoices!invoice_po_invoice_id_fkey(monto_total, saldo_pendiente)
+        '''):
+            if link['po_id'] in po_index:
+                link_po.append(po_index[link['po_id']])
+                link_monto.append(float(link['invoices']['monto_total']))
+                link_saldo.append(float(link['invoices']['saldo_pendiente']))
+        
+        # Anticipos (aplicado y disponible mantenidos por anticipo)
+        adv_po, adv_aplicado, adv_disponible = array('i'), array('d'), array('d')
+        for adv in iter_table(supabase, 'advance_payments', 'po_id, estado, monto_aplicado, saldo_disponible'):
+            if adv['po_id'] in po_index:
+                adv_po.append(po_index[adv['po_id']])
+                adv_aplicado.append(float(adv['monto_aplicado']))
+                adv_disponible.append(float(adv['saldo_disponible']) if adv['estado'] == 'disponible' else 0.0)
+        
+        # Agregados por orden fuera del event loop
+        agg = await run_kernel(
+            reconciliation_kernel,
+            float_column(po['total_oc'] for po in orders),
+            link_po, link_monto, link_saldo, adv_po, adv_aplicado, adv_disponible,
+            rows=len(orders) + len(link_po) + len(adv_po)
+        )
         
         reconciliation_data = []
-        
-        for po in pos_result.data:
-            po_id = po['id']
-            
-            # Facturas vinculadas a esta orden
-            invoice_po_links = supabase.table('invoice_po').select('''
-                invoices!invoice_po_invoice_id_fkey(monto_total, saldo_pendiente, estado)
-            ''').eq('po_id', po_id).execute()
-            
-            total_facturas = sum(float(link['invoices']['monto_total']) for link in invoice_po_links.data)
-            total_saldo_pendiente = sum(float(link['invoices']['saldo_pendiente']) for link in invoice_po_links.data)
-            
-            # Anticipos de esta orden
-            advances_result = supabase.table('advance_payments').select('monto, estado').eq('po_id', po_id).execute()
-            total_anticipos = sum(float(adv['monto']) for adv in advances_result.data)
-            anticipos_disponibles = sum(float(adv['monto']) for adv in advances_result.data if adv['estado'] == 'disponible')
-            
-            # Aplicaciones de anticipos
-            advance_allocations = supabase.table('advance_allocation').select('monto_aplicado').in_('anticipo_id', 
-                [adv['id'] for adv in advances_result.data] if advances_result.data else []).execute()
-            anticipos_aplicados = sum(float(alloc['monto_aplicado']) for alloc in advance_allocations.data)
-            
-            # Calcular balances
-            balance_oc_facturas = float(po['total_oc']) - total_facturas
-            cobertura_anticipos = (anticipos_disponibles / total_saldo_pendiente * 100) if total_saldo_pendiente > 0 else 0
-            
-            # Estado de conciliación
-            estado_conciliacion = "completa"
-            if abs(balance_oc_facturas) > 0.01:
-                estado_conciliacion = "pendiente_facturacion"
-            elif total_saldo_pendiente > 0 and anticipos_disponibles == 0:
-                estado_conciliacion = "pendiente_pago"
-            elif total_saldo_pendiente > 0:
-                estado_conciliacion = "parcial"
-            
+        for i, po in enumerate(orders):
             reconciliation_data.append({
                 "orden": {
                     "id": po['id'],
@@ -208,22 +230,26 @@ async def get_orders_reconciliation():
                     "estado": po['estado']
                 },
                 "facturas": {
-                    "total": round(total_facturas, 2),
-                    "saldo_pendiente": round(total_saldo_pendiente, 2),
-                    "cantidad": len(invoice_po_links.data)
+                    "total": round(agg['facturas_total'][i], 2),
+                    "saldo_pendiente": round(agg['saldo_pendiente'][i], 2),
+                    "cantidad": agg['facturas_cantidad'][i]
                 },
                 "anticipos": {
-                    "total_pagado": round(total_anticipos, 2),
-                    "aplicados": round(anticipos_aplicados, 2),
-                    "disponibles": round(anticipos_disponibles, 2)
+                    "total_pagado": round(float(po.get('total_anticipos') or 0), 2),
+                    "aplicados": round(agg['anticipos_aplicados'][i], 2),
+                    "disponibles": round(agg['anticipos_disponibles'][i], 2)
                 },
                 "balance": {
-                    "oc_vs_facturas": round(balance_oc_facturas, 2),
-                    "cobertura_anticipos": round(cobertura_anticipos, 2)
+                    "oc_vs_facturas": round(agg['balance'][i], 2),
+                    "cobertura_anticipos": round(agg['cobertura'][i], 2)
                 },
-                "estado_conciliacion": estado_conciliacion
+                "estado_conciliacion": agg['estado'][i]
             })
         
+        # Más recientes primero
+        order = sorted(range(len(orders)), key=lambda i: orders[i]['created_at'], reverse=True)
+        reconciliation_data = [reconciliation_data[i] for i in order]
+        
         # Estadísticas generales
         total_ordenes = len(reconciliation_data)
         ordenes_completas = len([r for r in reconciliation_data if r['estado_conciliacion'] == 'completa'])
@@ -242,32 +268,35 @@ async def get_orders_reconciliation():
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando reporte de conciliación: {str(e)}")
 
-@router.get("/flujo-caja-proyectado", response_model=dict)
+@router.get("/flujo-caja-proyectado", response_model=ItemResponse[CashFlowProjection], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_cash_flow_projection(semanas: int = Query(4, ge=1, le=52)):
     """Proyección de flujo de caja básica basada en vencimientos"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Calcular fechas
         fecha_inicio = date.today()
         fecha_fin = fecha_inicio + timedelta(weeks=semanas)
         
-        # Obtener vencimientos pendientes en el período
-        vencimientos_result = supabase.table('invoice_due').select('''
+        # Vencimientos pendientes en el período (recorridos por bloques)
+        vencimientos = iter_table(supabase, 'invoice_due', '''
             fecha_vencimiento, monto_vencimiento, estado,
             invoices!invoice_due_invoice_id_fkey(
                 numero_factura, moneda,
                 suppliers!invoices_supplier_id_fkey(nombre)
             )
-        ''').gte('fecha_vencimiento', fecha_inicio.isoformat()).lte('fecha_vencimiento', fecha_fin.isoformat()).eq('estado', 'pendiente').order('fecha_vencimiento').execute()
+        ''', filters=lambda q: q.gte('fecha_vencimiento', fecha_inicio.isoformat()).lte('fecha_vencimiento', fecha_fin.isoformat()).eq('estado', 'pendiente'))
         
         # Agrupar por semana
         proyeccion_semanal = {}
         
-        for venc in vencimientos_result.data:
+        for venc in vencimientos:
             fecha_venc = datetime.fromisoformat(venc['fecha_vencimiento']).date()
             semana = (fecha_venc - fecha_inicio).days // 7 + 1
             
@@ -296,10 +325,18 @@ async def get_cash_flow_projection(semanas: int = Query(4, ge=1, le=52)):
                 'proveedor': venc['invoices']['suppliers']['nombre']
             })
         
+        # Vencimientos de cada semana en orden cronológico
+        for sem in proyeccion_semanal.values():
+            sem['vencimientos'].sort(key=lambda v: v['fecha'])
+        
         # Calcular anticipos disponibles para cobertura
-        anticipos_disponibles = supabase.table('advance_payments').select('monto, moneda').eq('estado', 'disponible').execute()
-        total_anticipos_usd = sum(float(adv['monto']) for adv in anticipos_disponibles.data if adv['moneda'] == 'USD')
-        total_anticipos_clp = sum(float(adv['monto']) for adv in anticipos_disponibles.data if adv['moneda'] == 'CLP')
+        total_anticipos_usd = 0
+        total_anticipos_clp = 0
+        for adv in iter_table(supabase, 'advance_payments', 'saldo_disponible, moneda', filters=lambda q: q.eq('estado', 'disponible')):
+            if adv['moneda'] == 'USD':
+                total_anticipos_usd += float(adv['saldo_disponible'])
+            elif adv['moneda'] == 'CLP':
+                total_anticipos_clp += float(adv['saldo_disponible'])
         
         # Totales del período
         total_salidas_usd = sum(sem['salidas_usd'] for sem in proyeccion_semanal.values())
@@ -325,38 +362,43 @@ async def get_cash_flow_projection(semanas: int = Query(4, ge=1, le=52)):
                     "cobertura_usd": round(cobertura_usd, 2),
                     "cobertura_clp": round(cobertura_clp, 2)
                 },
-                "proyeccion_semanal": {str(k): {**v, 'salidas_usd': round(v['salidas_usd'], 2), 'salidas_clp': round(v['salidas_clp'], 2)} for k, v in proyeccion_semanal.items()}
+                "proyeccion_semanal": {str(k): {**v, 'salidas_usd': round(v['salidas_usd'], 2), 'salidas_clp': round(v['salidas_clp'], 2)} for k, v in sorted(proyeccion_semanal.items())}
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando proyección de flujo de caja: {str(e)}")
 
-@router.get("/vencimientos-proximos", response_model=dict)
+@router.get("/vencimientos-proximos", response_model=ItemResponse[UpcomingDues], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_upcoming_dues(dias: int = Query(30, ge=1, le=365)):
     """Reporte de vencimientos próximos"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Calcular fecha límite
         fecha_limite = (date.today() + timedelta(days=dias)).isoformat()
         
-        # Obtener vencimientos próximos
-        vencimientos_result = supabase.table('invoice_due').select('''
+        # Obtener vencimientos próximos (recorridos por bloques)
+        vencimientos = iter_table(supabase, 'invoice_due', '''
             *,
             invoices!invoice_due_invoice_id_fkey(
                 numero_factura, monto_total, moneda,
                 suppliers!invoices_supplier_id_fkey(nombre, contacto)
             )
-        ''').lte('fecha_vencimiento', fecha_limite).eq('estado', 'pendiente').order('fecha_vencimiento').execute()
+        ''', filters=lambda q: q.lte('fecha_vencimiento', fecha_limite).eq('estado', 'pendiente'))
         
         # Agrupar por urgencia
         hoy = date.today()
+        total_vencimientos = 0
         vencidos = []
         proximos_7_dias = []
         proximos_30_dias = []
         
-        for venc in vencimientos_result.data:
+        for venc in vencimientos:
+            total_vencimientos += 1
             fecha_venc = datetime.fromisoformat(venc['fecha_vencimiento']).date()
             dias_hasta_venc = (fecha_venc - hoy).days
             
@@ -376,6 +418,10 @@ async def get_upcoming_dues(dias: int = Query(30, ge=1, le=365)):
                 venc_info['urgencia'] = 'alto'
                 proximos_30_dias.append(venc_info)
         
+        # Cada grupo en orden cronológico
+        for lista in (vencidos, proximos_7_dias, proximos_30_dias):
+            lista.sort(key=lambda v: v['fecha_vencimiento'])
+        
         # Calcular totales por moneda
         def calcular_totales(lista):
             total_usd = sum(float(v['monto_vencimiento']) for v in lista if v['invoices']['moneda'] == 'USD')
@@ -386,7 +432,7 @@ async def get_upcoming_dues(dias: int = Query(30, ge=1, le=365)):
             "success": True,
             "data": {
                 "resumen": {
-                    "total_vencimientos": len(vencimientos_result.data),
+                    "total_vencimientos": total_vencimientos,
                     "vencidos": {
                         "cantidad": len(vencidos),
                         "totales": calcular_totales(vencidos)
@@ -408,14 +454,134 @@ async def get_upcoming_dues(dias: int = Query(30, ge=1, le=365)):
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando reporte de vencimientos: {str(e)}")
 
-@router.get("/proveedor/{supplier_id}/detalle", response_model=dict)
+@router.get("/antiguedad-saldos", response_model=ItemResponse[ApAging], response_model_exclude_unset=True)
+@serve_stale_on_error
+async def get_ap_aging(
+    fecha_corte: Optional[date] = Query(None, description="Fecha de corte (por defecto hoy)"),
+    moneda: Optional[str] = None,
+    supplier_id: Optional[UUID] = None
+):
+    """Antigüedad de cuentas por pagar por proveedor y moneda
+    
+    Tramos por días de atraso a la fecha de corte: corriente (no vencido),
+    1-30, 31-60, 61-90 y más de 90. Considera los vencimientos de facturas
+    emitidas hasta la fecha de corte, con su saldo a esa fecha: sólo se
+    descuentan los pagos y aplicaciones con fecha hasta el corte (el estado
+    actual del vencimiento no sirve para un corte pasado).
+    """
+    try:
+        supabase = get_supabase_read()
+        fecha = fecha_corte or date.today()
+        corte = fecha.isoformat()
+        
+        def apply_filters(q):
+            q = q.lte('invoices.fecha_emision', corte)
+            # Filtro sobre el recurso embebido: descarta pagos posteriores, no vencimientos.
+            # fecha es timestamp: límite exclusivo al día siguiente
+            q = q.lt('invoice_due_payment.fecha', (fecha + timedelta(days=1)).isoformat())
+            if moneda:
+                q = q.eq('invoices.moneda', moneda)
+            if supplier_id:
+                q = q.eq('invoices.supplier_id', str(supplier_id))
+            return q
+        
+        # Vencimientos pendientes como columnas: fecha, saldo y códigos de proveedor y moneda
+        fechas = []
+        saldos = array('d')
+        proveedores = CategoryColumn()
+        monedas = CategoryColumn()
+        nombres = {}
+        for due in iter_table(supabase, 'invoice_due', '''
+            fecha_vencimiento, monto_vencimiento,
+            invoices!invoice_due_invoice_id_fkey!inner(
+                supplier_id, moneda,
+                suppliers!invoices_supplier_id_fkey(nombre)
+            ),
+            invoice_due_payment!invoice_due_payment_due_id_fkey(monto_aplicado)
+        ''', filters=apply_filters):
+            invoice = due['invoices']
+            # Sin fecha, proveedor o moneda el vencimiento no tiene tramo ni grupo
+            if not due['fecha_vencimiento'] or not invoice.get('supplier_id') or not invoice.get('moneda'):
+                continue
+            saldo = float(due['monto_vencimiento']) - sum(float(p['monto_aplicado']) for p in due['invoice_due_payment'])
+            if saldo <= 0.005:
+                continue
+            fechas.append(due['fecha_vencimiento'][:10])
+            saldos.append(saldo)
+            proveedores.append(invoice['supplier_id'])
+            monedas.append(invoice['moneda'])
+            nombres[invoice['supplier_id']] = (invoice.get('suppliers') or {}).get('nombre')
+        
+        # Tramos y agregación por proveedor y moneda (vectorizado, fuera del event loop)
+        agg = await run_kernel(
+            aging_kernel, fechas, saldos, proveedores.codes, len(proveedores.labels),
+            monedas.codes, len(monedas.labels), corte,
+            rows=len(fechas)
+        )
+        
+        tramos = [bucket[0] for bucket in AGING_BUCKETS]
+        totales = {}
+        filas = []
+        for grupo, montos in enumerate(agg['montos']):
+            cantidad = sum(agg['cantidades'][grupo])
+            if cantidad == 0:
+                continue
+            proveedor_id = proveedores.labels[grupo // len(monedas.labels)]
+            moneda_grupo = monedas.labels[grupo % len(monedas.labels)]
+            total = sum(montos)
+            vencido = total - montos[0]
+            
+            filas.append({
+                "proveedor": {"id": proveedor_id, "nombre": nombres.get(proveedor_id)},
+                "moneda": moneda_grupo,
+                "tramos": dict(zip(tramos, montos)),
+                "total": round(total, 2),
+                "vencido": round(vencido, 2),
+                "cantidad_vencimientos": cantidad,
+                "dias_atraso_promedio": round(agg['dias_ponderados'][grupo] / vencido, 1) if vencido > 0 else 0
+            })
+            
+            acumulado = totales.setdefault(moneda_grupo, {**{t: 0.0 for t in tramos}, "total": 0.0, "cantidad_vencimientos": 0})
+            for tramo, monto in zip(tramos, montos):
+                acumulado[tramo] += monto
+            acumulado["total"] += total
+            acumulado["cantidad_vencimientos"] += cantidad
+        
+        # Mayor deuda vencida primero
+        filas.sort(key=lambda fila: (fila['moneda'], -fila['vencido'], -fila['total']))
+        
+        return {
+            "success": True,
+            "data": {
+                "fecha_corte": corte,
+                "tramos": [
+                    {"tramo": clave, "dias_desde": desde, "dias_hasta": hasta}
+                    for clave, desde, hasta in AGING_BUCKETS
+                ],
+                "totales_por_moneda": {
+                    m: {k: round(v, 2) if isinstance(v, float) else v for k, v in t.items()}
+                    for m, t in sorted(totales.items())
+                },
+                "proveedores": filas
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando antigüedad de saldos: {str(e)}")
+
+@router.get("/proveedor/{supplier_id}/detalle", response_model=ItemResponse[SupplierDetailReport], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_supplier_detail_report(supplier_id: UUID):
     """Reporte detallado de un proveedor específico"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Verificar que el proveedor existe
         supplier_result = supabase.table('suppliers').select('*').eq('id', str(supplier_id)).execute()
@@ -485,4 +651,84 @@ async def get_supplier_detail_report(supplier_id: UUID):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generando reporte de proveedor: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error generando reporte de proveedor: {str(e)}")
+
+
+@router.get("/proveedor/{supplier_id}/estado-cuenta", response_model=ItemResponse[SupplierStatementPage], response_model_exclude_unset=True)
+async def get_supplier_statement(
+    supplier_id: UUID,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    moneda: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Cursor de la página anterior (siguiente_cursor)"),
+    limit: int = Query(200, ge=1, le=2000),
+    formato: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Estado de cuenta del proveedor: facturas, pagos, anticipos y aplicaciones en orden cronológico
+    
+    Cada movimiento trae el saldo corrido de su moneda (facturas pendientes,
+    anticipos disponibles y neto). En JSON se pagina con limit y cursor; con
+    formato=ndjson se transmite el período completo, una línea por movimiento.
+    """
+    try:
+        supabase = get_supabase_read()
+        
+        if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
+            raise HTTPException(status_code=400, detail="fecha_desde no puede ser posterior a fecha_hasta")
+        
+        supplier_result = supabase.table('suppliers').select('id, nombre').eq('id', str(supplier_id)).execute()
+        if not supplier_result.data:
+            raise HTTPException(status_code=404, detail="Proveedor no encontrado")
+        
+        statement = SupplierStatement(supabase, supplier_id, fecha_desde, fecha_hasta, moneda, cursor)
+        periodo = {
+            "desde": statement.desde.isoformat() if statement.desde else None,
+            "hasta": fecha_hasta.isoformat() if fecha_hasta else None
+        }
+        
+        if formato == "ndjson":
+            def stream():
+                # Generador síncrono: Starlette lo recorre en el threadpool
+                movements = statement.movements()
+                first = next(movements, None)
+                yield orjson.dumps({
+                    "registro": "encabezado",
+                    "proveedor": supplier_result.data[0],
+                    "periodo": periodo,
+                    "saldo_inicial": format_balances(statement.opening)
+                }) + b"\n"
+                if first is not None:
+                    yield orjson.dumps({"registro": "movimiento", **first}) + b"\n"
+                    for movement in movements:
+                        yield orjson.dumps({"registro": "movimiento", **movement}) + b"\n"
+                yield orjson.dumps({"registro": "cierre", "saldo_final": format_balances(statement.balances)}) + b"\n"
+            
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        
+        movements = statement.movements()
+        movimientos = list(islice(movements, limit))
+        
+        # El recorrido quedó detenido justo después del último movimiento de la página
+        saldo_final = format_balances(statement.balances)
+        siguiente_cursor = statement.next_cursor()
+        
+        # Sólo hay página siguiente si queda al menos un movimiento
+        if len(movimientos) < limit or next(movements, None) is None:
+            siguiente_cursor = None
+        
+        return {
+            "success": True,
+            "data": {
+                "proveedor": supplier_result.data[0],
+                "periodo": periodo,
+                "saldo_inicial": format_balances(statement.opening),
+                "movimientos": movimientos,
+                "saldo_final": saldo_final,
+                "siguiente_cursor": siguiente_cursor
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando estado de cuenta: {str(e)}")
@@ -0,0 +1,58 @@
+# =============================================
+# routers/search.py - Búsqueda global
+# =============================================
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from collections import defaultdict
+
+from database import get_supabase_read
+from services.loaders import parse_include
+
+router = APIRouter()
+
+# Tipos de resultado devueltos por search_global()
+SEARCH_TYPES = ('factura', 'orden', 'proveedor', 'embarque')
+
+@router.get("/", response_model=dict)
+async def search(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto a buscar"),
+    tipos: Optional[str] = Query(None, description="Tipos a incluir, separados por coma"),
+    limit: int = Query(5, ge=1, le=20, description="Máximo de resultados por tipo")
+):
+    """Buscar facturas, órdenes, proveedores y embarques por número, nombre, código o contenedor
+    
+    La búsqueda se resuelve en la base de datos con índices trigram
+    (migración 008) y devuelve los resultados ordenados por relevancia.
+    """
+    try:
+        supabase = get_supabase_read()
+        
+        selected = parse_include(tipos, set(SEARCH_TYPES)) or set(SEARCH_TYPES)
+        
+        rows = supabase.rpc('search_global', {
+            'p_query': q,
+            'p_limit': limit,
+            'p_tipos': [tipo for tipo in SEARCH_TYPES if tipo in selected]
+        }).execute().data
+        
+        # Agrupar por tipo conservando el orden por relevancia
+        resultados = defaultdict(list)
+        for row in rows:
+            resultados[row['tipo']].append({
+                'id': row['id'],
+                'titulo': row['titulo'],
+                'detalle': row['detalle'],
+                'score': round(float(row['score']), 3)
+            })
+        
+        return {
+            "success": True,
+            "data": {tipo: resultados.get(tipo, []) for tipo in SEARCH_TYPES if tipo in selected},
+            "total": len(rows)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en búsqueda: {str(e)}")
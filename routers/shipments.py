@@ -2,11 +2,18 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
 from uuid import UUID
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
+from models.shipment import Shipment
+from services.db_errors import translate_rpc_errors, translate_unique_violation
+from services.loaders import IN_CHUNK_SIZE, load_children
+from services.pagination import iter_table
+from services.projections import LIST_FIELDS, select_columns
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
@@ -36,25 +43,54 @@ class ShipmentUpdate(BaseModel):
     notas: Optional[str] = None
 
 class ShipmentSupplierLink(BaseModel):
-    supplier_ids: List[UUID]
+    supplier_ids: List[UUID] = Field(..., max_length=500)
 
 class ShipmentInvoiceLink(BaseModel):
     invoice_id: UUID
     monto_asignado: Optional[Decimal] = None
 
-@router.get("/", response_model=dict)
+class ShipmentInvoiceBulkLink(BaseModel):
+    facturas: List[ShipmentInvoiceLink] = Field(..., max_length=500)
+
+class ShipmentBulkSelection(BaseModel):
+    # Por ids, o por ventana de ETA (eta_desde y eta_hasta) y opcionalmente naviera
+    ids: Optional[List[UUID]] = Field(None, max_length=500)
+    naviera: Optional[str] = None
+    eta_desde: Optional[date] = None
+    eta_hasta: Optional[date] = None
+
+class ShipmentBulkArrival(ShipmentBulkSelection):
+    fecha_llegada_real: Optional[date] = None
+
+class ShipmentBulkEta(ShipmentBulkSelection):
+    fecha_llegada_estimada: date
+
+# Estados desde los que se permite cada transición masiva
+BULK_TRANSITIONS = {
+    'arribado': ('en_transito',),
+    'despachado': ('arribado',)
+}
+
+@router.get("/", response_model=ListResponse[Shipment], response_model_exclude_unset=True)
 async def get_shipments(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     estado: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de embarques con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
-        # Query base
-        query = supabase.table('shipments').select('*')
+        # Query base con los proveedores asociados embebidos (una sola consulta)
+        columns = select_columns('shipments', fields, LIST_FIELDS['shipments'])
+        query = supabase.table('shipments').select(f'''
+            {columns},
+            shipment_supplier!shipment_supplier_shipment_id_fkey(
+                suppliers!shipment_supplier_supplier_id_fkey(id, nombre)
+            )
+        ''')
         
         # Aplicar filtros
         if estado:
@@ -64,7 +100,7 @@ async def get_shipments(
             query = query.or_(f'codigo.ilike.%{search}%,numero_contenedor.ilike.%{search}%')
         
         # Contar total
-        count_query = supabase.table('shipments').select('*', count='exact')
+        count_query = supabase.table('shipments').select('id', count='exact', head=True)
         if estado:
             count_query = count_query.eq('estado', estado)
         if search:
@@ -79,13 +115,10 @@ async def get_shipments(
         
         result = query.execute()
         
-        # Para cada embarque, obtener proveedores asociados
+        # Aplanar la relación embebida al formato {suppliers: [...]}
         for shipment in result.data:
-            suppliers_result = supabase.table('shipment_supplier').select('''
-                suppliers!shipment_supplier_supplier_id_fkey(id, nombre)
-            ''').eq('shipment_id', shipment['id']).execute()
-            
-            shipment['suppliers'] = [item['suppliers'] for item in suppliers_result.data]
+            links = shipment.pop('shipment_supplier', None) or []
+            shipment['suppliers'] = [item['suppliers'] for item in links]
         
         return {
             "success": True,
@@ -96,36 +129,201 @@ async def get_shipments(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo embarques: {str(e)}")
 
-@router.get("/{shipment_id}", response_model=dict)
-async def get_shipment(shipment_id: UUID):
+# Las rutas fijas deben declararse antes de /{shipment_id} para no quedar ocultas
+@router.get("/en-transito", response_model=dict)
+@serve_stale_on_error
+async def get_shipments_in_transit():
+    """Obtener embarques en tránsito con información detallada"""
+    try:
+        supabase = get_supabase_read()
+        
+        # Obtener embarques en tránsito (recorridos por bloques, ordenados por fecha de embarque)
+        shipments_in_transit = sorted(
+            iter_table(supabase, 'shipments', '*', filters=lambda q: q.eq('estado', 'en_transito')),
+            key=lambda s: (s.get('fecha_embarque') is None, s.get('fecha_embarque') or '')
+        )
+        
+        shipments_with_details = []
+        
+        for shipment in shipments_in_transit:
+            # Obtener proveedores
+            suppliers_result = supabase.table('shipment_supplier').select('''
+                suppliers!shipment_supplier_supplier_id_fkey(nombre)
+            ''').eq('shipment_id', shipment['id']).execute()
+            
+            # Obtener facturas
+            invoices_result = supabase.table('shipment_invoice').select('''
+                monto_asignado,
+                invoices!shipment_invoice_invoice_id_fkey(numero_factura, monto_total, saldo_pendiente)
+            ''').eq('shipment_id', shipment['id']).execute()
+            
+            # Calcular días en tránsito
+            if shipment.get('fecha_embarque'):
+                fecha_embarque = datetime.fromisoformat(shipment['fecha_embarque']).date()
+                dias_transito = (date.today() - fecha_embarque).days
+            else:
+                dias_transito = None
+            
+            # Calcular días hasta llegada estimada
+            dias_hasta_llegada = None
+            if shipment.get('fecha_llegada_estimada'):
+                fecha_llegada_est = datetime.fromisoformat(shipment['fecha_llegada_estimada']).date()
+                dias_hasta_llegada = (fecha_llegada_est - date.today()).days
+            
+            shipment_detail = {
+                **shipment,
+                'proveedores': [item['suppliers']['nombre'] for item in suppliers_result.data],
+                'facturas': invoices_result.data,
+                'total_facturas': sum(float(item['invoices']['monto_total']) for item in invoices_result.data),
+                'saldo_pendiente': sum(float(item['invoices']['saldo_pendiente']) for item in invoices_result.data),
+                'dias_en_transito': dias_transito,
+                'dias_hasta_llegada': dias_hasta_llegada,
+                'estado_llegada': 'retrasado' if dias_hasta_llegada and dias_hasta_llegada < 0 else 'a_tiempo'
+            }
+            
+            shipments_with_details.append(shipment_detail)
+        
+        # Estadísticas
+        total_valor = sum(ship['total_facturas'] for ship in shipments_with_details)
+        total_saldo = sum(ship['saldo_pendiente'] for ship in shipments_with_details)
+        retrasados = len([ship for ship in shipments_with_details if ship['estado_llegada'] == 'retrasado'])
+        
+        return {
+            "success": True,
+            "data": {
+                "embarques": shipments_with_details,
+                "estadisticas": {
+                    "total_embarques": len(shipments_with_details),
+                    "valor_total": round(total_valor, 2),
+                    "saldo_pendiente": round(total_saldo, 2),
+                    "retrasados": retrasados
+                }
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo embarques en tránsito: {str(e)}")
+
+@router.get("/proximos-arribar", response_model=dict)
+@serve_stale_on_error
+async def get_upcoming_arrivals(dias: int = Query(30, ge=1, le=365)):
+    """Obtener embarques que van a arribar en los próximos días"""
+    try:
+        supabase = get_supabase_read()
+        
+        # Calcular fecha límite
+        fecha_limite = (date.today() + timedelta(days=dias)).isoformat()
+        
+        # Obtener embarques próximos a arribar
+        shipments_result = supabase.table('shipments').select('*').eq('estado', 'en_transito').lte('fecha_llegada_estimada', fecha_limite).order('fecha_llegada_estimada').execute()
+        
+        shipments_with_details = []
+        hoy = date.today()
+        
+        for shipment in shipments_result.data:
+            # Obtener proveedores
+            suppliers_result = supabase.table('shipment_supplier').select('''
+                suppliers!shipment_supplier_supplier_id_fkey(nombre)
+            ''').eq('shipment_id', shipment['id']).execute()
+            
+            # Obtener facturas
+            invoices_result = supabase.table('shipment_invoice').select('''
+                monto_asignado,
+                invoices!shipment_invoice_invoice_id_fkey(numero_factura, monto_total, saldo_pendiente)
+            ''').eq('shipment_id', shipment['id']).execute()
+            
+            # Calcular días hasta llegada
+            dias_hasta_llegada = None
+            urgencia = 'normal'
+            
+            if shipment.get('fecha_llegada_estimada'):
+                fecha_llegada_est = datetime.fromisoformat(shipment['fecha_llegada_estimada']).date()
+                dias_hasta_llegada = (fecha_llegada_est - hoy).days
+                
+                if dias_hasta_llegada < 0:
+                    urgencia = 'retrasado'
+                elif dias_hasta_llegada <= 3:
+                    urgencia = 'critico'
+                elif dias_hasta_llegada <= 7:
+                    urgencia = 'alto'
+            
+            shipment_detail = {
+                **shipment,
+                'proveedores': [item['suppliers']['nombre'] for item in suppliers_result.data],
+                'facturas': invoices_result.data,
+                'total_facturas': sum(float(item['invoices']['monto_total']) for item in invoices_result.data),
+                'saldo_pendiente': sum(float(item['invoices']['saldo_pendiente']) for item in invoices_result.data),
+                'dias_hasta_llegada': dias_hasta_llegada,
+                'urgencia': urgencia
+            }
+            
+            shipments_with_details.append(shipment_detail)
+        
+        # Agrupar por urgencia
+        retrasados = [s for s in shipments_with_details if s['urgencia'] == 'retrasado']
+        criticos = [s for s in shipments_with_details if s['urgencia'] == 'critico']
+        altos = [s for s in shipments_with_details if s['urgencia'] == 'alto']
+        normales = [s for s in shipments_with_details if s['urgencia'] == 'normal']
+        
+        return {
+            "success": True,
+            "data": {
+                "resumen": {
+                    "total": len(shipments_with_details),
+                    "retrasados": len(retrasados),
+                    "criticos": len(criticos),
+                    "altos": len(altos),
+                    "normales": len(normales)
+                },
+                "embarques": {
+                    "retrasados": retrasados,
+                    "criticos": criticos,
+                    "altos": altos,
+                    "normales": normales
+                }
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo próximos arribos: {str(e)}")
+
+@router.get("/{shipment_id}", response_model=ItemResponse[Shipment], response_model_exclude_unset=True)
+async def get_shipment(
+    shipment_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener un embarque específico"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('shipments').select('*').eq('id', str(shipment_id)).execute()
+        # Embarque, proveedores y facturas asociadas en una sola consulta
+        result = supabase.table('shipments').select(f'''
+            {select_columns('shipments', fields)},
+            shipment_supplier!shipment_supplier_shipment_id_fkey(
+                suppliers!shipment_supplier_supplier_id_fkey(id, nombre, contacto)
+            ),
+            shipment_invoice!shipment_invoice_shipment_id_fkey(
+                monto_asignado,
+                invoices!shipment_invoice_invoice_id_fkey(id, numero_factura, monto_total, estado)
+            )
+        ''').eq('id', str(shipment_id)).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Embarque no encontrado")
         
         shipment = result.data[0]
         
-        # Obtener proveedores asociados
-        suppliers_result = supabase.table('shipment_supplier').select('''
-            suppliers!shipment_supplier_supplier_id_fkey(id, nombre, contacto)
-        ''').eq('shipment_id', str(shipment_id)).execute()
-        
-        shipment['suppliers'] = [item['suppliers'] for item in suppliers_result.data]
-        
-        # Obtener facturas asociadas
-        invoices_result = supabase.table('shipment_invoice').select('''
-            monto_asignado,
-            invoices!shipment_invoice_invoice_id_fkey(id, numero_factura, monto_total, estado)
-        ''').eq('shipment_id', str(shipment_id)).execute()
-        
-        shipment['invoices'] = invoices_result.data
+        shipment['suppliers'] = [item['suppliers'] for item in shipment.pop('shipment_supplier', None) or []]
+        shipment['invoices'] = shipment.pop('shipment_invoice', None) or []
         
         return {
             "success": True,
@@ -137,17 +335,12 @@ async def get_shipment(shipment_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo embarque: {str(e)}")
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=ItemResponse[Shipment], response_model_exclude_unset=True)
 async def create_shipment(shipment_data: ShipmentCreate):
     """Crear nuevo embarque"""
     try:
         supabase = get_supabase()
         
-        # Verificar que no existe otro embarque con el mismo código
-        existing = supabase.table('shipments').select('id').eq('codigo', shipment_data.codigo).execute()
-        if existing.data:
-            raise HTTPException(status_code=400, detail="Ya existe un embarque con ese código")
-        
         # Preparar datos
         shipment_dict = shipment_data.model_dump()
         shipment_dict['id'] = str(uuid.uuid4())
@@ -160,8 +353,9 @@ async def create_shipment(shipment_data: ShipmentCreate):
         shipment_dict['created_at'] = datetime.utcnow().isoformat()
         shipment_dict['updated_at'] = datetime.utcnow().isoformat()
         
-        # Insertar
-        result = supabase.table('shipments').insert(shipment_dict).execute()
+        # Insertar (el código es único en la base de datos)
+        with translate_unique_violation({'shipments_codigo_key': "Ya existe un embarque con ese código"}):
+            result = supabase.table('shipments').insert(shipment_dict).execute()
         
         return {
             "success": True,
@@ -174,29 +368,18 @@ async def create_shipment(shipment_data: ShipmentCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando embarque: {str(e)}")
 
-@router.put("/{shipment_id}", response_model=dict)
+@router.put("/{shipment_id}", response_model=ItemResponse[Shipment], response_model_exclude_unset=True)
 async def update_shipment(shipment_id: UUID, shipment_data: ShipmentUpdate):
     """Actualizar embarque existente"""
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('shipments').select('*').eq('id', str(shipment_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Embarque no encontrado")
-        
         # Preparar datos (solo campos no nulos)
         update_data = {k: v for k, v in shipment_data.model_dump().items() if v is not None}
         
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
         
-        # Verificar código duplicado si se está actualizando
-        if 'codigo' in update_data:
-            existing_code = supabase.table('shipments').select('id').eq('codigo', update_data['codigo']).neq('id', str(shipment_id)).execute()
-            if existing_code.data:
-                raise HTTPException(status_code=400, detail="Ya existe otro embarque con ese código")
-        
         # Convertir fechas a string
         for date_field in ['fecha_embarque', 'fecha_llegada_estimada', 'fecha_llegada_real']:
             if update_data.get(date_field):
@@ -204,8 +387,12 @@ async def update_shipment(shipment_id: UUID, shipment_data: ShipmentUpdate):
         
         update_data['updated_at'] = datetime.utcnow().isoformat()
         
-        # Actualizar
-        result = supabase.table('shipments').update(update_data).eq('id', str(shipment_id)).execute()
+        # Actualizar (sin filas afectadas = no existe)
+        with translate_unique_violation({'shipments_codigo_key': "Ya existe otro embarque con ese código"}):
+            result = supabase.table('shipments').update(update_data).eq('id', str(shipment_id)).execute()
+        
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Embarque no encontrado")
         
         return {
             "success": True,
@@ -224,29 +411,14 @@ async def delete_shipment(shipment_id: UUID):
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('shipments').select('id, codigo').eq('id', str(shipment_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Embarque no encontrado")
-        
-        # Verificar si tiene facturas asociadas
-        invoices_count = supabase.table('shipment_invoice').select('id', count='exact').eq('shipment_id', str(shipment_id)).execute().count
-        
-        if invoices_count > 0:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"No se puede eliminar: tiene {invoices_count} facturas asociadas"
-            )
-        
-        # Eliminar relaciones con proveedores
-        supabase.table('shipment_supplier').delete().eq('shipment_id', str(shipment_id)).execute()
-        
-        # Eliminar embarque
-        supabase.table('shipments').delete().eq('id', str(shipment_id)).execute()
+        # Verificación de facturas, vínculos con proveedores y embarque se
+        # eliminan en una sola transacción
+        with translate_rpc_errors():
+            deleted = supabase.rpc('delete_shipment_cascade', {'p_shipment_id': str(shipment_id)}).execute().data
         
         return {
             "success": True,
-            "message": f"Embarque {existing.data[0]['codigo']} eliminado exitosamente"
+            "message": f"Embarque {deleted['codigo']} eliminado exitosamente"
         }
         
     except HTTPException:
@@ -260,39 +432,34 @@ async def link_suppliers_to_shipment(shipment_id: UUID, link_data: ShipmentSuppl
     try:
         supabase = get_supabase()
         
-        # Verificar que el embarque existe
-        shipment_result = supabase.table('shipments').select('id, codigo').eq('id', str(shipment_id)).execute()
-        if not shipment_result.data:
-            raise HTTPException(status_code=404, detail="Embarque no encontrado")
+        supplier_ids = list(dict.fromkeys(str(supplier_id) for supplier_id in link_data.supplier_ids))
         
-        # Verificar que todos los proveedores existen
-        for supplier_id in link_data.supplier_ids:
-            supplier_result = supabase.table('suppliers').select('id, nombre, activo').eq('id', str(supplier_id)).execute()
-            if not supplier_result.data:
-                raise HTTPException(status_code=404, detail=f"Proveedor {supplier_id} no encontrado")
+        # Verificar todos los proveedores con consultas por lote (IN_CHUNK_SIZE ids por URL)
+        if supplier_ids:
+            suppliers_by_id = load_children(supabase, 'suppliers', 'id', supplier_ids, 'nombre, activo')
             
-            if not supplier_result.data[0]['activo']:
-                raise HTTPException(status_code=400, detail=f"Proveedor {supplier_result.data[0]['nombre']} está inactivo")
-        
-        # Eliminar vínculos existentes
-        supabase.table('shipment_supplier').delete().eq('shipment_id', str(shipment_id)).execute()
-        
-        # Crear nuevos vínculos
-        links_to_create = []
-        for supplier_id in link_data.supplier_ids:
-            links_to_create.append({
-                'id': str(uuid.uuid4()),
-                'shipment_id': str(shipment_id),
-                'supplier_id': str(supplier_id),
-                'created_at': datetime.utcnow().isoformat()
-            })
+            for supplier_id in supplier_ids:
+                if not suppliers_by_id[supplier_id]:
+                    raise HTTPException(status_code=404, detail=f"Proveedor {supplier_id} no encontrado")
+                
+                supplier = suppliers_by_id[supplier_id][0]
+                if not supplier['activo']:
+                    raise HTTPException(status_code=400, detail=f"Proveedor {supplier['nombre']} está inactivo")
         
-        if links_to_create:
-            supabase.table('shipment_supplier').insert(links_to_create).execute()
+        # Insertar agregados y eliminar quitados en una sola transacción
+        with translate_rpc_errors():
+            synced = supabase.rpc('sync_shipment_suppliers', {
+                'p_shipment_id': str(shipment_id),
+                'p_supplier_ids': supplier_ids
+            }).execute().data
         
         return {
             "success": True,
-            "message": f"Vinculados {len(link_data.supplier_ids)} proveedores al embarque {shipment_result.data[0]['codigo']}"
+            "message": f"Vinculados {len(supplier_ids)} proveedores al embarque {synced['codigo']}",
+            "data": {
+                "agregados": synced['agregados'],
+                "eliminados": synced['eliminados']
+            }
         }
         
     except HTTPException:
@@ -357,6 +524,94 @@ async def link_invoice_to_shipment(shipment_id: UUID, link_data: ShipmentInvoice
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error vinculando factura: {str(e)}")
 
+@router.post("/{shipment_id}/facturas/lote", response_model=dict)
+async def link_invoices_to_shipment(shipment_id: UUID, link_data: ShipmentInvoiceBulkLink):
+    """Vincular varias facturas a un embarque (todas o ninguna)"""
+    try:
+        supabase = get_supabase()
+        
+        if not link_data.facturas:
+            raise HTTPException(status_code=400, detail="No hay facturas para vincular")
+        
+        invoice_ids = [str(link.invoice_id) for link in link_data.facturas]
+        if len(set(invoice_ids)) != len(invoice_ids):
+            raise HTTPException(status_code=400, detail="Hay facturas repetidas en la solicitud")
+        
+        # Verificar que el embarque existe
+        shipment_result = supabase.table('shipments').select('id, codigo').eq('id', str(shipment_id)).execute()
+        if not shipment_result.data:
+            raise HTTPException(status_code=404, detail="Embarque no encontrado")
+        
+        # Cargar facturas, proveedores vinculados y vínculos existentes con consultas
+        # por lote (IN_CHUNK_SIZE ids por URL)
+        invoices_by_id = {
+            invoice_id: rows[0]
+            for invoice_id, rows in load_children(supabase, 'invoices', 'id', invoice_ids, 'numero_factura, supplier_id, monto_total').items()
+            if rows
+        }
+        
+        supplier_links = supabase.table('shipment_supplier').select('supplier_id').eq('shipment_id', str(shipment_id)).execute()
+        linked_suppliers = {link['supplier_id'] for link in supplier_links.data}
+        
+        existing_links = load_children(supabase, 'shipment_invoice', 'invoice_id', invoice_ids, 'invoice_id', filters={'shipment_id': str(shipment_id)})
+        already_linked = {invoice_id for invoice_id, rows in existing_links.items() if rows}
+        
+        # Validar todas antes de insertar para informar todos los errores juntos
+        errores = []
+        link_records = []
+        now = datetime.utcnow().isoformat()
+        
+        for link in link_data.facturas:
+            invoice_id = str(link.invoice_id)
+            invoice = invoices_by_id.get(invoice_id)
+            
+            if not invoice:
+                errores.append({"invoice_id": invoice_id, "error": "Factura no encontrada"})
+                continue
+            
+            if invoice['supplier_id'] not in linked_suppliers:
+                errores.append({"invoice_id": invoice_id, "error": f"El proveedor de la factura {invoice['numero_factura']} no está vinculado a este embarque"})
+                continue
+            
+            if invoice_id in already_linked:
+                errores.append({"invoice_id": invoice_id, "error": f"La factura {invoice['numero_factura']} ya está vinculada a este embarque"})
+                continue
+            
+            if link.monto_asignado is not None and float(link.monto_asignado) > float(invoice['monto_total']):
+                errores.append({"invoice_id": invoice_id, "error": f"El monto asignado excede el total de la factura {invoice['numero_factura']}"})
+                continue
+            
+            link_record = {
+                'id': str(uuid.uuid4()),
+                'shipment_id': str(shipment_id),
+                'invoice_id': invoice_id,
+                'created_at': now
+            }
+            
+            if link.monto_asignado is not None:
+                link_record['monto_asignado'] = float(link.monto_asignado)
+            
+            link_records.append(link_record)
+        
+        if errores:
+            raise HTTPException(status_code=400, detail={"message": "No se vinculó ninguna factura", "errores": errores})
+        
+        # Un solo INSERT multi-fila: se aplica completo o no se aplica
+        supabase.table('shipment_invoice').insert(link_records).execute()
+        
+        return {
+            "success": True,
+            "message": f"Vinculadas {len(link_records)} facturas al embarque {shipment_result.data[0]['codigo']}",
+            "data": {
+                "vinculadas": len(link_records)
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error vinculando facturas: {str(e)}")
+
 @router.get("/{shipment_id}/cuadre", response_model=dict)
 async def get_shipment_balance(shipment_id: UUID):
     """Obtener cuadre financiero del embarque"""
@@ -420,8 +675,8 @@ async def get_shipment_balance(shipment_id: UUID):
             
             if po_ids:
                 # Obtener anticipos disponibles de estas órdenes
-                advances = supabase.table('advance_payments').select('monto').in_('po_id', po_ids).eq('estado', 'disponible').execute()
-                anticipos_disponibles = sum(float(adv['monto']) for adv in advances.data)
+                advances = supabase.table('advance_payments').select('saldo_disponible').in_('po_id', po_ids).eq('estado', 'disponible').execute()
+                anticipos_disponibles = sum(float(adv['saldo_disponible']) for adv in advances.data)
         
         return {
             "success": True,
@@ -506,7 +761,7 @@ async def update_invoice_shipment_assignment(shipment_id: UUID, invoice_id: UUID
 async def get_shipments_by_supplier(supplier_id: UUID):
     """Obtener embarques de un proveedor específico"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Verificar que el proveedor existe
         supplier_result = supabase.table('suppliers').select('id, nombre').eq('id', str(supplier_id)).execute()
@@ -543,101 +798,31 @@ async def get_shipments_by_supplier(supplier_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo embarques del proveedor: {str(e)}")
 
-@router.get("/en-transito", response_model=dict)
-async def get_shipments_in_transit():
-    """Obtener embarques en tránsito con información detallada"""
-    try:
-        supabase = get_supabase()
-        
-        # Obtener embarques en tránsito
-        shipments_result = supabase.table('shipments').select('*').eq('estado', 'en_transito').order('fecha_embarque').execute()
-        
-        shipments_with_details = []
-        
-        for shipment in shipments_result.data:
-            # Obtener proveedores
-            suppliers_result = supabase.table('shipment_supplier').select('''
-                suppliers!shipment_supplier_supplier_id_fkey(nombre)
-            ''').eq('shipment_id', shipment['id']).execute()
-            
-            # Obtener facturas
-            invoices_result = supabase.table('shipment_invoice').select('''
-                monto_asignado,
-                invoices!shipment_invoice_invoice_id_fkey(numero_factura, monto_total, saldo_pendiente)
-            ''').eq('shipment_id', shipment['id']).execute()
-            
-            # Calcular días en tránsito
-            if shipment.get('fecha_embarque'):
-                fecha_embarque = datetime.fromisoformat(shipment['fecha_embarque']).date()
-                dias_transito = (date.today() - fecha_embarque).days
-            else:
-                dias_transito = None
-            
-            # Calcular días hasta llegada estimada
-            dias_hasta_llegada = None
-            if shipment.get('fecha_llegada_estimada'):
-                fecha_llegada_est = datetime.fromisoformat(shipment['fecha_llegada_estimada']).date()
-                dias_hasta_llegada = (fecha_llegada_est - date.today()).days
-            
-            shipment_detail = {
-                **shipment,
-                'proveedores': [item['suppliers']['nombre'] for item in suppliers_result.data],
-                'facturas': invoices_result.data,
-                'total_facturas': sum(float(item['invoices']['monto_total']) for item in invoices_result.data),
-                'saldo_pendiente': sum(float(item['invoices']['saldo_pendiente']) for item in invoices_result.data),
-                'dias_en_transito': dias_transito,
-                'dias_hasta_llegada': dias_hasta_llegada,
-                'estado_llegada': 'retrasado' if dias_hasta_llegada and dias_hasta_llegada < 0 else 'a_tiempo'
-            }
-            
-            shipments_with_details.append(shipment_detail)
-        
-        # Estadísticas
-        total_valor = sum(ship['total_facturas'] for ship in shipments_with_details)
-        total_saldo = sum(ship['saldo_pendiente'] for ship in shipments_with_details)
-        retrasados = len([ship for ship in shipments_with_details if ship['estado_llegada'] == 'retrasado'])
-        
-        return {
-            "success": True,
-            "data": {
-                "embarques": shipments_with_details,
-                "estadisticas": {
-                    "total_embarques": len(shipments_with_details),
-                    "valor_total": round(total_valor, 2),
-                    "saldo_pendiente": round(total_saldo, 2),
-                    "retrasados": retrasados
-                }
-            }
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo embarques en tránsito: {str(e)}")
-
 @router.get("/stats/resumen", response_model=dict)
+@serve_stale_on_error
 async def get_shipments_stats():
     """Estadísticas generales de embarques"""
     try:
-        supabase = get_supabase()
-        
-        # Obtener todos los embarques
-        shipments_result = supabase.table('shipments').select('estado').execute()
+        supabase = get_supabase_read()
         
-        # Calcular estadísticas
-        total_embarques = len(shipments_result.data)
-        
-        # Por estado
+        # Recorrer todos los embarques por bloques
+        total_embarques = 0
         stats_por_estado = {}
-        for shipment in shipments_result.data:
+        for shipment in iter_table(supabase, 'shipments', 'estado'):
+            total_embarques += 1
+            
+            # Por estado
             estado = shipment.get('estado', 'en_transito')
             stats_por_estado[estado] = stats_por_estado.get(estado, 0) + 1
         
         # Obtener estadísticas financieras de facturas vinculadas
-        invoices_shipment = supabase.table('shipment_invoice').select('''
+        total_valor_embarques = 0
+        total_saldo_pendiente = 0
+        for item in iter_table(supabase, 'shipment_invoice', '''
             invoices!shipment_invoice_invoice_id_fkey(monto_total, saldo_pendiente)
-        ''').execute()
-        
-        total_valor_embarques = sum(float(item['invoices']['monto_total']) for item in invoices_shipment.data)
-        total_saldo_pendiente = sum(float(item['invoices']['saldo_pendiente']) for item in invoices_shipment.data)
+        '''):
+            total_valor_embarques += float(item['invoices']['monto_total'])
+            total_saldo_pendiente += float(item['invoices']['saldo_pendiente'])
         
         return {
             "success": True,
@@ -649,6 +834,8 @@ async def get_shipments_stats():
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
@@ -729,84 +916,155 @@ async def mark_shipment_dispatched(shipment_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error marcando embarque como despachado: {str(e)}")
 
-@router.get("/proximos-arribar", response_model=dict)
-async def get_upcoming_arrivals(dias: int = Query(30, ge=1, le=365)):
-    """Obtener embarques que van a arribar en los próximos días"""
+def _bulk_filters(selection: ShipmentBulkSelection):
+    """Validar la selección masiva; devuelve los filtros de naviera / ETA o None si es por ids"""
+    has_filters = selection.naviera or selection.eta_desde or selection.eta_hasta
+    
+    if selection.ids and has_filters:
+        raise HTTPException(status_code=400, detail="Indique ids o filtros (naviera / ETA), no ambos")
+    
+    if selection.ids:
+        return None
+    
+    if not has_filters:
+        raise HTTPException(status_code=400, detail="Indique ids o filtros (naviera / ETA) para seleccionar embarques")
+    
+    # Sin ventana de ETA una naviera seleccionaría toda su historia
+    if not (selection.eta_desde and selection.eta_hasta):
+        raise HTTPException(status_code=400, detail="La selección por filtros requiere una ventana de ETA (eta_desde y eta_hasta)")
+    
+    if selection.eta_desde > selection.eta_hasta:
+        raise HTTPException(status_code=400, detail="eta_desde no puede ser posterior a eta_hasta")
+    
+    def filters(query):
+        if selection.naviera:
+            query = query.eq('naviera', selection.naviera)
+        return query.gte('fecha_llegada_estimada', selection.eta_desde.isoformat()).lte('fecha_llegada_estimada', selection.eta_hasta.isoformat())
+    
+    return filters
+
+def _apply_bulk_update(supabase, selection: ShipmentBulkSelection, update_data: dict, allowed_from: tuple, target: Optional[str] = None):
+    """Actualizar los embarques elegibles (por filtros o por ids) y devolver el resultado por id"""
+    filters = _bulk_filters(selection)
+    
+    if filters is not None:
+        # Por filtros: la misma condición va directo al UPDATE junto con el estado
+        # permitido, sin pasar una lista de ids por la URL
+        result = filters(supabase.table('shipments').update(update_data)).in_('estado', list(allowed_from)).execute()
+        
+        omitidos = filters(
+            supabase.table('shipments').select('id', count='exact', head=True)
+        ).not_.in_('estado', list(allowed_from)).execute().count or 0
+        
+        return {
+            "actualizados": len(result.data),
+            "omitidos": omitidos,
+            "resultados": [{"id": row['id'], "codigo": row['codigo'], "resultado": "actualizado"} for row in result.data]
+        }
+    
+    # Por ids (hasta 500): se informa el resultado de cada uno. Lectura y
+    # escritura en lotes de IN_CHUNK_SIZE ids para no exceder el largo de URL
+    ids = list(dict.fromkeys(str(shipment_id) for shipment_id in selection.ids))
+    found = {
+        shipment_id: rows[0]
+        for shipment_id, rows in load_children(supabase, 'shipments', 'id', ids, 'codigo, estado').items()
+        if rows
+    }
+    
+    resultados = [{"id": shipment_id, "resultado": "no_encontrado"} for shipment_id in ids if shipment_id not in found]
+    eligible = []
+    
+    for shipment in (found[i] for i in ids if i in found):
+        if target and shipment['estado'] == target:
+            resultados.append({"id": shipment['id'], "codigo": shipment['codigo'], "resultado": "sin_cambios", "detalle": f"Ya está {target}"})
+        elif shipment['estado'] not in allowed_from:
+            resultados.append({"id": shipment['id'], "codigo": shipment['codigo'], "resultado": "omitido", "detalle": f"Estado actual: {shipment['estado']}"})
+        else:
+            eligible.append(shipment)
+    
+    updated_ids = set()
+    eligible_ids = [shipment['id'] for shipment in eligible]
+    for start in range(0, len(eligible_ids), IN_CHUNK_SIZE):
+        # El filtro por estado protege contra cambios concurrentes entre la lectura y la escritura
+        result = supabase.table('shipments').update(update_data).in_('id', eligible_ids[start:start + IN_CHUNK_SIZE]).in_('estado', list(allowed_from)).execute()
+        updated_ids.update(row['id'] for row in result.data)
+    
+    for shipment in eligible:
+        if shipment['id'] in updated_ids:
+            resultados.append({"id": shipment['id'], "codigo": shipment['codigo'], "resultado": "actualizado"})
+        else:
+            resultados.append({"id": shipment['id'], "codigo": shipment['codigo'], "resultado": "omitido", "detalle": "El estado cambió durante la operación"})
+    
+    return {
+        "actualizados": len(updated_ids),
+        "omitidos": len(found) - len(updated_ids),
+        "resultados": resultados
+    }
+
+@router.post("/marcar-arribado", response_model=dict)
+async def mark_shipments_arrived(selection: ShipmentBulkArrival):
+    """Marcar varios embarques en tránsito como arribados"""
     try:
         supabase = get_supabase()
         
-        # Calcular fecha límite
-        fecha_limite = (date.today() + timedelta(days=dias)).isoformat()
+        fecha_llegada_real = selection.fecha_llegada_real or date.today()
+        data = _apply_bulk_update(supabase, selection, {
+            'estado': 'arribado',
+            'fecha_llegada_real': fecha_llegada_real.isoformat(),
+            'updated_at': datetime.utcnow().isoformat()
+        }, BULK_TRANSITIONS['arribado'], 'arribado')
         
-        # Obtener embarques próximos a arribar
-        shipments_result = supabase.table('shipments').select('*').eq('estado', 'en_transito').lte('fecha_llegada_estimada', fecha_limite).order('fecha_llegada_estimada').execute()
+        return {
+            "success": True,
+            "message": f"{data['actualizados']} embarques marcados como arribados",
+            "data": data
+        }
         
-        shipments_with_details = []
-        hoy = date.today()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error marcando embarques como arribados: {str(e)}")
+
+@router.post("/marcar-despachado", response_model=dict)
+async def mark_shipments_dispatched(selection: ShipmentBulkSelection):
+    """Marcar varios embarques arribados como despachados"""
+    try:
+        supabase = get_supabase()
         
-        for shipment in shipments_result.data:
-            # Obtener proveedores
-            suppliers_result = supabase.table('shipment_supplier').select('''
-                suppliers!shipment_supplier_supplier_id_fkey(nombre)
-            ''').eq('shipment_id', shipment['id']).execute()
-            
-            # Obtener facturas
-            invoices_result = supabase.table('shipment_invoice').select('''
-                monto_asignado,
-                invoices!shipment_invoice_invoice_id_fkey(numero_factura, monto_total, saldo_pendiente)
-            ''').eq('shipment_id', shipment['id']).execute()
-            
-            # Calcular días hasta llegada
-            dias_hasta_llegada = None
-            urgencia = 'normal'
-            
-            if shipment.get('fecha_llegada_estimada'):
-                fecha_llegada_est = datetime.fromisoformat(shipment['fecha_llegada_estimada']).date()
-                dias_hasta_llegada = (fecha_llegada_est - hoy).days
-                
-                if dias_hasta_llegada < 0:
-                    urgencia = 'retrasado'
-                elif dias_hasta_llegada <= 3:
-                    urgencia = 'critico'
-                elif dias_hasta_llegada <= 7:
-                    urgencia = 'alto'
-            
-            shipment_detail = {
-                **shipment,
-                'proveedores': [item['suppliers']['nombre'] for item in suppliers_result.data],
-                'facturas': invoices_result.data,
-                'total_facturas': sum(float(item['invoices']['monto_total']) for item in invoices_result.data),
-                'saldo_pendiente': sum(float(item['invoices']['saldo_pendiente']) for item in invoices_result.data),
-                'dias_hasta_llegada': dias_hasta_llegada,
-                'urgencia': urgencia
-            }
-            
-            shipments_with_details.append(shipment_detail)
+        data = _apply_bulk_update(supabase, selection, {
+            'estado': 'despachado',
+            'updated_at': datetime.utcnow().isoformat()
+        }, BULK_TRANSITIONS['despachado'], 'despachado')
         
-        # Agrupar por urgencia
-        retrasados = [s for s in shipments_with_details if s['urgencia'] == 'retrasado']
-        criticos = [s for s in shipments_with_details if s['urgencia'] == 'critico']
-        altos = [s for s in shipments_with_details if s['urgencia'] == 'alto']
-        normales = [s for s in shipments_with_details if s['urgencia'] == 'normal']
+        return {
+            "success": True,
+            "message": f"{data['actualizados']} embarques marcados como despachados",
+            "data": data
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error marcando embarques como despachados: {str(e)}")
+
+@router.post("/actualizar-eta", response_model=dict)
+async def update_shipments_eta(selection: ShipmentBulkEta):
+    """Actualizar la fecha estimada de llegada de varios embarques en tránsito"""
+    try:
+        supabase = get_supabase()
+        
+        data = _apply_bulk_update(supabase, selection, {
+            'fecha_llegada_estimada': selection.fecha_llegada_estimada.isoformat(),
+            'updated_at': datetime.utcnow().isoformat()
+        }, ('en_transito',))
         
         return {
             "success": True,
-            "data": {
-                "resumen": {
-                    "total": len(shipments_with_details),
-                    "retrasados": len(retrasados),
-                    "criticos": len(criticos),
-                    "altos": len(altos),
-                    "normales": len(normales)
-                },
-                "embarques": {
-                    "retrasados": retrasados,
-                    "criticos": criticos,
-                    "altos": altos,
-                    "normales": normales
-                }
-            }
+            "message": f"ETA actualizada en {data['actualizados']} embarques",
+            "data": data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo próximos arribos: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error actualizando ETA: {str(e)}")
@@ -4,24 +4,54 @@ from uuid import UUID
 import uuid
 from datetime import datetime
 
-from database import get_supabase
+from database import get_supabase, get_supabase_read
+from models.common import ItemResponse, ListResponse
 from models.supplier import Supplier, SupplierCreate, SupplierUpdate
+from services.db_errors import translate_unique_violation
+from services.projections import LIST_FIELDS, select_columns
+from services.read_model import project, read_model
+from services.supplier_index import supplier_index
+from services.stale_cache import serve_stale_on_error
 
 router = APIRouter()
 
-@router.get("/", response_model=dict)
+@router.get("/", response_model=ListResponse[Supplier], response_model_exclude_unset=True)
+@serve_stale_on_error
 async def get_suppliers(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     activo: Optional[bool] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
 ):
     """Obtener lista de proveedores con paginación y filtros"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
+        
+        columns = select_columns('suppliers', fields, LIST_FIELDS['suppliers'])
+        offset = (page - 1) * per_page
+        
+        # Réplica local de lectura si está al día
+        if read_model.is_fresh():
+            rows, total = read_model.query(
+                'suppliers',
+                filters={'activo': activo},
+                search=(('nombre',), search) if search else None,
+                order_by='nombre',
+                offset=offset,
+                limit=per_page
+            )
+            return {
+                "success": True,
+                "data": [project(row, columns) for row in rows],
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "pages": (total + per_page - 1) // per_page
+            }
         
-        # Construir query base
-        query = supabase.table('suppliers').select('*')
+        # Construir query base (proyección reducida salvo que se pidan campos)
+        query = supabase.table('suppliers').select(columns)
         
         # Aplicar filtros
         if activo is not None:
@@ -31,7 +61,7 @@ async def get_suppliers(
             query = query.ilike('nombre', f'%{search}%')
         
         # Contar total
-        count_query = supabase.table('suppliers').select('*', count='exact')
+        count_query = supabase.table('suppliers').select('id', count='exact', head=True)
         if activo is not None:
             count_query = count_query.eq('activo', activo)
         if search:
@@ -41,7 +71,6 @@ async def get_suppliers(
         total = total_result.count
         
         # Aplicar paginación
-        offset = (page - 1) * per_page
         query = query.range(offset, offset + per_page - 1).order('nombre')
         
         result = query.execute()
@@ -55,16 +84,44 @@ async def get_suppliers(
             "pages": (total + per_page - 1) // per_page
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo proveedores: {str(e)}")
 
-@router.get("/{supplier_id}", response_model=dict)
-async def get_supplier(supplier_id: UUID):
+# Debe declararse antes de /{supplier_id} para no quedar oculta
+@router.get("/autocomplete", response_model=dict)
+async def autocomplete_suppliers(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    activo: Optional[bool] = True
+):
+    """Sugerencias de proveedores por prefijo y similitud (índice en memoria)"""
+    try:
+        supabase = get_supabase()
+        
+        supplier_index.ensure_loaded(supabase)
+        
+        return {
+            "success": True,
+            "data": supplier_index.autocomplete(q, limit, activo)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en autocompletado de proveedores: {str(e)}")
+
+@router.get("/{supplier_id}", response_model=ItemResponse[Supplier], response_model_exclude_unset=True)
+async def get_supplier(
+    supplier_id: UUID,
+    fields: Optional[str] = Query(None, description="Columnas a incluir, separadas por coma")
+):
     """Obtener un proveedor específico"""
     try:
         supabase = get_supabase()
         
-        result = supabase.table('suppliers').select('*').eq('id', str(supplier_id)).execute()
+        result = supabase.table('suppliers').select(select_columns('suppliers', fields)).eq('id', str(supplier_id)).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Proveedor no encontrado")
@@ -79,16 +136,24 @@ async def get_supplier(supplier_id: UUID):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo proveedor: {str(e)}")
 
-@router.post("/", response_model=dict)
-async def create_supplier(supplier_data: SupplierCreate):
+@router.post("/", response_model=ItemResponse[Supplier], response_model_exclude_unset=True)
+async def create_supplier(
+    supplier_data: SupplierCreate,
+    permitir_similares: bool = Query(False, description="Crear aunque existan proveedores con nombre casi igual")
+):
     """Crear nuevo proveedor"""
     try:
         supabase = get_supabase()
         
-        # Verificar si ya existe un proveedor con el mismo nombre
-        existing = supabase.table('suppliers').select('id').eq('nombre', supplier_data.nombre).execute()
-        if existing.data:
-            raise HTTPException(status_code=400, detail="Ya existe un proveedor con ese nombre")
+        # Detectar nombres casi duplicados con el índice en memoria
+        if not permitir_similares:
+            supplier_index.ensure_loaded(supabase)
+            similares = supplier_index.find_similar(supplier_data.nombre)
+            if similares:
+                raise HTTPException(status_code=400, detail={
+                    "message": "Existen proveedores con un nombre similar. Use permitir_similares=true para crearlo de todas formas",
+                    "similares": similares
+                })
         
         # Preparar datos
         supplier_dict = supplier_data.model_dump()
@@ -96,8 +161,11 @@ async def create_supplier(supplier_data: SupplierCreate):
         supplier_dict['created_at'] = datetime.utcnow().isoformat()
         supplier_dict['updated_at'] = datetime.utcnow().isoformat()
         
-        # Insertar
-        result = supabase.table('suppliers').insert(supplier_dict).execute()
+        # Insertar (el nombre es único en la base de datos)
+        with translate_unique_violation({'suppliers_nombre_key': "Ya existe un proveedor con ese nombre"}):
+            result = supabase.table('suppliers').insert(supplier_dict).execute()
+        
+        supplier_index.upsert(result.data[0])
         
         return {
             "success": True,
@@ -110,33 +178,28 @@ async def create_supplier(supplier_data: SupplierCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando proveedor: {str(e)}")
 
-@router.put("/{supplier_id}", response_model=dict)
+@router.put("/{supplier_id}", response_model=ItemResponse[Supplier], response_model_exclude_unset=True)
 async def update_supplier(supplier_id: UUID, supplier_data: SupplierUpdate):
     """Actualizar proveedor existente"""
     try:
         supabase = get_supabase()
         
-        # Verificar que existe
-        existing = supabase.table('suppliers').select('id').eq('id', str(supplier_id)).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Proveedor no encontrado")
-        
         # Preparar datos (solo campos no nulos)
         update_data = {k: v for k, v in supplier_data.model_dump().items() if v is not None}
         
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
         
-        # Verificar nombre duplicado si se está actualizando
-        if 'nombre' in update_data:
-            existing_name = supabase.table('suppliers').select('id').eq('nombre', update_data['nombre']).neq('id', str(supplier_id)).execute()
-            if existing_name.data:
-                raise HTTPException(status_code=400, detail="Ya existe otro proveedor con ese nombre")
-        
         update_data['updated_at'] = datetime.utcnow().isoformat()
         
-        # Actualizar
-        result = supabase.table('suppliers').update(update_data).eq('id', str(supplier_id)).execute()
+        # Actualizar (sin filas afectadas = no existe)
+        with translate_unique_violation({'suppliers_nombre_key': "Ya existe otro proveedor con ese nombre"}):
+            result = supabase.table('suppliers').update(update_data).eq('id', str(supplier_id)).execute()
+        
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Proveedor no encontrado")
+        
+        supplier_index.upsert(result.data[0])
         
         return {
             "success": True,
@@ -171,6 +234,8 @@ async def delete_supplier(supplier_id: UUID):
                 'updated_at': datetime.utcnow().isoformat()
             }).eq('id', str(supplier_id)).execute()
             
+            supplier_index.upsert(result.data[0])
+            
             return {
                 "success": True,
                 "message": f"Proveedor marcado como inactivo (tiene {pos_count} órdenes y {invoices_count} facturas asociadas)",
@@ -180,6 +245,8 @@ async def delete_supplier(supplier_id: UUID):
             # Hard delete si no tiene relaciones
             supabase.table('suppliers').delete().eq('id', str(supplier_id)).execute()
             
+            supplier_index.remove(supplier_id)
+            
             return {
                 "success": True,
                 "message": "Proveedor eliminado exitosamente"
@@ -194,7 +261,7 @@ async def delete_supplier(supplier_id: UUID):
 async def get_supplier_dashboard(supplier_id: UUID):
     """Dashboard de estadísticas del proveedor"""
     try:
-        supabase = get_supabase()
+        supabase = get_supabase_read()
         
         # Verificar que existe
         supplier_result = supabase.table('suppliers').select('*').eq('id', str(supplier_id)).execute()
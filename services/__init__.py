@@ -0,0 +1,3 @@
+# =============================================
+# services/__init__.py - Lógica de negocio compartida entre routers
+# =============================================
@@ -0,0 +1,193 @@
+# =============================================
+# services/admission.py - Control de admisión por clase de ruta
+# =============================================
+#
+# Cada solicitud a /api se clasifica como `report` (reportes y estadísticas,
+# consultas pesadas) o `crud` (el resto). Cada clase tiene un máximo de
+# solicitudes en ejecución y una cola acotada de espera:
+# - si la cola está llena, o la espera supera ADMISSION_QUEUE_TIMEOUT, se
+#   responde 503 con Retry-After sin tocar la base de datos
+# - los reportes además tienen un máximo por cliente: quien ya tiene ese
+#   número de reportes en curso recibe 429
+# Así unos pocos reportes repetidos no consumen la capacidad que necesitan
+# las pantallas de CRUD. Ocupación, límites y rechazos se publican en /metrics.
+
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, Optional
+
+from services.http_cache import is_event_stream
+from services.metrics import metrics
+from settings_new import settings
+
+metrics.describe('admission_in_flight', 'gauge', 'Solicitudes en ejecución por clase de ruta')
+metrics.describe('admission_queued', 'gauge', 'Solicitudes esperando turno por clase de ruta')
+metrics.describe('admission_limit', 'gauge', 'Máximo de solicitudes concurrentes por clase de ruta')
+metrics.describe('admission_queue_limit', 'gauge', 'Máximo de solicitudes en espera por clase de ruta')
+metrics.describe('admission_rejected_total', 'counter', 'Solicitudes rechazadas por clase de ruta y motivo')
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteClassLimiter:
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float,
+                 retry_after: int, per_client: Optional[int] = None):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.per_client = per_client
+        self.in_flight = 0
+        self.queued = 0
+        self._by_client: Dict[str, int] = defaultdict(int)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self, client: str) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        if self.per_client and self._by_client[client] >= self.per_client:
+            raise Rejected(429, 'por_cliente', self.retry_after)
+
+        # Con cupo libre se entra sin pasar por la cola
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self._by_client[client] += 1
+            self.in_flight += 1
+            return
+
+        if self.queued >= self.queue_size:
+            raise Rejected(503, 'cola_llena', self.retry_after)
+
+        # El cupo del cliente se toma antes de esperar para que no encole más de lo permitido
+        self._by_client[client] += 1
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._release_client(client)
+            raise Rejected(503, 'espera_agotada', self.retry_after)
+        except BaseException:
+            self._release_client(client)
+            raise
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+
+    def release(self, client: str) -> None:
+        self.in_flight -= 1
+        self._release_client(client)
+        self._semaphore.release()
+
+    def _release_client(self, client: str) -> None:
+        self._by_client[client] -= 1
+        if self._by_client[client] <= 0:
+            del self._by_client[client]
+
+    def collect(self):
+        labels = {'class': self.name}
+        return [
+            ('admission_in_flight', labels, self.in_flight),
+            ('admission_queued', labels, self.queued),
+            ('admission_limit', labels, self.concurrency),
+            ('admission_queue_limit', labels, self.queue_size)
+        ]
+
+
+def route_class(path: str) -> str:
+    """Clase de una ruta de la API"""
+    if path.startswith('/api/reports') or path.startswith('/api/stats') or '/stats/' in path:
+        return 'report'
+    return 'crud'
+
+
+def client_id(scope, trusted_proxies: int = 1) -> str:
+    """Cliente de la solicitud según X-Forwarded-For o la IP de la conexión
+
+    Las primeras entradas de X-Forwarded-For las escribe el cliente y se
+    pueden falsificar; sólo son confiables las que agregan los proxies
+    propios al final. Con trusted_proxies proxies delante, el cliente es la
+    entrada en esa posición contando desde la derecha (0 = IP de la conexión).
+    """
+    forwarded = []
+    for name, value in scope.get('headers') or []:
+        if name == b'x-forwarded-for':
+            forwarded.extend(entry.strip() for entry in value.decode('latin-1').split(',') if entry.strip())
+
+    if trusted_proxies > 0 and forwarded:
+        return forwarded[-min(trusted_proxies, len(forwarded))]
+
+    client = scope.get('client')
+    return client[0] if client else 'desconocido'
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI que limita la concurrencia de /api por clase de ruta"""
+
+    def __init__(self, app, prefix: str = '/api'):
+        self.app = app
+        self.prefix = prefix
+        self.limiters = {
+            'report': RouteClassLimiter(
+                'report',
+                concurrency=settings.admission_report_concurrency,
+                queue_size=settings.admission_report_queue,
+                queue_timeout=settings.admission_queue_timeout,
+                retry_after=settings.admission_report_retry_after,
+                per_client=settings.admission_report_per_client
+            ),
+            'crud': RouteClassLimiter(
+                'crud',
+                concurrency=settings.admission_crud_concurrency,
+                queue_size=settings.admission_crud_queue,
+                queue_timeout=settings.admission_queue_timeout,
+                retry_after=1
+            )
+        }
+        for limiter in self.limiters.values():
+            metrics.add_collector(limiter.collect)
+
+    async def __call__(self, scope, receive, send):
+        # Los streams SSE quedan abiertos indefinidamente: no ocupan cupos
+        if (scope['type'] != 'http' or not scope['path'].startswith(self.prefix)
+                or scope['method'] == 'OPTIONS' or is_event_stream(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[route_class(scope['path'])]
+        client = client_id(scope, settings.admission_trusted_proxies)
+
+        try:
+            await limiter.acquire(client)
+        except Rejected as rejected:
+            metrics.inc('admission_rejected_total', {'class': limiter.name, 'reason': rejected.reason})
+            await self._reject(send, rejected)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(client)
+
+    @staticmethod
+    async def _reject(send, rejected: Rejected) -> None:
+        detail = "Demasiados reportes en curso para este cliente" if rejected.status == 429 else "Servidor saturado, intente nuevamente"
+        body = json.dumps({"detail": detail, "motivo": rejected.reason}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': rejected.status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'retry-after', str(rejected.retry_after).encode('latin-1'))
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,132 @@
+# =============================================
+# services/advance_service.py - Saldos mantenidos de anticipos
+# =============================================
+#
+# advance_payments.monto_aplicado / saldo_disponible y
+# purchase_orders.total_anticipos se actualizan en cada escritura (con RPC
+# atómicas, sin leer y reescribir el valor) para que
+# las validaciones de disponibilidad lean una sola fila en vez de sumar
+# aplicaciones o anticipos. reconcile_advance_balances() verifica (y
+# opcionalmente corrige) los valores mantenidos contra las tablas base.
+
+from collections import defaultdict
+
+from services.db_errors import translate_rpc_errors
+from services.pagination import iter_table
+
+
+def compute_available_balance(monto: float, monto_aplicado: float, estado: str) -> float:
+    """Saldo disponible de un anticipo según su monto, lo aplicado y su estado"""
+    if estado == 'devuelto':
+        return 0.0
+    return round(max(0.0, monto - monto_aplicado), 2)
+
+
+def allocate_advance_to_invoice(supabase, invoice_id, advance_id, monto: float, due_id=None) -> dict:
+    """Aplicar un anticipo a una factura (y opcionalmente a un vencimiento)
+
+    Una sola transacción (RPC apply_advance_to_invoice, migración 012):
+    descuenta el saldo del anticipo con apply_advance_allocation, registra la
+    aplicación y el pago del vencimiento y descuenta el saldo de la factura.
+    Si algo falla no queda el anticipo descontado sin su aplicación.
+    Devuelve monto_aplicado, nuevo_saldo_factura y nuevo_estado_factura.
+    """
+    with translate_rpc_errors():
+        return supabase.rpc('apply_advance_to_invoice', {
+            'p_invoice_id': str(invoice_id),
+            'p_advance_id': str(advance_id),
+            'p_monto': monto,
+            'p_due_id': str(due_id) if due_id else None
+        }).execute().data
+
+
+def adjust_po_advance_total(supabase, po_id, delta: float) -> float:
+    """Sumar delta al total de anticipos mantenido en la orden de compra
+
+    Atómico (RPC adjust_po_advance_total, migración 009); con delta positivo
+    responde 400 si el total superaría el de la orden.
+    """
+    with translate_rpc_errors():
+        return float(supabase.rpc('adjust_po_advance_total', {
+            'p_po_id': str(po_id),
+            'p_delta': delta
+        }).execute().data)
+
+
+def update_advance_payment(supabase, advance_id, changes: dict) -> dict:
+    """Actualizar un anticipo: monto, fecha_pago, metodo_pago, usuario_pago y notas
+
+    Una sola transacción (RPC update_advance_payment, migración 013): el
+    saldo disponible se calcula en SQL con el monto_aplicado vigente y el
+    total de anticipos de la orden se ajusta con adjust_po_advance_total.
+    """
+    with translate_rpc_errors():
+        return supabase.rpc('update_advance_payment', {
+            'p_advance_id': str(advance_id),
+            'p_monto': changes.get('monto'),
+            'p_fecha_pago': changes.get('fecha_pago'),
+            'p_metodo_pago': changes.get('metodo_pago'),
+            'p_usuario_pago': changes.get('usuario_pago'),
+            'p_notas': changes.get('notas')
+        }).execute().data
+
+
+def reconcile_advance_balances(supabase, corregir: bool = False) -> dict:
+    """Comparar los saldos mantenidos con la suma real de aplicaciones y anticipos"""
+    # Sumas reales desde las tablas base
+    aplicado_por_anticipo = defaultdict(float)
+    for alloc in iter_table(supabase, 'advance_allocation', 'anticipo_id, monto_aplicado'):
+        aplicado_por_anticipo[alloc['anticipo_id']] += float(alloc['monto_aplicado'])
+
+    anticipos_por_orden = defaultdict(float)
+    anticipos_revisados = 0
+    diferencias_anticipos = []
+    for advance in iter_table(supabase, 'advance_payments', 'id, po_id, monto, estado, monto_aplicado, saldo_disponible'):
+        anticipos_revisados += 1
+        anticipos_por_orden[advance['po_id']] += float(advance['monto'])
+
+        monto_aplicado = round(aplicado_por_anticipo.get(advance['id'], 0.0), 2)
+        saldo_disponible = compute_available_balance(float(advance['monto']), monto_aplicado, advance['estado'])
+
+        if (abs(float(advance.get('monto_aplicado') or 0) - monto_aplicado) > 0.01 or
+                abs(float(advance.get('saldo_disponible') or 0) - saldo_disponible) > 0.01):
+            diferencias_anticipos.append({
+                'id': advance['id'],
+                'monto_aplicado_mantenido': float(advance.get('monto_aplicado') or 0),
+                'monto_aplicado_real': monto_aplicado,
+                'saldo_disponible_mantenido': float(advance.get('saldo_disponible') or 0),
+                'saldo_disponible_real': saldo_disponible
+            })
+
+    ordenes_revisadas = 0
+    diferencias_ordenes = []
+    for po in iter_table(supabase, 'purchase_orders', 'id, total_anticipos'):
+        ordenes_revisadas += 1
+        total_real = round(anticipos_por_orden.get(po['id'], 0.0), 2)
+        if abs(float(po.get('total_anticipos') or 0) - total_real) > 0.01:
+            diferencias_ordenes.append({
+                'id': po['id'],
+                'total_anticipos_mantenido': float(po.get('total_anticipos') or 0),
+                'total_anticipos_real': total_real
+            })
+
+    if corregir:
+        for diff in diferencias_anticipos:
+            supabase.table('advance_payments').update({
+                'monto_aplicado': diff['monto_aplicado_real'],
+                'saldo_disponible': diff['saldo_disponible_real']
+            }).eq('id', diff['id']).execute()
+
+        for diff in diferencias_ordenes:
+            supabase.table('purchase_orders').update({
+                'total_anticipos': diff['total_anticipos_real']
+            }).eq('id', diff['id']).execute()
+        
+
+    return {
+        'anticipos_revisados': anticipos_revisados,
+        'ordenes_revisadas': ordenes_revisadas,
+        'diferencias_anticipos': diferencias_anticipos,
+        'diferencias_ordenes': diferencias_ordenes,
+        'corregido': corregir and bool(diferencias_anticipos or diferencias_ordenes)
+    }
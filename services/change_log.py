@@ -0,0 +1,133 @@
+# =============================================
+# services/change_log.py - Registro de cambios para sincronización
+# =============================================
+#
+# change_log lo escriben triggers de la base (migración 011) en la misma
+# transacción que cada cambio: (entidad, id, operación). Los cambios en
+# tablas de vínculo (shipment_supplier, invoice_po, aplicaciones, ...) se
+# registran como upsert del recurso padre.
+#
+# Los ids de change_log se asignan al insertar pero las transacciones
+# confirman en otro orden: un lector puede ver el id 105 antes de que se
+# confirme el 104. Por eso el cursor sólo avanza sobre las entradas con más
+# de CHANGES_SAFETY_SECONDS de antigüedad; las más nuevas se entregan igual y
+# se repiten en la consulta siguiente (aplicar un cambio dos veces no
+# altera el resultado).
+#
+# settled_version() usa el mismo criterio para la versión de datos de los
+# ETags (services/http_cache.py), común a todas las instancias.
+#
+# Las entradas con más de CHANGE_LOG_RETENTION_DAYS se purgan; un cursor
+# anterior a la entrada más antigua que queda lanza CursorTooOld y el
+# cliente debe volver a cargar todo.
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from settings_new import settings
+
+# Entidades que se publican en /api/changes (nombre de tabla)
+CHANGE_ENTITIES = (
+    'suppliers',
+    'purchase_orders',
+    'invoices',
+    'shipments',
+    'advance_payments',
+    'invoice_payment'
+)
+
+PURGE_INTERVAL = 3600
+
+
+class CursorTooOld(Exception):
+    """Las entradas posteriores al cursor ya fueron purgadas"""
+
+
+def _safe_before() -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=settings.changes_safety_seconds)).isoformat()
+
+
+def _is_safe(row: dict, safe_before: str) -> bool:
+    created_at = datetime.fromisoformat(row['created_at'].replace('Z', '+00:00'))
+    return created_at < datetime.fromisoformat(safe_before)
+
+
+def latest_cursor(supabase) -> int:
+    """Cursor desde el que leer después de una carga completa"""
+    latest = supabase.table('change_log').select('id').lt('created_at', _safe_before()).order('id', desc=True).limit(1).execute()
+    if latest.data:
+        return latest.data[0]['id']
+
+    # Sin entradas antiguas: todo lo que hay es reciente y se vuelve a leer
+    oldest = supabase.table('change_log').select('id').order('id').limit(1).execute()
+    return oldest.data[0]['id'] - 1 if oldest.data else 0
+
+
+def read_changes(
+    supabase,
+    since: int,
+    limit: int,
+    entities: Optional[Iterable[str]] = None
+) -> Tuple[List[dict], int, bool]:
+    """Entradas posteriores a since: (filas, cursor siguiente, quedan más)"""
+    oldest = supabase.table('change_log').select('id').order('id').limit(1).execute()
+    if oldest.data and since < oldest.data[0]['id'] - 1:
+        raise CursorTooOld()
+
+    safe_before = _safe_before()
+
+    # Se pide una fila extra para saber si quedan cambios
+    query = supabase.table('change_log').select('id, entidad, entidad_id, operacion, created_at').gt('id', since)
+    if entities is not None:
+        query = query.in_('entidad', sorted(entities))
+    rows = query.order('id').limit(limit + 1).execute().data
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # El cursor avanza sólo sobre el prefijo de entradas ya seguras
+    cursor = since
+    for row in rows:
+        if not _is_safe(row, safe_before):
+            break
+        cursor = row['id']
+
+    # Si el cursor se detuvo en una entrada reciente, lo que sigue también lo es
+    return rows, cursor, has_more and bool(rows) and cursor == rows[-1]['id']
+
+
+def settled_version(supabase) -> Optional[int]:
+    """Versión de datos compartida por todas las instancias: último id de change_log
+
+    None si la última entrada es reciente: una transacción con un id menor
+    podría no haber confirmado todavía y el id no cambiaría al hacerlo.
+    """
+    latest = supabase.table('change_log').select('id, created_at').order('id', desc=True).limit(1).execute()
+    if not latest.data:
+        return 0
+    if not _is_safe(latest.data[0], _safe_before()):
+        return None
+    return latest.data[0]['id']
+
+
+def purge_change_log(supabase) -> None:
+    """Eliminar las entradas más antiguas que CHANGE_LOG_RETENTION_DAYS"""
+    latest = supabase.table('change_log').select('id').order('id', desc=True).limit(1).execute()
+    if not latest.data:
+        return
+
+    # Se conserva siempre la última entrada: con el registro vacío no se
+    # distinguiría un cursor purgado de uno al día
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.change_log_retention_days)
+    supabase.table('change_log').delete().lt('created_at', cutoff.isoformat()).lt('id', latest.data[0]['id']).execute()
+
+
+async def purge_loop(supabase) -> None:
+    """Purga periódica (desde el lifespan de la aplicación)"""
+    while True:
+        try:
+            await asyncio.to_thread(purge_change_log, supabase)
+        except Exception as e:
+            print(f"⚠️ Error purgando change_log: {str(e)}")
+        await asyncio.sleep(PURGE_INTERVAL)
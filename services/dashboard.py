@@ -0,0 +1,63 @@
+# =============================================
+# services/dashboard.py - Estadísticas del dashboard
+# =============================================
+#
+# Cálculo compartido por GET /api/stats/dashboard y por el stream SSE
+# /api/stats/dashboard/stream (una sola ejecución para todos los suscriptores).
+
+from datetime import date
+
+from services.pagination import iter_table
+
+
+def compute_dashboard_stats(supabase) -> dict:
+    """Conteos y totales financieros del dashboard principal"""
+    # Conteos básicos
+    suppliers_count = supabase.table('suppliers').select("count", count="exact").execute().count
+    pos_count = supabase.table('purchase_orders').select("count", count="exact").execute().count
+    invoices_count = supabase.table('invoices').select("count", count="exact").execute().count
+    shipments_count = supabase.table('shipments').select("count", count="exact").execute().count
+    
+    # Estadísticas financieras
+    invoices_pendientes = supabase.table('invoices').select("count", count="exact").eq('estado', 'pendiente').execute().count
+    invoices_pagadas = supabase.table('invoices').select("count", count="exact").eq('estado', 'pagada_completa').execute().count
+    
+    # Totales de órdenes (recorrido por bloques, sin tope de filas)
+    total_pos_usd = sum(float(po.get('total_oc', 0)) for po in iter_table(supabase, 'purchase_orders', 'total_oc'))
+    
+    # Totales de facturas
+    total_facturas = 0
+    total_saldo_pendiente = 0
+    for inv in iter_table(supabase, 'invoices', 'monto_total, saldo_pendiente'):
+        total_facturas += float(inv.get('monto_total', 0))
+        total_saldo_pendiente += float(inv.get('saldo_pendiente', 0))
+    
+    return {
+        "conteos": {
+            "suppliers": suppliers_count,
+            "purchase_orders": pos_count,
+            "invoices": invoices_count,
+            "shipments": shipments_count
+        },
+        "financial": {
+            "invoices_pendientes": invoices_pendientes,
+            "invoices_pagadas": invoices_pagadas,
+            "total_pos_usd": round(total_pos_usd, 2),
+            "total_facturas": round(total_facturas, 2),
+            "saldo_pendiente": round(total_saldo_pendiente, 2)
+        }
+    }
+
+
+def compute_overdue_dues(supabase) -> dict:
+    """Vencimientos pendientes con fecha anterior a hoy, por id"""
+    hoy = date.today().isoformat()
+    return {
+        due['id']: due
+        for due in iter_table(
+            supabase,
+            'invoice_due',
+            'id, invoice_id, fecha_vencimiento, monto_vencimiento',
+            filters=lambda q: q.eq('estado', 'pendiente').lt('fecha_vencimiento', hoy)
+        )
+    }
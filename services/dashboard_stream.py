@@ -0,0 +1,179 @@
+# =============================================
+# services/dashboard_stream.py - Stream SSE del dashboard
+# =============================================
+#
+# Un único DashboardBroadcaster calcula el dashboard y reparte el resultado a
+# todos los clientes conectados. El cálculo se dispara tras las escrituras a
+# la API (listener de data_version, agrupando ráfagas) y periódicamente para
+# capturar cambios de fecha y escrituras de otras instancias. Sin suscriptores
+# la tarea termina y no se consulta la base de datos.
+#
+# Cada suscriptor tiene una cola acotada: si un cliente lento la llena se
+# descartan sus eventos pendientes y recibe el snapshot completo.
+
+import asyncio
+import json
+from typing import Optional, Set
+
+from database import get_supabase
+from services import data_version
+from services.dashboard import compute_dashboard_stats, compute_overdue_dues
+from settings_new import settings
+
+
+class DashboardBroadcaster:
+    def __init__(self, queue_size: int, debounce: float, tick: float, heartbeat: float):
+        self.queue_size = queue_size
+        self.debounce = debounce
+        self.tick = tick
+        self.heartbeat = heartbeat
+
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._stats: Optional[dict] = None
+        self._overdue: dict = {}
+        self._stale = True
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        data_version.add_listener(self._on_change)
+
+    def _on_change(self, version: int) -> None:
+        """Listener de escrituras: despierta la tarea si hay suscriptores"""
+        if not self._subscribers:
+            self._stale = True
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _compute(self):
+        supabase = get_supabase()
+        stats = compute_dashboard_stats(supabase)
+        overdue = compute_overdue_dues(supabase)
+        stats['vencidos'] = {
+            'cantidad': len(overdue),
+            'monto': round(sum(float(due.get('monto_vencimiento') or 0) for due in overdue.values()), 2)
+        }
+        return stats, overdue
+
+    async def _refresh(self) -> Optional[dict]:
+        """Recalcular el dashboard y devolver los cambios respecto al anterior"""
+        stats, overdue = await asyncio.to_thread(self._compute)
+        previous_stats, previous_overdue = self._stats or {}, self._overdue
+        self._stats, self._overdue = stats, overdue
+        self._seq += 1
+
+        cambios = {}
+        for section, values in stats.items():
+            previous_values = previous_stats.get(section, {})
+            changed = {key: value for key, value in values.items() if previous_values.get(key) != value}
+            if changed:
+                cambios[section] = changed
+
+        nuevos_vencidos = [due for due_id, due in overdue.items() if due_id not in previous_overdue]
+        vencidos_resueltos = [due_id for due_id in previous_overdue if due_id not in overdue]
+
+        if not (cambios or nuevos_vencidos or vencidos_resueltos):
+            return None
+
+        return {
+            'cambios': cambios,
+            'nuevos_vencidos': nuevos_vencidos,
+            'vencidos_resueltos': vencidos_resueltos
+        }
+
+    def _snapshot_event(self) -> tuple:
+        return ('snapshot', {
+            'data': self._stats,
+            'vencidos': list(self._overdue.values())
+        }, self._seq)
+
+    def _publish(self, event: tuple) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cliente lento: se reemplaza lo pendiente por el estado completo
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_event())
+
+    async def subscribe(self) -> asyncio.Queue:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Sin suscriptores el estado no se mantiene: se recalcula al volver
+            if self._stale:
+                await self._refresh()
+                self._stale = False
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(self._snapshot_event())
+        self._subscribers.add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        # El último cliente desconectado termina la tarea sin esperar el tick
+        if not self._subscribers and self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.tick)
+                # Agrupar ráfagas de escrituras en un solo cálculo
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+
+            if not self._subscribers:
+                break
+
+            self._wake.clear()
+            try:
+                async with self._lock:
+                    delta = await self._refresh()
+            except Exception as e:
+                print(f"⚠️ Error actualizando dashboard en vivo: {str(e)}")
+                continue
+
+            if delta:
+                self._publish(('delta', delta, self._seq))
+
+        self._stale = True
+
+    async def stream(self, request):
+        """Generador de eventos SSE para un cliente"""
+        queue = await self.subscribe()
+        try:
+            while True:
+                try:
+                    event, payload, seq = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comentario SSE para mantener viva la conexión
+                    yield ": ping\n\n"
+                    continue
+
+                data = json.dumps(payload, default=str, ensure_ascii=False)
+                yield f"event: {event}\nid: {seq}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+
+dashboard_broadcaster = DashboardBroadcaster(
+    queue_size=settings.dashboard_stream_queue_size,
+    debounce=settings.dashboard_stream_debounce,
+    tick=settings.dashboard_stream_tick,
+    heartbeat=settings.dashboard_stream_heartbeat
+)
@@ -0,0 +1,54 @@
+# =============================================
+# services/data_version.py - Versión de los datos del proceso
+# =============================================
+#
+# Contador que se incrementa con cada escritura exitosa a la API. Los ETags
+# de las respuestas GET se derivan de esta versión, por lo que mientras no
+# haya escrituras un cliente que repite la consulta recibe 304 sin que se
+# consulte la base de datos. Otros módulos pueden registrar listeners para
+# reaccionar a los cambios.
+
+import threading
+import time
+import uuid
+from typing import Callable, List
+
+_lock = threading.Lock()
+_instance_id = uuid.uuid4().hex[:8]
+_version = 0
+_updated_at = time.time()
+_listeners: List[Callable[[int], None]] = []
+
+
+def current() -> str:
+    """Versión actual como texto (incluye el id de esta instancia)"""
+    return f"{_instance_id}-{_version}"
+
+
+def updated_at() -> float:
+    """Momento (epoch) del último cambio registrado"""
+    return _updated_at
+
+
+def bump() -> int:
+    """Registrar un cambio en los datos y notificar a los listeners"""
+    global _version, _updated_at
+    with _lock:
+        _version += 1
+        _updated_at = time.time()
+        version = _version
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        try:
+            listener(version)
+        except Exception as e:
+            print(f"⚠️ Error en listener de versión de datos: {str(e)}")
+
+    return version
+
+
+def add_listener(listener: Callable[[int], None]) -> None:
+    """Registrar una función a llamar después de cada cambio"""
+    with _lock:
+        _listeners.append(listener)
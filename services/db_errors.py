@@ -0,0 +1,67 @@
+# =============================================
+# services/db_errors.py - Traducción de errores de la base de datos
+# =============================================
+#
+# Las restricciones de la base (UNIQUE, etc.) reemplazan las consultas de
+# verificación previas: la escritura se intenta directamente y el error de
+# PostgREST se traduce al HTTPException que antes generaba la verificación.
+# Las funciones RPC señalan sus errores con códigos SQLSTATE propios.
+
+import re
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+UNIQUE_VIOLATION = '23505'
+
+# Códigos que levantan las funciones RPC (RAISE EXCEPTION ... USING ERRCODE)
+RPC_ERROR_STATUS = {
+    'P0001': 400,  # regla de negocio (p. ej. dependencias que impiden eliminar)
+    'P0002': 404   # registro no encontrado
+}
+
+_CONSTRAINT_RE = re.compile(r'constraint "([^"]+)"')
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """Código SQLSTATE de un APIError de PostgREST (None si no aplica)"""
+    return getattr(error, 'code', None)
+
+
+def constraint_name(error: Exception) -> Optional[str]:
+    """Nombre de la restricción violada, tomado del mensaje de Postgres"""
+    match = _CONSTRAINT_RE.search(getattr(error, 'message', None) or str(error))
+    return match.group(1) if match else None
+
+
+@contextmanager
+def translate_unique_violation(messages: Dict[str, str]):
+    """Convertir violaciones de unicidad en HTTPException 400
+
+    `messages` asocia el nombre de la restricción al mensaje a devolver.
+    """
+    try:
+        yield
+    except HTTPException:
+        raise
+    except Exception as e:
+        if error_code(e) == UNIQUE_VIOLATION:
+            name = constraint_name(e)
+            if name in messages:
+                raise HTTPException(status_code=400, detail=messages[name])
+        raise
+
+
+@contextmanager
+def translate_rpc_errors():
+    """Convertir los errores P0001/P0002 de las funciones RPC en HTTPException"""
+    try:
+        yield
+    except HTTPException:
+        raise
+    except Exception as e:
+        status_code = RPC_ERROR_STATUS.get(error_code(e))
+        if status_code is not None:
+            raise HTTPException(status_code=status_code, detail=getattr(e, 'message', None) or str(e))
+        raise
@@ -0,0 +1,180 @@
+# =============================================
+# services/http_cache.py - ETags y compresión de respuestas
+# =============================================
+#
+# ConditionalGetMiddleware responde 304 a los GET de /api cuyo If-None-Match
+# coincide con la versión de datos vigente, sin ejecutar el endpoint. El ETag
+# combina ruta, query, la fecha (los reportes dependen del día) y la versión
+# compartida: el último id de change_log (services/change_log.settled_version),
+# que cambia con las escrituras de todas las instancias, así que todas emiten
+# el mismo ETag para los mismos datos. Se consulta como máximo una vez por
+# SHARED_VERSION_TTL. Mientras haya cambios recientes sin asentar no se
+# emiten ETags. Si la consulta falla, se vuelve a la versión local (escrituras
+# de este proceso) y a una ventana de tiempo que acota la antigüedad. Los streams SSE (Accept: text/event-stream)
+# quedan fuera de ambos middlewares: la compresión retendría los eventos en
+# el buffer del compresor. Las rutas en exclude (/api/jobs, cuyo estado
+# avanza sin escrituras, y /api/changes, cuyo resultado depende del cursor y
+# no de la versión) no llevan ETag ni incrementan la versión.
+
+import asyncio
+import hashlib
+import time
+from datetime import date
+from typing import Callable, Optional
+
+from starlette.middleware.gzip import GZipMiddleware
+
+from services import data_version
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli es opcional, se usa gzip
+    BrotliMiddleware = None
+
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Segundos que se reutiliza la versión compartida leída de la base
+SHARED_VERSION_TTL = 1.0
+
+# Sin versión compartida (hay cambios recientes sin asentar)
+UNSETTLED = object()
+
+
+def is_event_stream(scope) -> bool:
+    """La petición es de un cliente SSE (EventSource)"""
+    headers = dict(scope.get('headers') or [])
+    return b'text/event-stream' in headers.get(b'accept', b'')
+
+
+class CompressionMiddleware:
+    """Compresión brotli (si está instalado) o gzip, excepto para streams SSE"""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed_app = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed_app(scope, receive, send)
+
+
+def add_compression_middleware(app, minimum_size: int) -> None:
+    """Comprimir respuestas mayores a minimum_size"""
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+
+def build_etag(path: str, query_string: bytes, max_age: int, shared_version: Optional[int] = None) -> str:
+    """ETag débil para una ruta y la versión de datos actual"""
+    if shared_version is not None:
+        # Igual en todas las instancias: sin la versión local, que es propia de cada proceso
+        scope = f"v{shared_version}"
+    else:
+        # Sin versión compartida sólo una ventana de tiempo acota lo que no se ve desde este proceso
+        scope = f"{data_version.current()}|w{int(time.time() // max_age) if max_age > 0 else 0}"
+    raw = f"{path}?{query_string.decode('latin-1')}|{date.today().isoformat()}|{scope}"
+    return 'W/"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+class ConditionalGetMiddleware:
+    """Middleware ASGI de ETag / 304 para GET y de versión para escrituras"""
+
+    def __init__(self, app, prefix: str = '/api', max_age: int = 60, exclude: tuple = (),
+                 shared_version: Optional[Callable[[], Optional[int]]] = None):
+        self.app = app
+        self.prefix = prefix
+        self.max_age = max_age
+        # Rutas cuyo estado no depende de la versión de datos (ni la cambian)
+        self.exclude = tuple(exclude)
+        # Función síncrona que lee la versión compartida (None = cambios sin asentar)
+        self.shared_version = shared_version
+        self._shared = None
+        self._shared_at = 0.0
+
+    async def _current_shared_version(self):
+        """Versión compartida, UNSETTLED, o None si no está disponible"""
+        if self.shared_version is None:
+            return None
+        if time.monotonic() - self._shared_at > SHARED_VERSION_TTL:
+            try:
+                version = await asyncio.to_thread(self.shared_version)
+                self._shared = UNSETTLED if version is None else version
+            except Exception as e:
+                print(f"⚠️ Versión de datos compartida no disponible: {str(e)}")
+                self._shared = None
+            self._shared_at = time.monotonic()
+        return self._shared
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        if (scope['type'] != 'http' or not path.startswith(self.prefix) or is_event_stream(scope)
+                or path.startswith(self.exclude)):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+
+        if method in WRITE_METHODS:
+            await self._handle_write(scope, receive, send)
+        elif method == 'GET':
+            await self._handle_get(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _handle_get(self, scope, receive, send):
+        shared = await self._current_shared_version()
+        if shared is UNSETTLED:
+            await self.app(scope, receive, send)
+            return
+
+        # La ETag se calcula antes de leer los datos: si hay una escritura
+        # concurrente la versión cambia y el cliente volverá a descargar.
+        etag = build_etag(scope['path'], scope.get('query_string', b''), self.max_age, shared)
+        headers = dict(scope.get('headers') or [])
+        if_none_match = headers.get(b'if-none-match', b'').decode('latin-1')
+
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            await send({
+                'type': 'http.response.start',
+                'status': 304,
+                'headers': [
+                    (b'etag', etag.encode('latin-1')),
+                    (b'cache-control', b'no-cache')
+                ]
+            })
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        async def send_with_etag(message):
+            # Las respuestas que ya fijan Cache-Control (p. ej. copias stale) no llevan ETag
+            if message['type'] == 'http.response.start' and message['status'] == 200 and not any(
+                name.lower() == b'cache-control' for name, _ in message.get('headers', [])
+            ):
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'etag', etag.encode('latin-1')),
+                    (b'cache-control', b'no-cache')
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+    async def _handle_write(self, scope, receive, send):
+        status = {}
+
+        async def send_and_track(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_track)
+        finally:
+            # Ante la duda (errores 5xx) también se invalida
+            if status.get('code', 500) < 400 or status.get('code', 500) >= 500:
+                data_version.bump()
+                # La próxima lectura vuelve a consultar la versión compartida
+                self._shared_at = 0.0
@@ -0,0 +1,239 @@
+# =============================================
+# services/idempotency.py - Header Idempotency-Key en POST
+# =============================================
+#
+# Un POST con Idempotency-Key reclama la clave insertándola en la tabla
+# idempotency_keys (clave primaria: sólo una petición gana, aun con varias
+# instancias). Al terminar se guarda la respuesta y los reintentos con la
+# misma clave la reciben repetida sin volver a ejecutar el endpoint.
+#
+# - Duplicados concurrentes en el mismo proceso esperan con un lock por clave;
+#   entre instancias se espera a que la otra petición termine.
+# - La reclamación tiene un plazo (locked_until, IDEMPOTENCY_LEASE_SECONDS):
+#   si la instancia que la tomó murió sin guardar respuesta, vencido el plazo
+#   otra petición con la misma huella la toma en su lugar.
+# - La misma clave con otro cuerpo o ruta responde 422.
+# - Las respuestas 5xx no se guardan (la clave se libera para reintentar).
+# - Si el almacén no está disponible la petición se procesa igual.
+
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from database import get_supabase
+
+HEADER = b'idempotency-key'
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL = 3600
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI de idempotencia para POST bajo los prefijos indicados"""
+
+    def __init__(self, app, prefixes, ttl_hours: float = 24, wait_seconds: float = 10, lease_seconds: float = 120):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.ttl = timedelta(hours=ttl_hours)
+        self.wait_seconds = wait_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        self._last_purge = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not scope['path'].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get('headers') or [])
+        key = headers.get(HEADER, b'').decode('latin-1').strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        if len(key) > MAX_KEY_LENGTH:
+            await self._send_json(send, 400, {"detail": f"Idempotency-Key no puede superar {MAX_KEY_LENGTH} caracteres"})
+            return
+
+        # El cuerpo se lee completo para calcular la huella y luego se reenvía
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(
+            b'|'.join([scope['path'].encode(), scope.get('query_string', b''), body])
+        ).hexdigest()
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                await self._handle(scope, send, key, fingerprint, body)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                self._waiters.pop(key, None)
+                self._locks.pop(key, None)
+
+    async def _handle(self, scope, send, key: str, fingerprint: str, body: bytes):
+        try:
+            supabase = get_supabase()
+            self._purge_expired(supabase)
+            stored, locked_until = await self._claim(supabase, key, fingerprint)
+        except Exception as e:
+            print(f"⚠️ Almacén de idempotencia no disponible, se procesa sin clave: {str(e)}")
+            await self.app(scope, self._replay_body(body), send)
+            return
+
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                await self._send_json(send, 422, {"detail": "Idempotency-Key ya fue usada con otra petición"})
+            elif stored['estado'] != 'completado':
+                await self._send_json(
+                    send, 409,
+                    {"detail": "Hay una petición en curso con esta Idempotency-Key"},
+                    extra_headers=[(b'retry-after', b'1')]
+                )
+            else:
+                await self._send_stored(send, stored)
+            return
+
+        # Clave reclamada: ejecutar el endpoint capturando la respuesta
+        response = {'status': 500, 'headers': [], 'body': []}
+
+        async def send_and_capture(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = message.get('headers', [])
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, self._replay_body(body), send_and_capture)
+        finally:
+            self._store_response(supabase, key, locked_until, response)
+
+    async def _claim(self, supabase, key: str, fingerprint: str) -> Tuple[Optional[dict], Optional[str]]:
+        """Reclamar la clave: (registro existente si ya estaba tomada, plazo de la reclamación propia)"""
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            locked_until = (now + self.lease).isoformat()
+            try:
+                supabase.table('idempotency_keys').insert({
+                    'key': key,
+                    'fingerprint': fingerprint,
+                    'estado': 'en_proceso',
+                    'locked_until': locked_until,
+                    'expires_at': (now + self.ttl).isoformat()
+                }).execute()
+                return None, locked_until
+            except Exception as e:
+                if getattr(e, 'code', None) != '23505':
+                    raise
+
+            existing = supabase.table('idempotency_keys').select('*').eq('key', key).execute().data
+            if not existing:
+                # Liberada entre el insert y la lectura: reintentar
+                continue
+
+            stored = existing[0]
+            expires_at = datetime.fromisoformat(stored['expires_at'].replace('Z', '+00:00'))
+            if expires_at <= now:
+                supabase.table('idempotency_keys').delete().eq('key', key).eq('expires_at', stored['expires_at']).execute()
+                continue
+
+            if stored['estado'] != 'completado' and stored['fingerprint'] == fingerprint:
+                # Plazo vencido: la petición que la reclamó no terminó; se toma
+                # la clave sólo si nadie la renovó entretanto
+                if datetime.fromisoformat(stored['locked_until'].replace('Z', '+00:00')) <= now:
+                    taken = supabase.table('idempotency_keys').update({'locked_until': locked_until}).eq(
+                        'key', key
+                    ).eq('estado', 'en_proceso').eq('locked_until', stored['locked_until']).execute().data
+                    if taken:
+                        return None, locked_until
+                    continue
+
+                # Otra instancia la está procesando: esperar su resultado
+                if time.monotonic() < deadline:
+                    await asyncio.sleep(0.25)
+                    continue
+
+            return stored, None
+
+    def _store_response(self, supabase, key: str, locked_until: str, response: dict) -> None:
+        # Filtrar por el plazo propio: si otra petición tomó la clave por
+        # vencimiento, esta respuesta tardía no la pisa
+        try:
+            if response['status'] >= 500:
+                supabase.table('idempotency_keys').delete().eq('key', key).eq('locked_until', locked_until).execute()
+                return
+
+            content_type = dict(response['headers']).get(b'content-type', b'application/json')
+            supabase.table('idempotency_keys').update({
+                'estado': 'completado',
+                'status_code': response['status'],
+                'response_body': b''.join(response['body']).decode('utf-8'),
+                'content_type': content_type.decode('latin-1')
+            }).eq('key', key).eq('locked_until', locked_until).execute()
+        except Exception as e:
+            print(f"⚠️ Error guardando respuesta idempotente ({key}): {str(e)}")
+
+    def _purge_expired(self, supabase) -> None:
+        """Eliminar claves vencidas (como máximo una vez por hora por proceso)"""
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        supabase.table('idempotency_keys').delete().lt('expires_at', datetime.now(timezone.utc).isoformat()).execute()
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes):
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Tras el cuerpo sólo queda esperar la desconexión
+            await asyncio.Event().wait()
+
+        return receive
+
+    @staticmethod
+    async def _send_stored(send, stored: dict) -> None:
+        body = (stored.get('response_body') or '').encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': stored['status_code'],
+            'headers': [
+                (b'content-type', (stored.get('content_type') or 'application/json').encode('latin-1')),
+                (b'content-length', str(len(body)).encode()),
+                (b'idempotent-replayed', b'true')
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _send_json(send, status: int, content: dict, extra_headers=None) -> None:
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode())
+            ] + (extra_headers or [])
+        })
+        await send({'type': 'http.response.body', 'body': body})
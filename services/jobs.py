@@ -0,0 +1,267 @@
+# =============================================
+# services/jobs.py - Cola local de trabajos en segundo plano
+# =============================================
+#
+# Reportes y exportaciones que no caben en el timeout de una solicitud se
+# encolan con POST /api/jobs y se ejecutan fuera de la solicitud:
+# - cola asyncio en memoria, sin servicios externos, con tope de trabajos
+#   pendientes (JOBS_MAX_QUEUED)
+# - JOBS_WORKERS tareas consumidoras; cada trabajo corre en un hilo para no
+#   bloquear el event loop con las llamadas síncronas a Supabase
+# - el trabajo informa su avance con progress(fracción, mensaje), que también
+#   permite cancelarlo; además la cancelación se revisa antes de cada bloque
+#   leído con iter_table / iter_sorted / load_children (chunk_hook), así un
+#   reporte que no informa avance también se detiene a mitad de camino
+# - el resultado (JSON o CSV) se guarda en JOBS_RESULT_DIR y se elimina junto
+#   con el trabajo al cumplirse JOBS_RESULT_TTL_HOURS
+#
+# Los trabajos viven en la memoria del proceso: un reinicio los descarta.
+
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from services.metrics import metrics
+from services.pagination import chunk_hook
+from settings_new import settings
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pendiente', 'en_proceso', 'completado', 'fallido', 'cancelado'
+
+metrics.describe('jobs_total', 'counter', 'Trabajos terminados por tipo y estado')
+metrics.describe('jobs_queued', 'gauge', 'Trabajos esperando en la cola')
+metrics.describe('jobs_running', 'gauge', 'Trabajos en ejecución')
+metrics.describe('jobs_seconds_sum', 'counter', 'Tiempo acumulado de ejecución de trabajos por tipo')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobType:
+    """Tipo de trabajo: función run(params, progress) y formato del resultado (json o csv)
+
+    Para csv, run devuelve {'columnas': [...], 'filas': iterable de listas};
+    un generador se consume al escribir el archivo (sin tener todas las filas
+    en memoria) y puede seguir llamando a progress.
+    validate(params) revisa los parámetros al encolar y lanza HTTPException(400).
+    """
+
+    def __init__(self, run: Callable, formato: str = 'json', validate: Optional[Callable] = None, descripcion: str = ''):
+        self.run = run
+        self.formato = formato
+        self.validate = validate
+        self.descripcion = descripcion
+
+
+class Job:
+    def __init__(self, tipo: str, params: dict):
+        self.id = str(uuid.uuid4())
+        self.tipo = tipo
+        self.params = params
+        self.estado = PENDING
+        self.progreso = 0.0
+        self.mensaje: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[datetime] = None
+        self.result_path: Optional[str] = None
+        self.cancel_requested = False
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'params': self.params,
+            'estado': self.estado,
+            'progreso': round(self.progreso, 3),
+            'mensaje': self.mensaje,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'resultado_disponible': self.estado == DONE and self.result_path is not None
+        }
+
+
+class JobManager:
+    def __init__(self, workers: int, max_queued: int, result_ttl_hours: float, result_dir: str):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = timedelta(hours=result_ttl_hours)
+        self.result_dir = result_dir
+        self.types: Dict[str, JobType] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        metrics.add_collector(lambda: [
+            ('jobs_queued', {}, sum(1 for job in self.jobs.values() if job.estado == PENDING)),
+            ('jobs_running', {}, sum(1 for job in self.jobs.values() if job.estado == RUNNING))
+        ])
+
+    def register(self, tipo: str, job_type: JobType) -> None:
+        self.types[tipo] = job_type
+
+    # ---------- ciclo de vida ----------
+
+    def start(self) -> None:
+        """Iniciar consumidores y limpieza (desde el lifespan de la aplicación)"""
+        os.makedirs(self.result_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    # ---------- operaciones ----------
+
+    def submit(self, tipo: str, params: dict) -> Job:
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="La cola de trabajos no está iniciada")
+
+        job_type = self.types.get(tipo)
+        if job_type is None:
+            raise HTTPException(status_code=400, detail=f"Tipo de trabajo no válido: {tipo}. Permitidos: {', '.join(sorted(self.types))}")
+
+        if job_type.validate:
+            job_type.validate(params)
+
+        pending = sum(1 for job in self.jobs.values() if job.estado == PENDING)
+        if pending >= self.max_queued:
+            raise HTTPException(status_code=503, detail="Hay demasiados trabajos en cola", headers={'Retry-After': '30'})
+
+        job = Job(tipo, params)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancelar un trabajo pendiente o en curso, o descartar uno terminado"""
+        job = self.get(job_id)
+        if job.estado == PENDING:
+            self._finish(job, CANCELLED)
+        elif job.estado == RUNNING:
+            job.cancel_requested = True
+        else:
+            self._remove(job)
+        return job
+
+    def result_media_type(self, job: Job) -> str:
+        return 'text/csv' if self.types[job.tipo].formato == 'csv' else 'application/json'
+
+    # ---------- ejecución ----------
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.estado != PENDING:
+                continue
+            job.estado = RUNNING
+            job.started_at = datetime.utcnow()
+            await asyncio.to_thread(self._execute, job)
+
+    def _execute(self, job: Job) -> None:
+        job_type = self.types[job.tipo]
+
+        def progress(fraction: float, mensaje: Optional[str] = None) -> None:
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.progreso = max(0.0, min(1.0, fraction))
+            if mensaje:
+                job.mensaje = mensaje
+
+        # El contexto del hilo se copia a asyncio.run y a los hilos que abra el trabajo
+        hook_token = chunk_hook.set(lambda: progress(job.progreso))
+        started = time.monotonic()
+        try:
+            result = job_type.run(job.params, progress)
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.result_path = self._write_result(job, job_type.formato, result)
+            job.progreso = 1.0
+            self._finish(job, DONE)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            # Los endpoints de reportes convierten JobCancelled en HTTPException 500
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+            else:
+                job.error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+                self._finish(job, FAILED)
+        finally:
+            chunk_hook.reset(hook_token)
+        metrics.inc('jobs_seconds_sum', {'tipo': job.tipo}, time.monotonic() - started)
+
+    def _write_result(self, job: Job, formato: str, result) -> str:
+        path = os.path.join(self.result_dir, f"{job.id}.{formato}")
+        if formato == 'csv':
+            try:
+                with open(path, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(result['columnas'])
+                    writer.writerows(result['filas'])
+            except BaseException:
+                # Cancelado o fallido a mitad de la escritura: no queda un archivo parcial
+                os.remove(path)
+                raise
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, default=str, ensure_ascii=False)
+        return path
+
+    def _finish(self, job: Job, estado: str) -> None:
+        job.estado = estado
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + self.result_ttl
+        metrics.inc('jobs_total', {'tipo': job.tipo, 'estado': estado})
+
+    # ---------- expiración ----------
+
+    def _remove(self, job: Job) -> None:
+        self.jobs.pop(job.id, None)
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+
+    def purge_expired(self) -> int:
+        now = datetime.utcnow()
+        expired = [job for job in self.jobs.values() if job.expires_at and job.expires_at <= now]
+        for job in expired:
+            self._remove(job)
+        return len(expired)
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(300)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"⚠️ Error limpiando trabajos expirados: {str(e)}")
+
+
+job_manager = JobManager(
+    workers=settings.jobs_workers,
+    max_queued=settings.jobs_max_queued,
+    result_ttl_hours=settings.jobs_result_ttl_hours,
+    result_dir=settings.jobs_result_dir or os.path.join(tempfile.gettempdir(), 'sgf_jobs')
+)
@@ -0,0 +1,226 @@
+# =============================================
+# services/kernels.py - Cálculo de reportes en un pool de procesos
+# =============================================
+#
+# Una vez cargados los datos, agregar cientos de miles de filas en Python
+# dentro del event loop congela el worker. Los reportes separan:
+# - la carga (consultas a Supabase, en el handler como siempre)
+# - un kernel puro que agrega columnas y se ejecuta con run_kernel() en un
+#   ProcessPoolExecutor, dejando libre el event loop y usando varios núcleos
+#
+# Los kernels reciben columnas (array('d') para montos, códigos enteros
+# array('i') para categorías) en vez de listas de dicts: se serializan como
+# bloques de bytes y el envío al proceso cuesta poco; los kernels
+# operan sobre ellas con numpy. Con pocas filas (menos de KERNEL_MIN_ROWS)
+# o KERNEL_WORKERS=0 se ejecutan en un hilo.
+#
+# Este módulo no importa settings a nivel de módulo: los procesos del pool
+# lo importan para resolver los kernels.
+
+import asyncio
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    from settings_new import settings
+
+    if settings.kernel_workers <= 0:
+        return None
+    if _pool is None:
+        # spawn: el proceso principal tiene hilos (httpx, trabajos) y fork no es seguro
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.kernel_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def warm_pool() -> None:
+    """Iniciar los procesos del pool al arrancar (importar numpy en cada uno tarda segundos)"""
+    pool = _get_pool()
+    if pool is not None:
+        from settings_new import settings
+        for _ in range(settings.kernel_workers):
+            pool.submit(int)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_kernel(kernel: Callable, *args, rows: int = 0):
+    """Ejecutar un kernel fuera del event loop (pool de procesos o hilo según el tamaño)"""
+    from settings_new import settings
+
+    pool = _get_pool() if rows >= settings.kernel_min_rows else None
+    if pool is None:
+        return await asyncio.to_thread(kernel, *args)
+    return await asyncio.get_running_loop().run_in_executor(pool, kernel, *args)
+
+
+# =============================================
+# COLUMNAS
+# =============================================
+
+class CategoryColumn:
+    """Columna de categorías codificada como enteros (diccionario + códigos)"""
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self.codes = array('i')
+        self._index: Dict[str, int] = {}
+
+    def append(self, value) -> None:
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.labels)
+            self.labels.append(value)
+        self.codes.append(code)
+
+
+def float_column(values: Iterable) -> array:
+    return array('d', (float(value or 0) for value in values))
+
+
+# =============================================
+# KERNELS
+# =============================================
+
+def _group_sum(codes: array, values: array, groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cantidad y suma por código; los códigos -1 (sin categoría) no cuentan"""
+    codes = np.frombuffer(codes, dtype=np.int32)
+    values = np.frombuffer(values, dtype=np.float64)
+    valido = codes >= 0
+    counts = np.bincount(codes[valido], minlength=groups)
+    # astype: sin filas bincount devuelve enteros aunque lleve pesos
+    sums = np.bincount(codes[valido], weights=values[valido], minlength=groups).astype(np.float64)
+    return counts, sums
+
+
+def payments_stats_kernel(montos: array, metodo_codes: array, metodo_labels: List[str],
+                          mes_codes: array, mes_labels: List[str]) -> dict:
+    """Totales de pagos, por método y por mes"""
+    por_metodo_cant, por_metodo_monto = _group_sum(metodo_codes, montos, len(metodo_labels))
+    por_mes_cant, por_mes_monto = _group_sum(mes_codes, montos, len(mes_labels))
+
+    por_metodo_cant, por_metodo_monto = por_metodo_cant.tolist(), por_metodo_monto.round(2).tolist()
+    por_mes_cant, por_mes_monto = por_mes_cant.tolist(), por_mes_monto.round(2).tolist()
+
+    return {
+        'totales': {
+            'cantidad_pagos': len(montos),
+            'monto_total': round(float(np.frombuffer(montos, dtype=np.float64).sum()), 2)
+        },
+        'por_metodo': {
+            label: {'cantidad': por_metodo_cant[i], 'monto': por_metodo_monto[i]}
+            for i, label in enumerate(metodo_labels)
+        },
+        'por_mes': {
+            label: {'cantidad': por_mes_cant[i], 'monto': por_mes_monto[i]}
+            for i, label in enumerate(mes_labels)
+        }
+    }
+
+
+def reconciliation_kernel(po_totales: array, link_po: array, link_monto: array, link_saldo: array,
+                          adv_po: array, adv_aplicado: array, adv_disponible: array) -> dict:
+    """Agregados por orden para la conciliación OC vs facturas vs anticipos
+
+    link_* son los vínculos factura-orden y adv_* los anticipos; *_po es el
+    índice de la orden en po_totales (adv_disponible ya viene en 0 para los
+    anticipos que no están disponibles). Devuelve una columna por agregado y
+    el estado de conciliación de cada orden.
+    """
+    n = len(po_totales)
+    facturas_cant, facturas_total = _group_sum(link_po, link_monto, n)
+    _, saldo_pendiente = _group_sum(link_po, link_saldo, n)
+    _, aplicados = _group_sum(adv_po, adv_aplicado, n)
+    _, disponibles = _group_sum(adv_po, adv_disponible, n)
+
+    balance = np.frombuffer(po_totales, dtype=np.float64) - facturas_total
+    con_saldo = saldo_pendiente > 0
+    cobertura = np.divide(disponibles * 100, saldo_pendiente, out=np.zeros(n), where=con_saldo)
+
+    # Mismo orden de prioridad que el reporte: facturación, pago, parcial, completa
+    estados = np.select(
+        [np.abs(balance) > 0.01, con_saldo & (disponibles == 0), con_saldo],
+        ['pendiente_facturacion', 'pendiente_pago', 'parcial'],
+        default='completa'
+    )
+
+    return {
+        'facturas_cantidad': facturas_cant.tolist(),
+        'facturas_total': facturas_total.tolist(),
+        'saldo_pendiente': saldo_pendiente.tolist(),
+        'anticipos_aplicados': aplicados.tolist(),
+        'anticipos_disponibles': disponibles.tolist(),
+        'balance': balance.tolist(),
+        'cobertura': cobertura.tolist(),
+        'estado': estados.tolist()
+    }
+
+
+# Tramos de antigüedad: (clave, días vencidos desde, hasta)
+AGING_BUCKETS = (
+    ('corriente', None, 0),
+    ('1_30', 1, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('mas_90', 91, None)
+)
+
+
+def aging_kernel(fechas: List[str], saldos: array, proveedor_codes: array, n_proveedores: int,
+                 moneda_codes: array, n_monedas: int, fecha_corte: str) -> dict:
+    """Antigüedad de saldos por proveedor y moneda con operaciones vectorizadas
+
+    fechas son los vencimientos en texto ISO (YYYY-MM-DD). Devuelve matrices
+    [proveedor * n_monedas + moneda][tramo] con montos y cantidades, y los
+    días promedio ponderados de atraso por grupo.
+    """
+    n_buckets = len(AGING_BUCKETS)
+    groups = n_proveedores * n_monedas
+    if not fechas:
+        return {'montos': [], 'cantidades': [], 'dias_ponderados': []}
+
+    # Filas sin proveedor o sin moneda (código -1, como en _group_sum) no tienen grupo
+    proveedor = np.frombuffer(proveedor_codes, dtype=np.int32).astype(np.int64)
+    moneda = np.frombuffer(moneda_codes, dtype=np.int32).astype(np.int64)
+    valido = (proveedor >= 0) & (moneda >= 0)
+
+    vencimientos = np.array(fechas, dtype='datetime64[D]')[valido]
+    dias_vencidos = (np.datetime64(fecha_corte, 'D') - vencimientos).astype(np.int64)
+    montos = np.frombuffer(saldos, dtype=np.float64)[valido]
+
+    # Tramo de cada vencimiento: 0 = corriente (no vencido), luego 1-30, 31-60, 61-90, 90+
+    limites = np.array([bucket[1] for bucket in AGING_BUCKETS[1:]], dtype=np.int64)
+    tramo = np.searchsorted(limites, dias_vencidos, side='right')
+
+    grupo = proveedor[valido] * n_monedas + moneda[valido]
+    celda = grupo * n_buckets + tramo
+
+    por_celda = np.bincount(celda, weights=montos, minlength=groups * n_buckets).reshape(groups, n_buckets)
+    cantidades = np.bincount(celda, minlength=groups * n_buckets).reshape(groups, n_buckets)
+
+    # Atraso promedio ponderado por saldo (sólo la parte vencida)
+    atraso = np.bincount(grupo, weights=montos * np.maximum(dias_vencidos, 0), minlength=groups)
+
+    return {
+        'montos': por_celda.round(2).tolist(),
+        'cantidades': cantidades.tolist(),
+        'dias_ponderados': atraso.tolist()
+    }
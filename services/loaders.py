@@ -0,0 +1,71 @@
+# =============================================
+# services/loaders.py - Carga agrupada de registros hijos
+# =============================================
+#
+# Evita el patrón N+1 (una consulta por cada padre) resolviendo los hijos de
+# todos los padres con una consulta `in_` por lote. Cada lote se recorre con
+# iter_table: 200 padres pueden tener más hijos que el max-rows de PostgREST.
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+
+from services.pagination import iter_table
+
+# Límite de ids por consulta para no exceder el largo de URL de PostgREST
+IN_CHUNK_SIZE = 200
+
+
+def load_children(
+    supabase,
+    table: str,
+    foreign_key: str,
+    parent_ids: Iterable[str],
+    columns: str = '*',
+    filters: Optional[Dict[str, str]] = None
+) -> Dict[str, List[dict]]:
+    """Obtener los hijos de varios padres agrupados por la clave foránea"""
+    parent_ids = list(dict.fromkeys(str(pid) for pid in parent_ids))
+    grouped = {pid: [] for pid in parent_ids}
+
+    if not parent_ids:
+        return grouped
+
+    # La clave foránea debe venir en el resultado para poder agrupar
+    selected = [c.strip() for c in columns.split(',')]
+    if '*' not in selected and foreign_key not in selected:
+        columns = f"{foreign_key}, {columns}"
+
+    def chunk_filters(chunk):
+        def apply(query):
+            query = query.in_(foreign_key, chunk)
+            for column, value in (filters or {}).items():
+                query = query.eq(column, value)
+            return query
+        return apply
+
+    rows_by_parent = defaultdict(list)
+    for start in range(0, len(parent_ids), IN_CHUNK_SIZE):
+        chunk = parent_ids[start:start + IN_CHUNK_SIZE]
+        for row in iter_table(supabase, table, columns, filters=chunk_filters(chunk)):
+            rows_by_parent[row[foreign_key]].append(row)
+
+    grouped.update(rows_by_parent)
+    return grouped
+
+
+def parse_include(include: Optional[str], allowed: Set[str]) -> Set[str]:
+    """Interpretar el parámetro include= (lista separada por comas)"""
+    if not include:
+        return set()
+
+    requested = {item.strip() for item in include.split(',') if item.strip()}
+    invalid = requested - allowed
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Valores de include no válidos: {', '.join(sorted(invalid))}. Permitidos: {', '.join(sorted(allowed))}"
+        )
+
+    return requested
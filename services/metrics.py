@@ -0,0 +1,70 @@
+# =============================================
+# services/metrics.py - Métricas del proceso (formato Prometheus)
+# =============================================
+#
+# Registro mínimo de contadores y gauges en memoria, expuesto en /metrics
+# con el formato de texto de Prometheus. Los valores que se calculan al
+# momento (estado del circuit breaker, ocupación de colas) se registran como
+# collectors: funciones que devuelven (nombre, labels, valor) al renderizar.
+
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Labels], float] = {}
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Registrar tipo (counter/gauge) y descripción de una métrica"""
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._values[(name, _labels(labels))] = value
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]) -> None:
+        """Función que entrega valores calculados al momento de renderizar"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Texto en formato de exposición de Prometheus"""
+        with self._lock:
+            values = dict(self._values)
+
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    values[(name, _labels(labels))] = value
+            except Exception as e:
+                print(f"⚠️ Error en collector de métricas: {str(e)}")
+
+        lines = []
+        for name in sorted({name for name, _ in values}):
+            kind, help_text = self._meta.get(name, ('gauge', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(values.items()):
+                if metric != name:
+                    continue
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
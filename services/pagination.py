@@ -0,0 +1,116 @@
+# =============================================
+# services/pagination.py - Recorrido de tablas completas por bloques
+# =============================================
+#
+# PostgREST limita cada respuesta al max-rows del servidor (1000 en Supabase),
+# por lo que un select() sin rango devuelve totales incompletos en tablas
+# grandes. iter_table() recorre la tabla en bloques ordenados por clave
+# (keyset: "clave > última vista"), entregando filas una a una sin cargar
+# la tabla completa en memoria.
+#
+# El recorrido termina sólo con un bloque vacío: si el max-rows del servidor
+# es menor que chunk_size, un bloque incompleto no significa que se llegó al
+# final (cuesta una consulta extra al terminar).
+#
+# Antes de pedir cada bloque se llama a chunk_hook si está definido en el
+# contexto: los trabajos en segundo plano lo usan para atender una
+# cancelación en medio de un recorrido largo (services/jobs.py).
+
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+# No debe superar el max-rows configurado en PostgREST
+DEFAULT_CHUNK_SIZE = 1000
+
+chunk_hook: ContextVar[Optional[Callable[[], None]]] = ContextVar('chunk_hook', default=None)
+
+
+def before_chunk() -> None:
+    """Invocar chunk_hook del contexto actual (puede lanzar JobCancelled)"""
+    hook = chunk_hook.get()
+    if hook is not None:
+        hook()
+
+
+def iter_table(
+    supabase,
+    table: str,
+    columns: str = '*',
+    filters: Optional[Callable] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    key: str = 'id'
+) -> Iterator[dict]:
+    """Generador que recorre todas las filas de una tabla en bloques por clave
+
+    `filters` recibe la query y devuelve la query con los filtros aplicados,
+    por ejemplo: lambda q: q.eq('estado', 'pendiente')
+    """
+    # La clave debe venir en el resultado para continuar desde la última fila
+    selected = [c.strip() for c in columns.split(',')]
+    if '*' not in selected and key not in selected:
+        columns = f"{key}, {columns}"
+
+    last_key = None
+    while True:
+        before_chunk()
+        query = supabase.table(table).select(columns)
+
+        if filters is not None:
+            query = filters(query)
+
+        if last_key is not None:
+            query = query.gt(key, last_key)
+
+        rows = query.order(key).limit(chunk_size).execute().data
+
+        if not rows:
+            break
+
+        yield from rows
+
+        last_key = rows[-1][key]
+
+
+def iter_sorted(
+    supabase,
+    table: str,
+    columns: str,
+    sort_key: str,
+    filters: Optional[Callable] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    key: str = 'id'
+) -> Iterator[dict]:
+    """Como iter_table, pero en orden por sort_key (fecha, por ejemplo) y luego por clave
+
+    El bloque siguiente continúa después de la última fila vista con
+    "(sort_key, clave) > (último valor, última clave)", así el orden es
+    estable aunque muchas filas compartan el mismo valor de sort_key.
+    Las filas con sort_key nulo se omiten.
+    """
+    required = [c.strip() for c in columns.split(',')]
+    for column in (sort_key, key):
+        if columns.strip() != '*' and column not in required:
+            columns = f"{column}, {columns}"
+
+    last = None
+    while True:
+        before_chunk()
+        query = supabase.table(table).select(columns).not_.is_(sort_key, 'null')
+
+        if filters is not None:
+            query = filters(query)
+
+        if last is not None:
+            last_sort, last_key = last
+            query = query.or_(
+                f'{sort_key}.gt."{last_sort}",and({sort_key}.eq."{last_sort}",{key}.gt."{last_key}")'
+            )
+
+        rows = query.order(sort_key).order(key).limit(chunk_size).execute().data
+
+        if not rows:
+            break
+
+        yield from rows
+
+        last = (rows[-1][sort_key], rows[-1][key])
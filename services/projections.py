@@ -0,0 +1,76 @@
+# =============================================
+# services/projections.py - Columnas seleccionables por recurso
+# =============================================
+#
+# El parámetro fields= de los endpoints se traduce a la lista de columnas
+# del select de PostgREST, validada contra una lista blanca por recurso.
+# Los listados usan por defecto una proyección reducida con las columnas que
+# muestran las tablas del frontend; el detalle mantiene todas las columnas.
+
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+
+RESOURCE_FIELDS = {
+    'suppliers': [
+        'id', 'nombre', 'activo', 'puerto_salida_default', 'contacto', 'notas',
+        'created_at', 'updated_at'
+    ],
+    'purchase_orders': [
+        'id', 'supplier_id', 'numero_orden', 'moneda', 'total_oc', 'total_anticipos',
+        'fecha', 'estado', 'notas', 'created_at', 'updated_at'
+    ],
+    'invoices': [
+        'id', 'supplier_id', 'numero_factura', 'fecha_emision', 'moneda', 'monto_total',
+        'saldo_pendiente', 'estado', 'tipo_factura', 'concepto', 'notas',
+        'created_at', 'updated_at'
+    ],
+    'advance_payments': [
+        'id', 'po_id', 'monto', 'moneda', 'fecha_pago', 'metodo_pago', 'usuario_pago',
+        'estado', 'monto_aplicado', 'saldo_disponible', 'notas', 'created_at'
+    ],
+    'shipments': [
+        'id', 'codigo', 'puerto_origen', 'puerto_destino', 'fecha_embarque',
+        'fecha_llegada_estimada', 'fecha_llegada_real', 'estado', 'naviera',
+        'numero_contenedor', 'notas', 'created_at', 'updated_at'
+    ],
+    'invoice_payment': [
+        'id', 'invoice_id', 'monto_pagado', 'fecha', 'metodo_pago', 'referencia',
+        'notas', 'created_at'
+    ]
+}
+
+# Proyecciones por defecto de los listados
+LIST_FIELDS = {
+    'suppliers': 'id, nombre, activo, puerto_salida_default, contacto, created_at',
+    'purchase_orders': 'id, supplier_id, numero_orden, moneda, total_oc, total_anticipos, fecha, estado, created_at',
+    'invoices': 'id, supplier_id, numero_factura, fecha_emision, moneda, monto_total, saldo_pendiente, estado, tipo_factura, created_at',
+    'advance_payments': 'id, po_id, monto, moneda, fecha_pago, metodo_pago, estado, monto_aplicado, saldo_disponible, created_at',
+    'shipments': 'id, codigo, puerto_origen, puerto_destino, fecha_embarque, fecha_llegada_estimada, fecha_llegada_real, estado, naviera, numero_contenedor, created_at',
+    'invoice_payment': 'id, invoice_id, monto_pagado, fecha, metodo_pago, referencia, created_at'
+}
+
+
+def select_columns(
+    resource: str,
+    fields: Optional[str],
+    default: str = '*',
+    required: Iterable[str] = ('id',)
+) -> str:
+    """Traducir fields= a la lista de columnas del select, validando la lista blanca"""
+    if not fields:
+        return default
+
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    allowed = RESOURCE_FIELDS[resource]
+
+    invalid = [field for field in requested if field not in allowed]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no válidos: {', '.join(invalid)}. Permitidos: {', '.join(allowed)}"
+        )
+
+    # Las columnas requeridas (ids para vínculos y detalle) siempre se incluyen
+    columns = list(dict.fromkeys([*required, *requested]))
+    return ', '.join(columns)
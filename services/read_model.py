@@ -0,0 +1,265 @@
+# =============================================
+# services/read_model.py - Réplica local de lectura (SQLite en memoria)
+# =============================================
+#
+# Copia en proceso de las tablas de la Fase 1 para que los listados se
+# respondan sin ir a Supabase. Se hidrata completa al iniciar la aplicación
+# y se mantiene al día leyendo change_log: cada entidad modificada se recarga
+# junto con sus tablas hijas (los cambios de vínculos y vencimientos se
+# registran como upsert del padre). Las escrituras de este proceso
+# (data_version) despiertan la sincronización de inmediato.
+#
+# Las filas se guardan como JSON y se filtran con json_extract, por lo que
+# el esquema no se duplica aquí. Un endpoint sólo debe leer de la réplica si
+# is_fresh(): hidratada, sincronizada después de la última escritura local y
+# con antigüedad menor a READ_MODEL_MAX_STALENESS.
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services import data_version
+from services.change_log import CursorTooOld, latest_cursor, read_changes
+from services.loaders import load_children
+from services.pagination import iter_table
+from settings_new import settings
+
+# Tablas replicadas y sus claves foráneas indexadas
+READ_MODEL_TABLES = {
+    'suppliers': (),
+    'purchase_orders': ('supplier_id',),
+    'invoices': ('supplier_id',),
+    'invoice_due': ('invoice_id',),
+    'shipments': (),
+    'shipment_supplier': ('shipment_id', 'supplier_id'),
+    'shipment_invoice': ('shipment_id', 'invoice_id'),
+    'invoice_po': ('invoice_id', 'po_id')
+}
+
+# Tablas hijas que se recargan junto a cada entidad de change_log
+CHILD_TABLES = {
+    'suppliers': (),
+    'purchase_orders': (('invoice_po', 'po_id'),),
+    'invoices': (('invoice_due', 'invoice_id'), ('invoice_po', 'invoice_id'), ('shipment_invoice', 'invoice_id')),
+    'shipments': (('shipment_supplier', 'shipment_id'), ('shipment_invoice', 'shipment_id'))
+}
+
+# Entradas de change_log leídas por vuelta
+SYNC_BATCH_SIZE = 1000
+
+
+def project(row: dict, columns: str) -> dict:
+    """Aplicar una lista de columnas de select() a una fila completa"""
+    if columns.strip() == '*':
+        return dict(row)
+    return {column.strip(): row.get(column.strip()) for column in columns.split(',') if column.strip()}
+
+
+class ReadModel:
+    def __init__(self, poll_seconds: float, max_staleness: float):
+        self.poll_seconds = poll_seconds
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cursor = 0
+        self._synced_at: Optional[float] = None
+        self._synced_version: Optional[str] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        data_version.add_listener(self._on_data_change)
+
+    # ---------- estado ----------
+
+    def is_fresh(self) -> bool:
+        """True si la réplica puede responder lecturas"""
+        return (
+            self._conn is not None
+            and self._synced_at is not None
+            and self._synced_version == data_version.current()
+            and time.monotonic() - self._synced_at <= self.max_staleness
+        )
+
+    def _on_data_change(self, version: int) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---------- hidratación y sincronización ----------
+
+    @staticmethod
+    def _create_connection() -> sqlite3.Connection:
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        for table, foreign_keys in READ_MODEL_TABLES.items():
+            conn.execute(f"CREATE TABLE {table} (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            for column in foreign_keys:
+                conn.execute(f"CREATE INDEX idx_{table}_{column} ON {table} (json_extract(data, '$.{column}'))")
+        return conn
+
+    def hydrate(self, supabase) -> None:
+        """Cargar todas las tablas en una base nueva y reemplazar la actual"""
+        version = data_version.current()
+
+        # El cursor se toma antes de copiar: lo escrito durante la copia se
+        # vuelve a aplicar en la primera sincronización
+        cursor = latest_cursor(supabase)
+
+        conn = self._create_connection()
+        for table in READ_MODEL_TABLES:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+                ((str(row['id']), json.dumps(row, default=str)) for row in iter_table(supabase, table, '*'))
+            )
+        conn.commit()
+
+        with self._lock:
+            previous, self._conn = self._conn, conn
+            self._cursor = cursor
+            self._synced_at = time.monotonic()
+            self._synced_version = version
+
+        if previous is not None:
+            previous.close()
+
+    def sync(self, supabase) -> int:
+        """Aplicar las entradas de change_log posteriores al cursor; devuelve cuántas se leyeron"""
+        version = data_version.current()
+        applied = 0
+
+        while True:
+            try:
+                rows, cursor, has_more = read_changes(supabase, self._cursor, SYNC_BATCH_SIZE)
+            except CursorTooOld:
+                # Se perdieron cambios purgados: copia completa
+                self.hydrate(supabase)
+                return applied
+
+            # Última operación por registro
+            latest: Dict[Tuple[str, str], str] = {}
+            for row in rows:
+                if row['entidad'] in CHILD_TABLES:
+                    latest[(row['entidad'], row['entidad_id'])] = row['operacion']
+
+            for entidad in CHILD_TABLES:
+                upserts = [entidad_id for (ent, entidad_id), op in latest.items() if ent == entidad and op != 'delete']
+                deletes = [entidad_id for (ent, entidad_id), op in latest.items() if ent == entidad and op == 'delete']
+                self._apply(supabase, entidad, upserts, deletes)
+
+            # Las entradas recientes se vuelven a aplicar en la vuelta siguiente
+            applied += len(rows)
+            self._cursor = cursor
+            if not has_more:
+                break
+
+        self._synced_at = time.monotonic()
+        self._synced_version = version
+        return applied
+
+    def _apply(self, supabase, entidad: str, upserts: List[str], deletes: List[str]) -> None:
+        if not upserts and not deletes:
+            return
+
+        # Leer de Supabase fuera del lock
+        parents = load_children(supabase, entidad, 'id', upserts) if upserts else {}
+        children = {
+            (child, foreign_key): load_children(supabase, child, foreign_key, upserts)
+            for child, foreign_key in CHILD_TABLES[entidad]
+        } if upserts else {}
+
+        with self._lock:
+            conn = self._conn
+            for entidad_id in upserts + deletes:
+                conn.execute(f"DELETE FROM {entidad} WHERE id = ?", (entidad_id,))
+                for child, foreign_key in CHILD_TABLES[entidad]:
+                    conn.execute(f"DELETE FROM {child} WHERE json_extract(data, '$.{foreign_key}') = ?", (entidad_id,))
+
+            # Un upsert cuyo registro ya no existe equivale a una eliminación
+            for entidad_id in upserts:
+                for row in parents.get(entidad_id, []):
+                    conn.execute(f"INSERT OR REPLACE INTO {entidad} (id, data) VALUES (?, ?)", (str(row['id']), json.dumps(row, default=str)))
+                for (child, foreign_key), grouped in children.items():
+                    for row in grouped.get(entidad_id, []):
+                        conn.execute(f"INSERT OR REPLACE INTO {child} (id, data) VALUES (?, ?)", (str(row['id']), json.dumps(row, default=str)))
+            conn.commit()
+
+    async def run(self, supabase) -> None:
+        """Hidratar y sincronizar en segundo plano hasta que se cancele la tarea"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+
+        while self._conn is None:
+            try:
+                await asyncio.to_thread(self.hydrate, supabase)
+                print("✅ Réplica de lectura hidratada")
+            except Exception as e:
+                print(f"⚠️ Error hidratando réplica de lectura: {str(e)}")
+                await asyncio.sleep(self.poll_seconds * 5)
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await asyncio.to_thread(self.sync, supabase)
+            except Exception as e:
+                # Sin sincronizar la réplica deja de estar fresca y las lecturas vuelven a Supabase
+                print(f"⚠️ Error sincronizando réplica de lectura: {str(e)}")
+
+    # ---------- consultas ----------
+
+    def get(self, table: str, row_id) -> Optional[dict]:
+        """Fila por id"""
+        if row_id is None:
+            return None
+        with self._lock:
+            found = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", (str(row_id),)).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def query(
+        self,
+        table: str,
+        filters: Optional[Dict[str, object]] = None,
+        search: Optional[Tuple[Tuple[str, ...], str]] = None,
+        order_by: str = 'created_at',
+        desc: bool = False,
+        offset: int = 0,
+        limit: int = 20
+    ) -> Tuple[List[dict], int]:
+        """Filtrar por igualdad y texto (ILIKE), ordenar y paginar: (filas, total)"""
+        conditions, params = [], []
+
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            conditions.append(f"json_extract(data, '$.{column}') = ?")
+            params.append(value)
+
+        if search and search[1]:
+            columns, text = search
+            pattern = '%' + text.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append('(' + ' OR '.join(
+                f"lower(json_extract(data, '$.{column}')) LIKE ? ESCAPE '\\'" for column in columns
+            ) + ')')
+            params.extend([pattern] * len(columns))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        direction = 'DESC' if desc else 'ASC'
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT count(*) FROM {table} {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT data FROM {table} {where} ORDER BY json_extract(data, '$.{order_by}') {direction}, id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return [json.loads(row[0]) for row in rows], total
+
+
+read_model = ReadModel(
+    poll_seconds=settings.read_model_poll_seconds,
+    max_staleness=settings.read_model_max_staleness
+)
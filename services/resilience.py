@@ -0,0 +1,217 @@
+# =============================================
+# services/resilience.py - Timeouts, reintentos y circuit breaker para Supabase
+# =============================================
+#
+# Los clientes de Supabase (database.py) usan un httpx.Client con
+# ResilientTransport, que aplica a cada llamada a PostgREST:
+# - timeout según la operación: lectura (GET/HEAD), escritura o RPC
+# - reintentos con backoff exponencial y jitter para lecturas ante errores de
+#   conexión, timeouts y 502/503/504; las escrituras y RPC sólo se reintentan
+#   si la conexión falló antes de enviar la solicitud
+# - un circuit breaker por backend: tras N fallas consecutivas las llamadas
+#   fallan de inmediato durante BREAKER_RESET_SECONDS, luego una llamada de
+#   prueba decide si se cierra
+#
+# Cuando el backend no responde se lanza BackendUnavailable, que es un
+# HTTPException 503 con Retry-After: los routers ya la dejan pasar con
+# `except HTTPException: raise` en lugar de convertirla en un 500.
+#
+# Los handlers async llaman al cliente síncrono desde el hilo del event loop.
+# Ahí no se duerme entre reintentos (time.sleep congelaría todas las
+# solicitudes del worker): la llamada falla con 503 y el cliente reintenta
+# según Retry-After. Los reintentos con backoff quedan para las llamadas hechas
+# desde hilos (trabajos, réplica de lectura, handlers sync).
+
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException
+
+from services.metrics import metrics
+from settings_new import settings
+
+# Estados del breaker (valor del gauge supabase_circuit_state)
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+# Respuestas que indican un backend caído o saturado
+RETRYABLE_STATUS = {502, 503, 504}
+
+metrics.describe('supabase_requests_total', 'counter', 'Llamadas a PostgREST por backend, operación y resultado')
+metrics.describe('supabase_retries_total', 'counter', 'Reintentos de llamadas a PostgREST')
+metrics.describe('supabase_request_seconds_sum', 'counter', 'Tiempo acumulado en llamadas a PostgREST')
+metrics.describe('supabase_circuit_state', 'gauge', 'Estado del circuit breaker (0 cerrado, 1 abierto, 2 semiabierto)')
+metrics.describe('supabase_circuit_opened_total', 'counter', 'Veces que se abrió el circuit breaker')
+
+# Hilo que ejecuta el event loop de la aplicación (se fija en el lifespan)
+_event_loop_thread: Optional[int] = None
+
+
+def mark_event_loop_thread() -> None:
+    """Registrar el hilo actual como el del event loop: en él no se reintenta con espera"""
+    global _event_loop_thread
+    _event_loop_thread = threading.get_ident()
+
+
+def on_event_loop_thread() -> bool:
+    return _event_loop_thread is not None and threading.get_ident() == _event_loop_thread
+
+
+class BackendUnavailable(HTTPException):
+    def __init__(self, backend: str, retry_after: float, reason: str):
+        super().__init__(
+            status_code=503,
+            detail=f"Base de datos no disponible ({backend}): {reason}",
+            headers={'Retry-After': str(max(1, int(retry_after + 0.999)))}
+        )
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.add_collector(lambda: [('supabase_circuit_state', {'backend': self.name}, STATE_VALUES[self.state])])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def before_call(self) -> None:
+        """Lanzar BackendUnavailable si el circuito no admite la llamada"""
+        with self._lock:
+            if self._state == OPEN:
+                remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise BackendUnavailable(self.name, remaining, "circuito abierto")
+                self._state = HALF_OPEN
+
+            if self._state == HALF_OPEN:
+                # Una sola llamada de prueba a la vez
+                if self._probe_in_flight:
+                    raise BackendUnavailable(self.name, 1, "verificando recuperación")
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    metrics.inc('supabase_circuit_opened_total', {'backend': self.name})
+                    print(f"⚠️ Circuit breaker de {self.name} abierto tras {self._failures} fallas")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+def classify(request: httpx.Request) -> str:
+    """Tipo de operación: read, write o rpc"""
+    if '/rpc/' in request.url.path:
+        return 'rpc'
+    if request.method in ('GET', 'HEAD'):
+        return 'read'
+    return 'write'
+
+
+class ResilientTransport(httpx.BaseTransport):
+    def __init__(self, breaker: CircuitBreaker, transport: Optional[httpx.BaseTransport] = None):
+        self.breaker = breaker
+        self.transport = transport or httpx.HTTPTransport(http2=True)
+        self.timeouts = {
+            'read': settings.supabase_read_timeout,
+            'write': settings.supabase_write_timeout,
+            'rpc': settings.supabase_rpc_timeout
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: entre 0 y base * 2^intento, con tope
+        return random.uniform(0, min(settings.supabase_retry_max_backoff, settings.supabase_retry_backoff * (2 ** attempt)))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        operation = classify(request)
+        labels = {'backend': self.breaker.name, 'operation': operation}
+        request.extensions['timeout'] = httpx.Timeout(
+            self.timeouts[operation], connect=settings.supabase_connect_timeout
+        ).as_dict()
+        # En el hilo del event loop no se espera para reintentar
+        can_retry = not on_event_loop_thread()
+        max_retries = settings.supabase_read_retries if operation == 'read' and can_retry else 0
+
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                metrics.inc('supabase_request_seconds_sum', labels, time.monotonic() - started)
+                self.breaker.record_failure()
+                # Sin conexión la solicitud no llegó al servidor: se puede repetir aunque sea escritura
+                retries = max_retries if operation == 'read' else (1 if can_retry and isinstance(e, httpx.ConnectError) else 0)
+                if attempt < retries:
+                    metrics.inc('supabase_retries_total', labels)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                outcome = 'timeout' if isinstance(e, httpx.TimeoutException) else 'error'
+                metrics.inc('supabase_requests_total', {**labels, 'outcome': outcome})
+                raise BackendUnavailable(self.breaker.name, settings.breaker_reset_seconds if self.breaker.is_open() else 1, str(e) or outcome)
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            metrics.inc('supabase_request_seconds_sum', labels, time.monotonic() - started)
+
+            if response.status_code in RETRYABLE_STATUS:
+                self.breaker.record_failure()
+                if attempt < max_retries:
+                    response.close()
+                    metrics.inc('supabase_retries_total', labels)
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                response.close()
+                metrics.inc('supabase_requests_total', {**labels, 'outcome': str(response.status_code)})
+                retry_after = response.headers.get('Retry-After')
+                raise BackendUnavailable(
+                    self.breaker.name,
+                    float(retry_after) if retry_after and retry_after.isdigit() else 1,
+                    f"respuesta {response.status_code}"
+                )
+
+            self.breaker.record_success()
+            metrics.inc('supabase_requests_total', {**labels, 'outcome': 'ok' if response.status_code < 400 else str(response.status_code)})
+            return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    """Circuit breaker de un backend con los umbrales de settings"""
+    return CircuitBreaker(name, settings.breaker_failure_threshold, settings.breaker_reset_seconds)
+
+
+def build_http_client(breaker: CircuitBreaker) -> httpx.Client:
+    """httpx.Client para un backend de Supabase con timeouts, reintentos y el breaker dado"""
+    return httpx.Client(transport=ResilientTransport(breaker), follow_redirects=True)
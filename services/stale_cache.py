@@ -0,0 +1,164 @@
+# =============================================
+# services/stale_cache.py - Última respuesta válida ante fallas del backend
+# =============================================
+#
+# @serve_stale_on_error guarda la última respuesta exitosa de un endpoint
+# (por combinación de parámetros). Si el endpoint falla con un error de
+# servidor (timeout, 503 del circuit breaker, 500) y hay una copia con menos
+# de STALE_MAX_AGE segundos, se responde la copia con `"stale": true` y los
+# headers Age y Warning, en vez del error.
+#
+# Mientras una clave está en modo stale, las solicitudes siguientes reciben
+# la copia sin consultar la base de datos y un único refresco en segundo
+# plano reintenta con backoff exponencial; al primer éxito se vuelve al modo
+# normal. Así una caída no multiplica los reintentos contra Supabase.
+
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from services.metrics import metrics
+from settings_new import settings
+
+metrics.describe('stale_responses_total', 'counter', 'Respuestas servidas desde la última copia válida')
+metrics.describe('stale_refresh_total', 'counter', 'Refrescos en segundo plano por resultado')
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'refreshing', 'next_attempt', 'failures')
+
+    def __init__(self, value):
+        self.value = value
+        self.stored_at = time.time()
+        self.refreshing: Optional[asyncio.Task] = None
+        self.next_attempt = 0.0
+        self.failures = 0
+
+
+class StaleCache:
+    def __init__(self, max_entries: int, max_age: float, refresh_backoff: float, refresh_max_backoff: float):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.refresh_backoff = refresh_backoff
+        self.refresh_max_backoff = refresh_max_backoff
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+
+    def store(self, key: tuple, value) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry(value)
+            self._entries[key] = entry
+        else:
+            entry.value = value
+            entry.stored_at = time.time()
+            entry.failures = 0
+            entry.next_attempt = 0.0
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: tuple) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.stored_at > self.max_age:
+            return None
+        return entry
+
+    def in_stale_mode(self, entry: _Entry) -> bool:
+        return entry.failures > 0
+
+    def schedule_refresh(self, key: tuple, entry: _Entry, refresh, name: str) -> None:
+        """Reintentar en segundo plano (una sola tarea por clave, con backoff)"""
+        if entry.refreshing is not None and not entry.refreshing.done():
+            return
+
+        async def run():
+            # Termina al primer éxito o cuando la entrada se expulsa o expira
+            while entry.failures > 0 and self.get(key) is entry:
+                delay = max(0.0, entry.next_attempt - time.monotonic())
+                await asyncio.sleep(delay)
+                try:
+                    value = await refresh()
+                except Exception:
+                    entry.failures += 1
+                    entry.next_attempt = time.monotonic() + min(
+                        self.refresh_max_backoff, self.refresh_backoff * (2 ** (entry.failures - 1))
+                    )
+                    metrics.inc('stale_refresh_total', {'endpoint': name, 'outcome': 'error'})
+                    continue
+                self.store(key, value)
+                metrics.inc('stale_refresh_total', {'endpoint': name, 'outcome': 'ok'})
+
+        entry.refreshing = asyncio.create_task(run())
+
+    def mark_failure(self, entry: _Entry) -> None:
+        entry.failures = max(entry.failures, 1)
+        entry.next_attempt = time.monotonic() + self.refresh_backoff
+
+
+stale_cache = StaleCache(
+    max_entries=settings.stale_cache_max_entries,
+    max_age=settings.stale_max_age,
+    refresh_backoff=settings.stale_refresh_backoff,
+    refresh_max_backoff=settings.stale_refresh_max_backoff
+)
+
+
+def _stale_response(entry: _Entry) -> Response:
+    age = int(time.time() - entry.stored_at)
+    content = dict(entry.value) if isinstance(entry.value, dict) else {"data": entry.value}
+    content['stale'] = True
+    # La copia es el resultado del handler tal cual: jsonable_encoder sólo para
+    # los tipos que orjson no conoce (Decimal), y sólo al servir la copia
+    return Response(
+        content=orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS),
+        media_type='application/json',
+        headers={
+            'Age': str(age),
+            'Warning': '110 - "Response is Stale"',
+            # Sin ETag ni caché del cliente: la próxima consulta debe volver a intentar
+            'Cache-Control': 'no-store'
+        }
+    )
+
+
+def serve_stale_on_error(func):
+    """Decorador de endpoints: responder la última copia válida si el backend falla"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = (func.__module__, name, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+        entry = stale_cache.get(key)
+
+        # En modo stale no se consulta la base: el refresco en segundo plano se encarga
+        if entry is not None and stale_cache.in_stale_mode(entry):
+            metrics.inc('stale_responses_total', {'endpoint': name})
+            return _stale_response(entry)
+
+        try:
+            result = await func(*args, **kwargs)
+        except HTTPException as e:
+            if e.status_code < 500 or entry is None:
+                raise
+            stale_cache.mark_failure(entry)
+
+            async def refresh():
+                return await func(*args, **kwargs)
+
+            stale_cache.schedule_refresh(key, entry, refresh, name)
+            metrics.inc('stale_responses_total', {'endpoint': name})
+            return _stale_response(entry)
+
+        # Se guarda el resultado sin codificar: el costo queda en el camino stale
+        stale_cache.store(key, result)
+        return result
+
+    return wrapper
@@ -0,0 +1,268 @@
+# =============================================
+# services/statement.py - Estado de cuenta de proveedores
+# =============================================
+#
+# El estado de cuenta une en un solo libro cronológico los movimientos de un
+# proveedor:
+# - facturas (aumentan el saldo de facturas)
+# - pagos a facturas (lo disminuyen)
+# - anticipos pagados (aumentan el saldo de anticipos)
+# - aplicaciones de anticipos a facturas (disminuyen ambos saldos)
+#
+# Cada fuente se lee ya ordenada por fecha desde la base (iter_sorted) y las
+# cuatro se combinan con heapq.merge sin cargarlas completas en memoria. Los
+# saldos corridos por moneda son sumas prefijas de los movimientos; el saldo
+# neto es facturas pendientes menos anticipos disponibles (positivo = se le
+# debe al proveedor).
+#
+# La paginación es por fecha: el cursor indica que se continúa en una fecha
+# después de sus primeros n movimientos y lleva los saldos corridos hasta ese
+# punto, así cada página lee sólo desde su fecha en vez de recalcular el
+# saldo inicial con toda la historia anterior. Es un JSON en base64 url-safe
+# {"fecha", "n", "moneda", "saldos"}.
+
+import base64
+import heapq
+import json
+from datetime import date, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from services.pagination import iter_sorted
+
+def _date_filters(column: str, desde: Optional[date], hasta: Optional[date]):
+    def apply(q):
+        if desde:
+            q = q.gte(column, desde.isoformat())
+        if hasta:
+            # Límite exclusivo al día siguiente: también sirve para columnas timestamp
+            q = q.lt(column, (hasta + timedelta(days=1)).isoformat())
+        return q
+    return apply
+
+
+def _movement(fecha: str, tipo: str, row_id: str, moneda: str, monto: float,
+              delta_facturas: float, delta_anticipos: float, documento=None, referencia=None) -> dict:
+    return {
+        'fecha': fecha[:10],
+        'tipo': tipo,
+        'id': row_id,
+        'documento': documento,
+        'referencia': referencia,
+        'moneda': moneda,
+        'monto': monto,
+        'delta_facturas': delta_facturas,
+        'delta_anticipos': delta_anticipos
+    }
+
+
+def _sources(supabase, supplier_id: str, desde: Optional[date], hasta: Optional[date]):
+    """Iteradores de movimientos de cada fuente, cada uno en orden por fecha"""
+    supplier_id = str(supplier_id)
+
+    def facturas():
+        filters = _date_filters('fecha_emision', desde, hasta)
+        for inv in iter_sorted(supabase, 'invoices', 'numero_factura, moneda, monto_total', 'fecha_emision',
+                               filters=lambda q: filters(q.eq('supplier_id', supplier_id))):
+            monto = float(inv['monto_total'])
+            yield _movement(inv['fecha_emision'], 'factura', inv['id'], inv['moneda'], monto, monto, 0.0,
+                            documento=inv['numero_factura'])
+
+    def aplicaciones():
+        filters = _date_filters('fecha', desde, hasta)
+        for alloc in iter_sorted(supabase, 'advance_allocation', '''
+            anticipo_id, monto_aplicado,
+            invoices!advance_allocation_invoice_id_fkey!inner(numero_factura, moneda, supplier_id)
+        ''', 'fecha', filters=lambda q: filters(q.eq('invoices.supplier_id', supplier_id))):
+            monto = float(alloc['monto_aplicado'])
+            yield _movement(alloc['fecha'], 'aplicacion_anticipo', alloc['id'], alloc['invoices']['moneda'], monto,
+                            -monto, -monto, documento=alloc['invoices']['numero_factura'], referencia=alloc['anticipo_id'])
+
+    def pagos():
+        filters = _date_filters('fecha', desde, hasta)
+        for payment in iter_sorted(supabase, 'invoice_payment', '''
+            monto_pagado, metodo_pago, referencia,
+            invoices!invoice_payment_invoice_id_fkey!inner(numero_factura, moneda, supplier_id)
+        ''', 'fecha', filters=lambda q: filters(q.eq('invoices.supplier_id', supplier_id))):
+            monto = float(payment['monto_pagado'])
+            yield _movement(payment['fecha'], 'pago', payment['id'], payment['invoices']['moneda'], monto,
+                            -monto, 0.0, documento=payment['invoices']['numero_factura'],
+                            referencia=payment.get('referencia') or payment.get('metodo_pago'))
+
+    def anticipos():
+        # Los anticipos devueltos no forman parte del saldo con el proveedor
+        filters = _date_filters('fecha_pago', desde, hasta)
+        for adv in iter_sorted(supabase, 'advance_payments', '''
+            monto, moneda, estado,
+            purchase_orders!advance_payments_po_id_fkey!inner(numero_orden, supplier_id)
+        ''', 'fecha_pago', filters=lambda q: filters(
+            q.eq('purchase_orders.supplier_id', supplier_id).neq('estado', 'devuelto')
+        )):
+            monto = float(adv['monto'])
+            yield _movement(adv['fecha_pago'], 'anticipo', adv['id'], adv['moneda'], monto, 0.0, monto,
+                            documento=adv['purchase_orders']['numero_orden'])
+
+    return [facturas(), aplicaciones(), pagos(), anticipos()]
+
+
+def count_movements(supabase, supplier_id: str, desde: Optional[date] = None,
+                    hasta: Optional[date] = None) -> int:
+    """Cantidad de movimientos del período en todas las monedas (para informar avance)"""
+    supplier_id = str(supplier_id)
+
+    def count(table: str, columns: str, column: str, filters) -> int:
+        query = supabase.table(table).select(columns, count='exact', head=True).not_.is_(column, 'null')
+        return filters(_date_filters(column, desde, hasta)(query)).execute().count or 0
+
+    return (
+        count('invoices', 'id', 'fecha_emision', lambda q: q.eq('supplier_id', supplier_id))
+        + count('advance_allocation', 'id, invoices!advance_allocation_invoice_id_fkey!inner(supplier_id)', 'fecha',
+                lambda q: q.eq('invoices.supplier_id', supplier_id))
+        + count('invoice_payment', 'id, invoices!invoice_payment_invoice_id_fkey!inner(supplier_id)', 'fecha',
+                lambda q: q.eq('invoices.supplier_id', supplier_id))
+        + count('advance_payments', 'id, purchase_orders!advance_payments_po_id_fkey!inner(supplier_id)', 'fecha_pago',
+                lambda q: q.eq('purchase_orders.supplier_id', supplier_id).neq('estado', 'devuelto'))
+    )
+
+
+def merge_movements(supabase, supplier_id: str, desde: Optional[date] = None,
+                    hasta: Optional[date] = None) -> Iterator[dict]:
+    """Movimientos del proveedor en orden cronológico (k-way merge de las fuentes)"""
+    # A igual fecha, heapq.merge respeta el orden de las fuentes en la lista
+    return heapq.merge(*_sources(supabase, supplier_id, desde, hasta), key=lambda m: m['fecha'])
+
+
+def _empty_balance() -> dict:
+    return {'facturas_pendientes': 0.0, 'anticipos_disponibles': 0.0}
+
+
+def _apply(balances: Dict[str, dict], movement: dict) -> dict:
+    balance = balances.setdefault(movement['moneda'], _empty_balance())
+    balance['facturas_pendientes'] += movement['delta_facturas']
+    balance['anticipos_disponibles'] += movement['delta_anticipos']
+    return balance
+
+
+def format_balances(balances: Dict[str, dict]) -> Dict[str, dict]:
+    return {moneda: format_balance(balance) for moneda, balance in sorted(balances.items())}
+
+
+def format_balance(balance: dict) -> dict:
+    facturas = round(balance['facturas_pendientes'], 2)
+    anticipos = round(balance['anticipos_disponibles'], 2)
+    return {
+        'facturas_pendientes': facturas,
+        'anticipos_disponibles': anticipos,
+        'neto': round(facturas - anticipos, 2)
+    }
+
+
+def encode_cursor(fecha: str, offset: int, moneda: Optional[str], balances: Dict[str, dict]) -> str:
+    payload = {
+        'fecha': fecha,
+        'n': offset,
+        'moneda': moneda,
+        'saldos': {m: [b['facturas_pendientes'], b['anticipos_disponibles']] for m, b in balances.items()}
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def parse_cursor(cursor: Optional[str], moneda: Optional[str] = None) -> Tuple[Optional[date], int, Dict[str, dict]]:
+    """Cursor -> (fecha, movimientos de esa fecha ya entregados, saldos hasta ese punto)"""
+    if not cursor:
+        return None, 0, {}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        balances = {
+            str(m): {'facturas_pendientes': float(facturas), 'anticipos_disponibles': float(anticipos)}
+            for m, (facturas, anticipos) in payload['saldos'].items()
+        }
+        fecha, offset = date.fromisoformat(payload['fecha']), int(payload['n'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+    if payload.get('moneda') != moneda:
+        raise HTTPException(status_code=400, detail="El cursor corresponde a otra moneda")
+    return fecha, offset, balances
+
+
+class SupplierStatement:
+    """Recorrido del estado de cuenta con saldos corridos por moneda
+
+    Al crearlo se toma el saldo inicial: el del cursor, o la suma de los
+    movimientos anteriores a fecha_desde. Luego movements() entrega los
+    movimientos del período con el saldo de su moneda después de aplicarlos.
+    """
+
+    def __init__(self, supabase, supplier_id: str, desde: Optional[date] = None, hasta: Optional[date] = None,
+                 moneda: Optional[str] = None, cursor: Optional[str] = None):
+        self.supabase = supabase
+        self.supplier_id = str(supplier_id)
+        self.moneda = moneda
+        self.hasta = hasta
+
+        cursor_date, self._skip, self.balances = parse_cursor(cursor, moneda)
+        if cursor_date and desde and cursor_date < desde:
+            raise HTTPException(status_code=400, detail="El cursor es anterior a fecha_desde")
+        self.desde = cursor_date or desde
+
+        # Primera página: saldo inicial como suma de todo lo anterior al período
+        if self.desde and not cursor:
+            for movement in merge_movements(supabase, self.supplier_id, hasta=self.desde - timedelta(days=1)):
+                if self._matches(movement):
+                    _apply(self.balances, movement)
+
+        self.opening: Dict[str, dict] = {}
+        self._last_date: Optional[str] = None
+        self._same_date = 0
+
+    def _matches(self, movement: dict) -> bool:
+        return not self.moneda or movement['moneda'] == self.moneda
+
+    def movements(self) -> Iterator[dict]:
+        skip = self._skip
+        opening_taken = False
+        for movement in merge_movements(self.supabase, self.supplier_id, self.desde, self.hasta):
+            if not self._matches(movement):
+                continue
+
+            # Posición dentro de la fecha, para el cursor de la página siguiente
+            if movement['fecha'] == self._last_date:
+                self._same_date += 1
+            else:
+                self._last_date = movement['fecha']
+                self._same_date = 1
+
+            # Movimientos ya entregados en la página anterior (el cursor ya incluye su saldo)
+            if skip > 0:
+                skip -= 1
+                continue
+            if not opening_taken:
+                self.opening = {m: dict(b) for m, b in self.balances.items()}
+                opening_taken = True
+
+            balance = _apply(self.balances, movement)
+
+            yield {
+                'fecha': movement['fecha'],
+                'tipo': movement['tipo'],
+                'id': movement['id'],
+                'documento': movement['documento'],
+                'referencia': movement['referencia'],
+                'moneda': movement['moneda'],
+                'cargo': round(movement['delta_facturas'], 2) if movement['delta_facturas'] > 0 else 0.0,
+                'abono': round(movement['monto'], 2) if movement['tipo'] in ('pago', 'aplicacion_anticipo') else 0.0,
+                'anticipo': round(movement['delta_anticipos'], 2),
+                'saldo': format_balance(balance)
+            }
+
+        if not opening_taken:
+            self.opening = {m: dict(b) for m, b in self.balances.items()}
+
+    def next_cursor(self) -> Optional[str]:
+        """Cursor para continuar después del último movimiento entregado"""
+        if self._last_date is None:
+            return None
+        return encode_cursor(self._last_date, self._same_date, self.moneda, self.balances)
@@ -0,0 +1,223 @@
+# =============================================
+# services/supplier_index.py - Índice en memoria de nombres de proveedores
+# =============================================
+#
+# Autocompletado y detección de nombres casi duplicados ("ACME Ltd" /
+# "Acme Ltd.") sin consultar la base de datos en cada tecla. El índice se
+# carga completo la primera vez que se usa, se actualiza en cada escritura de
+# proveedores de este proceso y se recarga cada SUPPLIER_INDEX_TTL segundos
+# para incorporar cambios hechos por otras instancias.
+#
+# Estructuras:
+# - lista ordenada de (palabra normalizada, id) para búsquedas por prefijo
+#   con bisect
+# - índice invertido trigrama -> ids para similitud (como pg_trgm)
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set
+
+from services.pagination import iter_table
+from settings_new import settings
+
+# Sufijos societarios que no distinguen a un proveedor de otro
+LEGAL_SUFFIXES = {
+    'ltd', 'ltda', 'limited', 'inc', 'llc', 'corp', 'co', 'sa', 'spa',
+    'sac', 'srl', 'gmbh', 'eirl', 'cia', 'company', 'corporation'
+}
+
+# Similitud mínima para considerar dos nombres como posibles duplicados
+DUPLICATE_THRESHOLD = 0.6
+
+
+def normalize(nombre: str) -> str:
+    """Minúsculas, sin acentos ni puntuación y con espacios simples"""
+    text = unicodedata.normalize('NFKD', nombre or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    # "S.A." y "S A" se unen en "sa" para tratarlos como una sola palabra
+    text = re.sub(r'\b([a-z0-9])[.\s]+(?=[a-z0-9]\b)', r'\1', text)
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def duplicate_key(nombre: str) -> str:
+    """Nombre normalizado sin sufijos societarios (clave para detectar duplicados)"""
+    words = normalize(nombre).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigramas por palabra con el mismo relleno que pg_trgm ('  pal ')"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Coeficiente de Jaccard entre dos conjuntos de trigramas"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class SupplierIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._words: List[tuple] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+
+    # ---------- carga y mantenimiento ----------
+
+    def ensure_loaded(self, supabase) -> None:
+        """Cargar (o recargar si venció el TTL) todos los proveedores"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+
+        rows = list(iter_table(supabase, 'suppliers', 'id, nombre, activo'))
+
+        with self._lock:
+            self._entries = {}
+            self._words = []
+            self._grams = {}
+            for row in rows:
+                self._add(row)
+            self._words.sort()
+            self._loaded_at = time.monotonic()
+
+    def upsert(self, row: dict) -> None:
+        """Incorporar un proveedor creado o actualizado"""
+        if self._loaded_at is None or not row.get('id'):
+            return
+
+        with self._lock:
+            previous = self._entries.get(row['id'])
+            if previous:
+                row = {**previous['row'], **row}
+                self._remove(row['id'])
+            self._add(row, keep_sorted=True)
+
+    def remove(self, supplier_id) -> None:
+        """Quitar un proveedor eliminado"""
+        if self._loaded_at is None:
+            return
+
+        with self._lock:
+            self._remove(str(supplier_id))
+
+    def _add(self, row: dict, keep_sorted: bool = False) -> None:
+        supplier_id = str(row['id'])
+        norm = normalize(row.get('nombre'))
+        key = duplicate_key(row.get('nombre'))
+        entry = {
+            'row': {'id': supplier_id, 'nombre': row.get('nombre'), 'activo': row.get('activo', True)},
+            'norm': norm,
+            'key': key,
+            'grams': trigrams(key)
+        }
+        self._entries[supplier_id] = entry
+
+        for word in set(norm.split()) | {norm}:
+            if keep_sorted:
+                insort(self._words, (word, supplier_id))
+            else:
+                self._words.append((word, supplier_id))
+
+        for gram in entry['grams']:
+            self._grams.setdefault(gram, set()).add(supplier_id)
+
+    def _remove(self, supplier_id: str) -> None:
+        entry = self._entries.pop(supplier_id, None)
+        if not entry:
+            return
+
+        for word in set(entry['norm'].split()) | {entry['norm']}:
+            position = bisect_left(self._words, (word, supplier_id))
+            if position < len(self._words) and self._words[position] == (word, supplier_id):
+                del self._words[position]
+
+        for gram in entry['grams']:
+            ids = self._grams.get(gram)
+            if ids:
+                ids.discard(supplier_id)
+                if not ids:
+                    del self._grams[gram]
+
+    # ---------- consultas ----------
+
+    def _candidates(self, grams: Set[str], min_shared: int) -> Dict[str, int]:
+        """Ids que comparten al menos min_shared trigramas con la consulta"""
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for supplier_id in self._grams.get(gram, ()):
+                shared[supplier_id] = shared.get(supplier_id, 0) + 1
+        return {supplier_id: count for supplier_id, count in shared.items() if count >= min_shared}
+
+    def autocomplete(self, q: str, limit: int = 10, activo: Optional[bool] = None) -> List[dict]:
+        """Proveedores cuyo nombre (o alguna palabra) empieza con q, y luego los más parecidos"""
+        query = normalize(q)
+        if not query:
+            return []
+
+        scores: Dict[str, float] = {}
+
+        with self._lock:
+            # Prefijo: nombre completo (1.0) o una de sus palabras (0.9)
+            position = bisect_left(self._words, (query,))
+            while position < len(self._words) and self._words[position][0].startswith(query):
+                word, supplier_id = self._words[position]
+                score = 1.0 if self._entries[supplier_id]['norm'].startswith(query) else 0.9
+                scores[supplier_id] = max(scores.get(supplier_id, 0.0), score)
+                position += 1
+
+            # Similitud trigram para errores de tipeo
+            query_grams = trigrams(query)
+            for supplier_id in self._candidates(query_grams, max(1, len(query_grams) // 3)):
+                if supplier_id not in scores:
+                    score = similarity(query_grams, self._entries[supplier_id]['grams'])
+                    if score >= 0.3:
+                        scores[supplier_id] = score * 0.8
+
+            rows = [
+                {**self._entries[supplier_id]['row'], 'score': round(score, 3)}
+                for supplier_id, score in scores.items()
+                if activo is None or self._entries[supplier_id]['row']['activo'] == activo
+            ]
+
+        rows.sort(key=lambda row: (-row['score'], row['nombre'] or ''))
+        return rows[:limit]
+
+    def find_similar(self, nombre: str, exclude_id=None, threshold: float = DUPLICATE_THRESHOLD) -> List[dict]:
+        """Proveedores con nombre igual o casi igual (ignorando mayúsculas, puntuación y sufijos)"""
+        key = duplicate_key(nombre)
+        if not key:
+            return []
+
+        key_grams = trigrams(key)
+        exclude = str(exclude_id) if exclude_id else None
+        similar = []
+
+        with self._lock:
+            for supplier_id in self._candidates(key_grams, 1):
+                if supplier_id == exclude:
+                    continue
+                entry = self._entries[supplier_id]
+                score = 1.0 if entry['key'] == key else similarity(key_grams, entry['grams'])
+                if score >= threshold:
+                    similar.append({**entry['row'], 'score': round(score, 3)})
+
+        similar.sort(key=lambda row: -row['score'])
+        return similar
+
+
+supplier_index = SupplierIndex(ttl=settings.supplier_index_ttl)
@@ -16,12 +16,83 @@ class ConfigSGF:
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_KEY')
         
+        # Réplica de lectura opcional para listados y reportes
+        self.supabase_read_url = os.getenv('SUPABASE_READ_URL')
+        self.supabase_read_key = os.getenv('SUPABASE_READ_KEY')
+        self.read_your_writes_seconds = float(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+        
+        # Timeouts (segundos), reintentos y circuit breaker de las llamadas a Supabase
+        self.supabase_connect_timeout = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5'))
+        self.supabase_read_timeout = float(os.getenv('SUPABASE_READ_TIMEOUT', '10'))
+        self.supabase_write_timeout = float(os.getenv('SUPABASE_WRITE_TIMEOUT', '20'))
+        self.supabase_rpc_timeout = float(os.getenv('SUPABASE_RPC_TIMEOUT', '30'))
+        self.supabase_read_retries = int(os.getenv('SUPABASE_READ_RETRIES', '2'))
+        self.supabase_retry_backoff = float(os.getenv('SUPABASE_RETRY_BACKOFF', '0.2'))
+        self.supabase_retry_max_backoff = float(os.getenv('SUPABASE_RETRY_MAX_BACKOFF', '2'))
+        self.breaker_failure_threshold = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+        self.breaker_reset_seconds = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+        
+        # Última respuesta válida de reportes y datos de referencia ante fallas
+        self.stale_max_age = float(os.getenv('STALE_MAX_AGE', '21600'))
+        self.stale_cache_max_entries = int(os.getenv('STALE_CACHE_MAX_ENTRIES', '256'))
+        self.stale_refresh_backoff = float(os.getenv('STALE_REFRESH_BACKOFF', '5'))
+        self.stale_refresh_max_backoff = float(os.getenv('STALE_REFRESH_MAX_BACKOFF', '120'))
+        
+        # Control de admisión: concurrencia y cola por clase de ruta
+        self.admission_report_concurrency = int(os.getenv('ADMISSION_REPORT_CONCURRENCY', '4'))
+        self.admission_report_queue = int(os.getenv('ADMISSION_REPORT_QUEUE', '8'))
+        self.admission_report_per_client = int(os.getenv('ADMISSION_REPORT_PER_CLIENT', '2'))
+        self.admission_report_retry_after = int(os.getenv('ADMISSION_REPORT_RETRY_AFTER', '5'))
+        self.admission_crud_concurrency = int(os.getenv('ADMISSION_CRUD_CONCURRENCY', '32'))
+        self.admission_crud_queue = int(os.getenv('ADMISSION_CRUD_QUEUE', '64'))
+        self.admission_queue_timeout = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))
+        # Proxies propios delante de la API (agregan su entrada al final de X-Forwarded-For)
+        self.admission_trusted_proxies = int(os.getenv('ADMISSION_TRUSTED_PROXIES', '1'))
+        
         # App
         self.app_name = os.getenv('APP_NAME', 'SGF - Sistema de Gestión Financiera')
         self.app_version = os.getenv('APP_VERSION', '2.0.0')
         self.environment = os.getenv('ENVIRONMENT', 'development')
         self.debug = os.getenv('DEBUG', 'true').lower() == 'true'
         
+        # Caché HTTP y compresión
+        self.compression_min_size = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+        self.etag_max_age = int(os.getenv('ETAG_MAX_AGE', '60'))
+        
+        # Idempotency-Key en POST de pagos, anticipos y facturas
+        self.idempotency_ttl_hours = float(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+        self.idempotency_wait_seconds = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+        # Plazo de una reclamación en curso (varias veces el timeout de una solicitud)
+        self.idempotency_lease_seconds = float(os.getenv('IDEMPOTENCY_LEASE_SECONDS', '120'))
+        
+        # Sincronización incremental (/api/changes y réplica de lectura)
+        self.changes_safety_seconds = float(os.getenv('CHANGES_SAFETY_SECONDS', '30'))
+        self.change_log_retention_days = float(os.getenv('CHANGE_LOG_RETENTION_DAYS', '30'))
+        
+        # Dashboard en vivo (SSE)
+        self.dashboard_stream_tick = float(os.getenv('DASHBOARD_STREAM_TICK', '300'))
+        self.dashboard_stream_debounce = float(os.getenv('DASHBOARD_STREAM_DEBOUNCE', '1.0'))
+        self.dashboard_stream_heartbeat = float(os.getenv('DASHBOARD_STREAM_HEARTBEAT', '15'))
+        self.dashboard_stream_queue_size = int(os.getenv('DASHBOARD_STREAM_QUEUE_SIZE', '20'))
+        
+        # Índice en memoria de proveedores (autocompletado y duplicados)
+        self.supplier_index_ttl = float(os.getenv('SUPPLIER_INDEX_TTL', '300'))
+        
+        # Réplica de lectura en memoria (desactivada por defecto)
+        self.read_model_enabled = os.getenv('READ_MODEL_ENABLED', 'false').lower() == 'true'
+        self.read_model_poll_seconds = float(os.getenv('READ_MODEL_POLL_SECONDS', '2'))
+        self.read_model_max_staleness = float(os.getenv('READ_MODEL_MAX_STALENESS', '10'))
+        
+        # Trabajos en segundo plano (reportes y exportaciones)
+        self.jobs_workers = int(os.getenv('JOBS_WORKERS', '2'))
+        self.jobs_max_queued = int(os.getenv('JOBS_MAX_QUEUED', '20'))
+        self.jobs_result_ttl_hours = float(os.getenv('JOBS_RESULT_TTL_HOURS', '24'))
+        self.jobs_result_dir = os.getenv('JOBS_RESULT_DIR', '')
+        
+        # Pool de procesos para el cálculo de reportes (0 = sólo hilos)
+        self.kernel_workers = int(os.getenv('KERNEL_WORKERS', str(min(4, os.cpu_count() or 1))))
+        self.kernel_min_rows = int(os.getenv('KERNEL_MIN_ROWS', '20000'))
+        
         print(f"📋 Environment: {self.environment}")
         if self.supabase_url:
             print(f"📋 URL: {self.supabase_url[:30]}...")
@@ -0,0 +1,91 @@
+"""
+Cliente Supabase en memoria para las pruebas unitarias
+Implementa el subconjunto del query builder de postgrest que usan los
+servicios (select, filtros simples, order, limit, range) e imita el tope de
+filas por respuesta del servidor (max_rows).
+"""
+
+class _Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.conditions = []
+        self.orders = []
+        self.start = 0
+        self.size = None
+        self.count = None
+        self.head = False
+
+    def select(self, columns='*', count=None, head=False):
+        self.count = count
+        self.head = head
+        return self
+
+    def _where(self, column, test):
+        self.conditions.append(lambda row: row.get(column) is not None and test(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._where(column, lambda v: str(v) == str(value))
+
+    def neq(self, column, value):
+        return self._where(column, lambda v: str(v) != str(value))
+
+    def gt(self, column, value):
+        return self._where(column, lambda v: v > value)
+
+    def gte(self, column, value):
+        return self._where(column, lambda v: v >= value)
+
+    def lt(self, column, value):
+        return self._where(column, lambda v: v < value)
+
+    def lte(self, column, value):
+        return self._where(column, lambda v: v <= value)
+
+    def in_(self, column, values):
+        values = {str(value) for value in values}
+        return self._where(column, lambda v: str(v) in values)
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.size = size
+        return self
+
+    def range(self, start, end):
+        self.start = start
+        self.size = end - start + 1
+        return self
+
+    def execute(self):
+        self.client.requests.append(self.table)
+        if self.table not in self.client.tables:
+            # Como PostgREST: la relación debe existir
+            raise Exception(f"relation \"public.{self.table}\" does not exist")
+        rows = [dict(row) for row in self.client.tables.get(self.table, []) if all(c(row) for c in self.conditions)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: row[column], reverse=desc)
+
+        total = len(rows)
+        size = self.size if self.size is not None else self.client.max_rows
+        rows = rows[self.start:self.start + min(size, self.client.max_rows)]
+        return _Result([] if self.head else rows, total if self.count else None)
+
+
+class StubSupabase:
+    def __init__(self, tables, max_rows=1000):
+        self.tables = tables
+        self.max_rows = max_rows
+        self.requests = []
+
+    def table(self, name):
+        return _Query(self, name)
@@ -0,0 +1,66 @@
+"""
+Pruebas del cursor de change_log con un cliente Supabase en memoria
+Ejecutar: python -m pytest test_change_log.py
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'test')
+
+import pytest
+
+from services.change_log import CursorTooOld, latest_cursor, read_changes, settled_version
+from supabase_stub import StubSupabase
+
+
+def _entry(entry_id: int, seconds_ago: float, entidad: str = 'invoices') -> dict:
+    created_at = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+    return {'id': entry_id, 'entidad': entidad, 'entidad_id': f'e{entry_id}', 'operacion': 'upsert', 'created_at': created_at.isoformat()}
+
+
+def test_cursor_stops_before_recent_entries():
+    # 13 y 14 son recientes: su transacción pudo confirmarse antes que otra con id menor
+    supabase = StubSupabase({'change_log': [_entry(10, 600), _entry(12, 300), _entry(13, 1), _entry(14, 0)]})
+
+    rows, cursor, has_more = read_changes(supabase, 9, 10)
+    assert [row['id'] for row in rows] == [10, 12, 13, 14]
+    assert cursor == 12
+    assert not has_more
+
+    # Un id intermedio que se confirma tarde aparece en la consulta siguiente
+    supabase.tables['change_log'].insert(2, _entry(11, 2))
+    rows, cursor, _ = read_changes(supabase, cursor, 10)
+    assert [row['id'] for row in rows] == [13, 14]
+
+    assert latest_cursor(supabase) == 12
+
+
+def test_has_more_only_when_cursor_advances():
+    supabase = StubSupabase({'change_log': [_entry(i, 600) for i in range(1, 6)]})
+    rows, cursor, has_more = read_changes(supabase, 0, 2)
+    assert cursor == 2 and has_more
+
+    supabase = StubSupabase({'change_log': [_entry(i, 0) for i in range(1, 6)]})
+    rows, cursor, has_more = read_changes(supabase, 0, 2)
+    assert cursor == 0 and not has_more
+
+
+def test_purged_cursor_is_too_old():
+    supabase = StubSupabase({'change_log': [_entry(50, 600), _entry(51, 600)]})
+
+    assert read_changes(supabase, 49, 10)[1] == 51
+    with pytest.raises(CursorTooOld):
+        read_changes(supabase, 40, 10)
+
+
+def test_latest_cursor_with_only_recent_entries():
+    assert latest_cursor(StubSupabase({'change_log': []})) == 0
+    assert latest_cursor(StubSupabase({'change_log': [_entry(20, 0)]})) == 19
+
+
+def test_settled_version_waits_for_recent_entries():
+    assert settled_version(StubSupabase({'change_log': []})) == 0
+    assert settled_version(StubSupabase({'change_log': [_entry(7, 600), _entry(8, 300)]})) == 8
+    assert settled_version(StubSupabase({'change_log': [_entry(7, 600), _entry(8, 0)]})) is None
@@ -0,0 +1,136 @@
+"""
+Pruebas de los kernels de reportes, llamados directamente (sin el pool)
+Ejecutar: python -m pytest test_kernels.py
+"""
+
+import asyncio
+import os
+from array import array
+from datetime import date, timedelta
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'test')
+
+from services.kernels import (
+    AGING_BUCKETS, CategoryColumn, aging_kernel, float_column, payments_stats_kernel, reconciliation_kernel, run_kernel
+)
+
+
+def _payments():
+    metodos, meses = CategoryColumn(), CategoryColumn()
+    for metodo, mes in (('transferencia', '2024-01'), ('cheque', '2024-01'), ('transferencia', '2024-02'), (None, '2024-02')):
+        metodos.append(metodo)
+        meses.append(mes)
+    montos = float_column([100, 50.5, 25.25, None])
+    return montos, metodos.codes, metodos.labels, meses.codes, meses.labels
+
+
+def test_category_column_codes():
+    column = CategoryColumn()
+    for value in ('b', 'a', 'b', None):
+        column.append(value)
+    assert column.labels == ['b', 'a']
+    assert list(column.codes) == [0, 1, 0, -1]
+
+
+def test_payments_stats_kernel():
+    result = payments_stats_kernel(*_payments())
+
+    assert result['totales'] == {'cantidad_pagos': 4, 'monto_total': 175.75}
+    # Un pago sin método cuenta en los totales pero en ningún método
+    assert result['por_metodo'] == {
+        'transferencia': {'cantidad': 2, 'monto': 125.25},
+        'cheque': {'cantidad': 1, 'monto': 50.5}
+    }
+    assert result['por_mes'] == {
+        '2024-01': {'cantidad': 2, 'monto': 150.5},
+        '2024-02': {'cantidad': 2, 'monto': 25.25}
+    }
+
+
+def test_run_kernel_small_input_runs_in_thread():
+    # Con menos de KERNEL_MIN_ROWS filas no se usa el pool de procesos
+    assert asyncio.run(run_kernel(payments_stats_kernel, *_payments(), rows=4)) == payments_stats_kernel(*_payments())
+
+
+def test_reconciliation_kernel():
+    po_totales = float_column([1000, 500, 300, 200])
+    link_po = array('i', [0, 0, 1, 2, 3])
+    adv_po = array('i', [0, 3, 3, -1])
+
+    result = reconciliation_kernel(
+        po_totales,
+        link_po, float_column([600, 400, 300, 300, 200]), float_column([0, 0, 300, 300, 200]),
+        adv_po, float_column([100, 0, 20, 999]), float_column([0, 50, 0, 999])
+    )
+
+    assert result['facturas_cantidad'] == [2, 1, 1, 1]
+    assert result['facturas_total'] == [1000, 300, 300, 200]
+    assert result['saldo_pendiente'] == [0, 300, 300, 200]
+    # El anticipo sin orden (código -1) no se suma a ninguna
+    assert result['anticipos_aplicados'] == [100, 0, 0, 20]
+    assert result['anticipos_disponibles'] == [0, 0, 0, 50]
+    assert result['balance'] == [0, 200, 0, 0]
+    assert result['cobertura'] == [0, 0, 0, 25.0]
+    assert result['estado'] == ['completa', 'pendiente_facturacion', 'pendiente_pago', 'parcial']
+
+
+def test_reconciliation_kernel_tolerates_rounding():
+    result = reconciliation_kernel(
+        float_column([100]), array('i', [0]), float_column([99.995]), float_column([0]),
+        array('i'), float_column([]), float_column([])
+    )
+    assert result['estado'] == ['completa']
+
+
+CORTE = date(2024, 3, 31)
+
+
+def _aging(dias_vencidos, saldos, proveedores, monedas, n_proveedores, n_monedas):
+    fechas = [(CORTE - timedelta(days=dias)).isoformat() for dias in dias_vencidos]
+    return aging_kernel(
+        fechas, float_column(saldos), array('i', proveedores), n_proveedores,
+        array('i', monedas), n_monedas, CORTE.isoformat()
+    )
+
+
+def test_aging_bucket_boundaries():
+    dias = [-5, 0, 1, 30, 31, 60, 61, 90, 91, 400]
+    result = _aging(dias, [1] * len(dias), [0] * len(dias), [0] * len(dias), 1, 1)
+
+    assert [key for key, _, _ in AGING_BUCKETS] == ['corriente', '1_30', '31_60', '61_90', 'mas_90']
+    # corriente: no vencido o vence el día de corte; luego 1-30, 31-60, 61-90, 91+
+    assert result['cantidades'] == [[2, 2, 2, 2, 2]]
+    assert result['montos'] == [[2.0, 2.0, 2.0, 2.0, 2.0]]
+
+
+def test_aging_group_index_is_supplier_times_currencies_plus_currency():
+    # 2 proveedores x 3 monedas: grupo = proveedor * 3 + moneda
+    result = _aging([10, 45, -1], [100, 50, 25], [1, 0, 1], [2, 1, 2], 2, 3)
+
+    assert len(result['montos']) == 6
+    assert result['montos'][5] == [25.0, 100.0, 0.0, 0.0, 0.0]
+    assert result['montos'][1] == [0.0, 0.0, 50.0, 0.0, 0.0]
+    assert all(row == [0.0] * 5 for i, row in enumerate(result['montos']) if i not in (1, 5))
+    assert result['cantidades'][5] == [1, 1, 0, 0, 0]
+
+
+def test_aging_weighted_days_ignore_current_balances():
+    result = _aging([10, 45, -1], [100, 50, 25], [1, 0, 1], [2, 1, 2], 2, 3)
+    assert result['dias_ponderados'] == [0.0, 50 * 45, 0.0, 0.0, 0.0, 100 * 10]
+
+
+def test_aging_rows_without_currency_or_supplier_are_ignored():
+    # Código -1: moneda o proveedor nulos (CategoryColumn.append(None))
+    monedas = CategoryColumn()
+    for moneda in ('USD', None, 'USD'):
+        monedas.append(moneda)
+    result = _aging([10, 10, 40], [100, 999, 50], [0, 0, -1], list(monedas.codes), 1, len(monedas.labels))
+
+    assert result['montos'] == [[0.0, 100.0, 0.0, 0.0, 0.0]]
+    assert result['cantidades'] == [[0, 1, 0, 0, 0]]
+    assert result['dias_ponderados'] == [1000.0]
+
+
+def test_aging_empty():
+    assert _aging([], [], [], [], 0, 0) == {'montos': [], 'cantidades': [], 'dias_ponderados': []}
@@ -0,0 +1,47 @@
+"""
+Pruebas del recorrido por bloques con el tope max-rows de PostgREST
+Ejecutar: python -m pytest test_pagination.py
+"""
+
+import os
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'test')
+
+from services.loaders import load_children
+from services.pagination import iter_table
+from supabase_stub import StubSupabase
+
+
+def _dues(invoices: int, per_invoice: int) -> list:
+    return [
+        {'id': f'd{i:03d}{j:03d}', 'invoice_id': f'i{i}', 'monto': 1}
+        for i in range(invoices) for j in range(per_invoice)
+    ]
+
+
+def test_load_children_pages_each_chunk():
+    # Un solo lote de padres con más hijos que el max-rows del servidor (1000)
+    supabase = StubSupabase({'invoice_due': _dues(3, 400)})
+    grouped = load_children(supabase, 'invoice_due', 'invoice_id', ['i0', 'i1', 'i2', 'i9'], 'monto')
+
+    assert {pid: len(rows) for pid, rows in grouped.items()} == {'i0': 400, 'i1': 400, 'i2': 400, 'i9': 0}
+    assert len({row['id'] for rows in grouped.values() for row in rows}) == 1200
+
+
+def test_load_children_applies_filters():
+    rows = _dues(2, 3)
+    rows[0]['monto'] = 5
+    grouped = load_children(StubSupabase({'invoice_due': rows}), 'invoice_due', 'invoice_id', ['i0', 'i1'], filters={'monto': 5})
+    assert [row['id'] for row in grouped['i0']] == ['d000000']
+    assert grouped['i1'] == []
+
+
+def test_iter_table_with_server_limit_below_chunk_size():
+    # max-rows 25 con bloques de 1000: cada respuesta viene incompleta sin ser la última
+    supabase = StubSupabase({'invoice_due': _dues(2, 40)}, max_rows=25)
+    rows = list(iter_table(supabase, 'invoice_due', 'monto'))
+
+    assert [row['id'] for row in rows] == sorted(row['id'] for row in _dues(2, 40))
+    assert len(supabase.requests) == 5
+
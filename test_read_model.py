@@ -0,0 +1,63 @@
+"""
+Pruebas de la réplica de lectura con un cliente Supabase en memoria
+Ejecutar: python -m pytest test_read_model.py
+"""
+
+import os
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'test')
+
+from services.read_model import READ_MODEL_TABLES, ReadModel
+from supabase_stub import StubSupabase
+
+
+def _tables():
+    tables = {table: [] for table in ('purchase_orders', 'shipments', 'shipment_supplier', 'shipment_invoice', 'invoice_po')}
+    tables['suppliers'] = [{'id': 's1', 'nombre': 'Proveedor Uno', 'created_at': '2024-01-01'}]
+    tables['invoices'] = [
+        {'id': 'i1', 'supplier_id': 's1', 'numero_factura': 'F-1', 'created_at': '2024-01-02'},
+        {'id': 'i2', 'supplier_id': 's1', 'numero_factura': 'F-2', 'created_at': '2024-01-03'}
+    ]
+    tables['invoice_due'] = [
+        {'id': 'd1', 'invoice_id': 'i1', 'monto': 100, 'created_at': '2024-01-02'},
+        {'id': 'd2', 'invoice_id': 'i1', 'monto': 50, 'created_at': '2024-01-02'},
+        {'id': 'd3', 'invoice_id': 'i2', 'monto': 75, 'created_at': '2024-01-03'}
+    ]
+    tables['change_log'] = [{'id': 7, 'entidad': 'invoices', 'entidad_id': 'i1', 'operacion': 'upsert', 'created_at': '2024-01-02T00:00:00+00:00'}]
+    return tables
+
+
+def test_hydrate_loads_every_table():
+    supabase = StubSupabase(_tables())
+    model = ReadModel(poll_seconds=1, max_staleness=60)
+    model.hydrate(supabase)
+
+    # Cada tabla replicada existe en Supabase (el stub falla con tablas desconocidas)
+    assert set(READ_MODEL_TABLES) <= set(supabase.tables)
+    assert model.is_fresh()
+    assert model._cursor == 7
+
+    rows, total = model.query('invoice_due', {'invoice_id': 'i1'}, order_by='monto')
+    assert total == 2
+    assert [row['id'] for row in rows] == ['d2', 'd1']
+    assert model.get('suppliers', 's1')['nombre'] == 'Proveedor Uno'
+
+
+def test_sync_reloads_invoice_dues():
+    tables = _tables()
+    supabase = StubSupabase(tables)
+    model = ReadModel(poll_seconds=1, max_staleness=60)
+    model.hydrate(supabase)
+
+    # Se reemplazan los vencimientos de i1 y se registra el cambio de la factura
+    tables['invoice_due'] = [row for row in tables['invoice_due'] if row['invoice_id'] != 'i1']
+    tables['invoice_due'].append({'id': 'd4', 'invoice_id': 'i1', 'monto': 150, 'created_at': '2024-02-01'})
+    tables['change_log'].append({'id': 8, 'entidad': 'invoices', 'entidad_id': 'i1', 'operacion': 'upsert', 'created_at': '2024-02-01T00:00:00+00:00'})
+
+    assert model.sync(supabase) == 1
+
+    rows, total = model.query('invoice_due', {'invoice_id': 'i1'})
+    assert total == 1
+    assert rows[0]['id'] == 'd4'
+    assert model.query('invoice_due', {'invoice_id': 'i2'})[1] == 1
@@ -0,0 +1,124 @@
+"""
+Pruebas de la paginación del estado de cuenta (cursor y saldos corridos)
+Ejecutar: python -m pytest test_statement.py
+"""
+
+import os
+from datetime import date
+from itertools import islice
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'test')
+
+import pytest
+from fastapi import HTTPException
+
+from services import statement as statement_module
+from services.statement import SupplierStatement, _movement, format_balances
+
+# Cuatro fuentes como las de _sources, cada una ordenada por fecha
+FACTURAS = [
+    _movement('2024-01-05', 'factura', 'f1', 'USD', 100.0, 100.0, 0.0),
+    _movement('2024-01-10', 'factura', 'f2', 'USD', 200.0, 200.0, 0.0),
+    _movement('2024-01-10', 'factura', 'f3', 'CLP', 5000.0, 5000.0, 0.0),
+    _movement('2024-02-01', 'factura', 'f4', 'USD', 50.0, 50.0, 0.0),
+]
+APLICACIONES = [
+    _movement('2024-01-10', 'aplicacion_anticipo', 'ap1', 'USD', 30.0, -30.0, -30.0),
+]
+PAGOS = [
+    _movement('2024-01-10', 'pago', 'p1', 'USD', 40.0, -40.0, 0.0),
+    _movement('2024-01-20', 'pago', 'p2', 'USD', 100.0, -100.0, 0.0),
+]
+ANTICIPOS = [
+    _movement('2024-01-01', 'anticipo', 'a1', 'USD', 80.0, 0.0, 80.0),
+]
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Reemplaza las consultas por listas en memoria y registra los rangos pedidos"""
+    calls = []
+
+    def fake_sources(supabase, supplier_id, desde, hasta):
+        calls.append((desde, hasta))
+
+        def in_range(movement):
+            fecha = date.fromisoformat(movement['fecha'])
+            return (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta)
+
+        return [iter([m for m in source if in_range(m)]) for source in (FACTURAS, APLICACIONES, PAGOS, ANTICIPOS)]
+
+    monkeypatch.setattr(statement_module, '_sources', fake_sources)
+    return calls
+
+
+def _all_pages(limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        statement = SupplierStatement(None, 's1', cursor=cursor, **kwargs)
+        movements = statement.movements()
+        page = list(islice(movements, limit))
+        cursor = statement.next_cursor()
+        pages.append((statement, page))
+        if len(page) < limit or next(movements, None) is None:
+            return pages
+
+
+def test_pages_match_single_pass(sources):
+    full = list(SupplierStatement(None, 's1').movements())
+    assert [m['id'] for m in full] == ['a1', 'f1', 'f2', 'f3', 'ap1', 'p1', 'p2', 'f4']
+
+    for limit in (1, 2, 3, 5):
+        paged = [m for _, page in _all_pages(limit) for m in page]
+        assert paged == full
+
+
+def test_cursor_skips_delivered_movements_of_same_date(sources):
+    # La primera página corta en medio del 2024-01-10 (f2 entregada, f3 / ap1 / p1 no)
+    statement = SupplierStatement(None, 's1')
+    page = list(islice(statement.movements(), 3))
+    assert [m['id'] for m in page] == ['a1', 'f1', 'f2']
+
+    second = SupplierStatement(None, 's1', cursor=statement.next_cursor())
+    assert second.desde == date(2024, 1, 10)
+    assert format_balances(second.opening or second.balances)['USD'] == {
+        'facturas_pendientes': 300.0, 'anticipos_disponibles': 80.0, 'neto': 220.0
+    }
+    assert [m['id'] for m in islice(second.movements(), 3)] == ['f3', 'ap1', 'p1']
+
+
+def test_cursor_pages_do_not_rescan_history(sources):
+    _all_pages(2, desde=date(2024, 1, 5))
+
+    # Sólo la primera página lee la historia anterior a fecha_desde
+    opening_scans = [call for call in sources if call[0] is None]
+    assert opening_scans == [(None, date(2024, 1, 4))]
+
+
+def test_opening_balance_from_history(sources):
+    statement = SupplierStatement(None, 's1', desde=date(2024, 1, 15))
+    movements = list(statement.movements())
+    assert [m['id'] for m in movements] == ['p2', 'f4']
+    assert format_balances(statement.opening) == {
+        'CLP': {'facturas_pendientes': 5000.0, 'anticipos_disponibles': 0.0, 'neto': 5000.0},
+        'USD': {'facturas_pendientes': 230.0, 'anticipos_disponibles': 50.0, 'neto': 180.0}
+    }
+    assert movements[-1]['saldo'] == {'facturas_pendientes': 180.0, 'anticipos_disponibles': 50.0, 'neto': 130.0}
+
+
+def test_currency_filter_and_cursor_currency(sources):
+    pages = _all_pages(2, moneda='USD')
+    assert all(m['moneda'] == 'USD' for _, page in pages for m in page)
+
+    statement = SupplierStatement(None, 's1', moneda='USD')
+    list(islice(statement.movements(), 2))
+    with pytest.raises(HTTPException) as error:
+        SupplierStatement(None, 's1', moneda='CLP', cursor=statement.next_cursor())
+    assert error.value.status_code == 400
+
+
+def test_invalid_cursor(sources):
+    with pytest.raises(HTTPException) as error:
+        SupplierStatement(None, 's1', cursor='2024-01-10:2')
+    assert error.value.status_code == 400